@@ -1,19 +1,32 @@
 import random
+from io import BytesIO
 
 from gtts import gTTS
 
+from TTS.provider import AsyncProvider
 from utils import settings
 
 
-class GTTS:
+class GTTS(AsyncProvider):
     def __init__(self):
         self.max_chars = 5000
+        self.max_concurrency = 4
         self.voices = []
 
-    def run(self, text, filepath):
+    def get_voice(self, random_voice: bool = False) -> str:
+        # gTTS has a single voice per language
+        return settings.config["reddit"]["thread"]["post_lang"] or "en"
+
+    def fetch(self, text: str, voice: str) -> bytes:
+        tts = gTTS(text=text, lang=voice, slow=False)
+        buffer = BytesIO()
+        tts.write_to_fp(buffer)
+        return buffer.getvalue()
+
+    def run(self, text, filepath, random_voice: bool = False):
         tts = gTTS(
             text=text,
-            lang=settings.config["reddit"]["thread"]["post_lang"] or "en",
+            lang=self.get_voice(random_voice),
             slow=False,
         )
         tts.save(filepath)
@@ -1,11 +1,10 @@
 # documentation for tiktok api: https://github.com/oscie57/tiktok-voice/wiki
 import base64
 import random
-import time
 from typing import Final, Optional
 
-import requests
-
+from TTS.provider import AsyncProvider, http_session
+from TTS.scheduler import RoundRobin, get_scheduler
 from utils import settings
 
 __all__ = ["TikTok", "TikTokTTSException"]
@@ -76,30 +75,32 @@ vocals: Final[tuple] = (
 )
 
 
-class TikTok:
+class TikTok(AsyncProvider):
     """TikTok Text-to-Speech Wrapper"""
 
     def __init__(self):
-        headers = {
+        self.headers = {
             "User-Agent": "com.zhiliaoapp.musically/2022600030 (Linux; U; Android 7.1.2; es_ES; SM-G988N; "
             "Build/NRD90M;tt-ok/3.12.13.1)",
-            "Cookie": f"sessionid={settings.config['settings']['tts']['tiktok_sessionid']}",
         }
+        # several comma separated session ids are used in turn, each with its own rate limit
+        session_ids = str(settings.config["settings"]["tts"]["tiktok_sessionid"]).split(",")
+        self.session_ids = RoundRobin([s.strip() for s in session_ids if s.strip()] or [""])
 
         self.URI_BASE = "https://api16-normal-c-useast1a.tiktokv.com/media/api/text/speech/invoke/"
         self.max_chars = 200
+        self.max_concurrency = 4
 
-        self._session = requests.Session()
-        # set the headers to the session, so we don't have to do it for every request
-        self._session.headers = headers
+        # shared with every other TikTok instance, the session cookie goes with each request
+        self._session = http_session("tiktok")
 
-    def run(self, text: str, filepath: str, random_voice: bool = False):
+    def get_voice(self, random_voice: bool = False) -> Optional[str]:
         if random_voice:
-            voice = self.random_voice()
-        else:
-            # if tiktok_voice is not set in the config file, then use a random voice
-            voice = settings.config["settings"]["tts"].get("tiktok_voice", None)
+            return self.random_voice()
+        # if tiktok_voice is not set in the config file, then use a random voice
+        return settings.config["settings"]["tts"].get("tiktok_voice", None)
 
+    def fetch(self, text: str, voice: Optional[str]) -> bytes:
         # get the audio from the TikTok API
         data = self.get_voices(voice=voice, text=text)
 
@@ -116,11 +117,7 @@ class TikTok:
                 "The TikTok TTS returned an invalid response. Please try again later, and report this bug."
             )
             raise TikTokTTSException(0, "Invalid response")
-        decoded_voices = base64.b64decode(raw_voices)
-
-        # write voices to specified filepath
-        with open(filepath, "wb") as out:
-            out.write(decoded_voices)
+        return base64.b64decode(raw_voices)
 
     def get_voices(self, text: str, voice: Optional[str] = None) -> dict:
         """If voice is not passed, the API will try to use the most fitting voice"""
@@ -133,12 +130,12 @@ class TikTok:
         if voice is not None:
             params["text_speaker"] = voice
 
-        # send request
-        try:
-            response = self._session.post(self.URI_BASE, params=params)
-        except ConnectionError:
-            time.sleep(random.randrange(1, 7))
-            response = self._session.post(self.URI_BASE, params=params)
+        # send request, paced and retried by the scheduler of the session id
+        index, session_id = self.session_ids.next()
+        headers = {**self.headers, "Cookie": f"sessionid={session_id}"}
+        response = get_scheduler(f"tiktok:{index}", provider="tiktok").request(
+            lambda: self._session.post(self.URI_BASE, params=params, headers=headers)
+        )
 
         return response.json()
 
@@ -1,9 +1,11 @@
 import random
 import sys
+from functools import lru_cache
 
 from boto3 import Session
 from botocore.exceptions import BotoCoreError, ClientError, ProfileNotFound
 
+from TTS.provider import AsyncProvider
 from utils import settings
 
 voices = [
@@ -25,23 +27,30 @@ voices = [
 ]
 
 
-class AWSPolly:
+@lru_cache(maxsize=1)
+def polly_client():
+    """The Polly client of the "polly" profile, created once. boto3 clients are thread safe."""
+    return Session(profile_name="polly").client("polly")
+
+
+class AWSPolly(AsyncProvider):
     def __init__(self):
         self.max_chars = 3000
+        self.max_concurrency = 8
         self.voices = voices
 
-    def run(self, text, filepath, random_voice: bool = False):
+    def get_voice(self, random_voice: bool = False) -> str:
+        if random_voice:
+            return self.randomvoice()
+        if not settings.config["settings"]["tts"]["aws_polly_voice"]:
+            raise ValueError(
+                f"Please set the TOML variable AWS_VOICE to a valid voice. options are: {voices}"
+            )
+        return str(settings.config["settings"]["tts"]["aws_polly_voice"]).capitalize()
+
+    def fetch(self, text, voice) -> bytes:
         try:
-            session = Session(profile_name="polly")
-            polly = session.client("polly")
-            if random_voice:
-                voice = self.randomvoice()
-            else:
-                if not settings.config["settings"]["tts"]["aws_polly_voice"]:
-                    raise ValueError(
-                        f"Please set the TOML variable AWS_VOICE to a valid voice. options are: {voices}"
-                    )
-                voice = str(settings.config["settings"]["tts"]["aws_polly_voice"]).capitalize()
+            polly = polly_client()
             try:
                 # Request speech synthesis
                 response = polly.synthesize_speech(
@@ -54,11 +63,7 @@ class AWSPolly:
 
             # Access the audio stream from the response
             if "AudioStream" in response:
-                file = open(filepath, "wb")
-                file.write(response["AudioStream"].read())
-                file.close()
-                # print_substep(f"Saved Text {idx} to MP3 files successfully.", style="bold green")
-
+                return response["AudioStream"].read()
             else:
                 # The response didn't contain audio data, exit gracefully
                 print("Could not stream audio")
@@ -0,0 +1,170 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+from utils import settings
+
+__all__ = ["TTSCache", "get_tts_cache", "voice_key"]
+
+DEFAULT_CACHE_DIR: str = "assets/cache/tts"
+DEFAULT_CACHE_MAX_MB: int = 512
+
+# The setting holding the configured voice of each provider, keyed by provider class name
+VOICE_SETTINGS: Dict[str, str] = {
+    "TikTok": "tiktok_voice",
+    "StreamlabsPolly": "streamlabs_polly_voice",
+    "AWSPolly": "aws_polly_voice",
+    "elevenlabs": "elevenlabs_voice_name",
+    "pyttsx": "python_voice",
+}
+
+
+def voice_key(provider: str, random_voice: bool) -> str:
+    """Returns the voice part of a cache key for the given provider.
+
+    Random voices are keyed as "random": any voice is an acceptable answer for them.
+    """
+    if random_voice:
+        return "random"
+    setting = VOICE_SETTINGS.get(provider)
+    if setting is None:
+        return ""
+    return str(settings.config["settings"]["tts"].get(setting, "")).casefold()
+
+
+class TTSCache:
+    """Content-addressed on-disk store of synthesized clips, shared by every TTS provider.
+
+    Every entry is a `{key}.mp3` plus a `{key}.json` holding its duration, so a hit skips both
+    the provider call and the duration probe. The json is written last and acts as the commit
+    marker of an entry. Both files are written to a temporary file first and moved into place,
+    so concurrent jobs never see half written clips.
+
+    The least recently used entries (by mtime, refreshed on every hit) are evicted once the
+    cache grows over `max_bytes`.
+
+    Args:
+        directory : Where the clips are stored.
+        max_bytes : Size cap of the cache.
+    """
+
+    def __init__(
+        self, directory: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_CACHE_MAX_MB << 20
+    ):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._size: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(provider: str, voice: str, lang: str, text: str) -> str:
+        payload = json.dumps([provider, voice, lang or "", text], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str, filepath: str) -> Optional[float]:
+        """Copies the cached clip to `filepath` and returns its duration, or None on a miss."""
+        audio, meta = self._paths(key)
+        try:
+            duration = float(json.loads(meta.read_text(encoding="utf-8"))["duration"])
+            self._atomic_copy(audio, Path(filepath))
+            os.utime(audio)  # mark as recently used
+        except (OSError, ValueError, KeyError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return duration
+
+    def put(self, key: str, filepath: str, duration: float):
+        """Stores a freshly synthesized clip. Failures only cost the cache entry, never the run."""
+        audio, meta = self._paths(key)
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with self._lock:
+                self._current_size()  # measure what is there before this entry is added
+                replaced = sum(file.stat().st_size for file in (audio, meta) if file.exists())
+            self._atomic_copy(Path(filepath), audio)
+            self._atomic_write(meta, json.dumps({"duration": duration}))
+            added = audio.stat().st_size + meta.stat().st_size
+        except OSError:
+            return
+        with self._lock:
+            self._size += added - replaced
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+    def _paths(self, key: str):
+        return self.directory / f"{key}.mp3", self.directory / f"{key}.json"
+
+    def _current_size(self) -> int:
+        if self._size is None:
+            self._size = sum(
+                file.stat().st_size
+                for pattern in ("*.mp3", "*.json")
+                for file in self.directory.glob(pattern)
+            )
+        return self._size
+
+    def _evict(self):
+        entries = sorted(self.directory.glob("*.mp3"), key=lambda file: file.stat().st_mtime)
+        for audio in entries:
+            if self._size <= self.max_bytes:
+                break
+            meta = audio.with_suffix(".json")
+            for file in (meta, audio):
+                try:
+                    self._size -= file.stat().st_size
+                    file.unlink()
+                except FileNotFoundError:  # another job evicted it already
+                    pass
+            self.evictions += 1
+
+    @staticmethod
+    def _atomic_copy(source: Path, target: Path):
+        fd, tmp = tempfile.mkstemp(dir=target.parent, prefix=".", suffix=".tmp")
+        os.close(fd)
+        try:
+            shutil.copyfile(source, tmp)
+            os.replace(tmp, target)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+
+    @staticmethod
+    def _atomic_write(target: Path, data: str):
+        fd, tmp = tempfile.mkstemp(dir=target.parent, prefix=".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp, target)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+
+
+_cache: Optional[TTSCache] = None
+
+
+def get_tts_cache() -> Optional[TTSCache]:
+    """Returns the process wide TTS cache, or None if it is disabled in the config."""
+    global _cache
+    tts_settings = settings.config["settings"]["tts"]
+    if not tts_settings.get("cache", True):
+        return None
+    if _cache is None:
+        _cache = TTSCache(
+            max_bytes=int(tts_settings.get("cache_max_mb", DEFAULT_CACHE_MAX_MB)) << 20
+        )
+    return _cache
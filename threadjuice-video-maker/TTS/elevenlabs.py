@@ -1,38 +1,52 @@
 import random
+from functools import lru_cache
+from typing import Tuple
 
-from elevenlabs import save
 from elevenlabs.client import ElevenLabs
 
+from TTS.provider import AsyncProvider
 from utils import settings
 
 
-class elevenlabs:
+@lru_cache(maxsize=None)
+def get_client(api_key: str) -> ElevenLabs:
+    """One client per API key for the whole process, it keeps its HTTP connections open."""
+    return ElevenLabs(api_key=api_key)
+
+
+@lru_cache(maxsize=None)
+def voice_catalog(api_key: str) -> Tuple[str, ...]:
+    """The names of the voices available to an API key, fetched once per process."""
+    return tuple(voice.name for voice in get_client(api_key).voices.get_all().voices)
+
+
+class elevenlabs(AsyncProvider):
     def __init__(self):
         self.max_chars = 2500
+        self.max_concurrency = 4
         self.client: ElevenLabs = None
 
-    def run(self, text, filepath, random_voice: bool = False):
-        if self.client is None:
-            self.initialize()
+    def get_voice(self, random_voice: bool = False) -> str:
         if random_voice:
-            voice = self.randomvoice()
-        else:
-            voice = str(settings.config["settings"]["tts"]["elevenlabs_voice_name"]).capitalize()
+            return self.randomvoice()
+        return str(settings.config["settings"]["tts"]["elevenlabs_voice_name"]).capitalize()
 
+    def fetch(self, text: str, voice: str) -> bytes:
+        if self.client is None:
+            self.initialize()
         audio = self.client.generate(text=text, voice=voice, model="eleven_multilingual_v1")
-        save(audio=audio, filename=filepath)
+        return audio if isinstance(audio, bytes) else b"".join(audio)
 
     def initialize(self):
-        if settings.config["settings"]["tts"]["elevenlabs_api_key"]:
-            api_key = settings.config["settings"]["tts"]["elevenlabs_api_key"]
-        else:
-            raise ValueError(
-                "You didn't set an Elevenlabs API key! Please set the config variable ELEVENLABS_API_KEY to a valid API key."
-            )
+        self.client = get_client(self.api_key())
 
-        self.client = ElevenLabs(api_key=api_key)
+    @staticmethod
+    def api_key() -> str:
+        if settings.config["settings"]["tts"]["elevenlabs_api_key"]:
+            return settings.config["settings"]["tts"]["elevenlabs_api_key"]
+        raise ValueError(
+            "You didn't set an Elevenlabs API key! Please set the config variable ELEVENLABS_API_KEY to a valid API key."
+        )
 
     def randomvoice(self):
-        if self.client is None:
-            self.initialize()
-        return random.choice(self.client.voices.get_all().voices).voice_name
+        return random.choice(voice_catalog(self.api_key()))
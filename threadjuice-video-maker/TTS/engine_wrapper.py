@@ -1,22 +1,61 @@
+import asyncio
 import os
 import re
+import threading
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import Tuple
+from typing import Dict, List, Optional, Tuple
 
-import numpy as np
+import ffmpeg
 import translators
-from moviepy.audio.AudioClip import AudioClip
-from moviepy.audio.fx.volumex import volumex
 from moviepy.editor import AudioFileClip
 from rich.progress import track
 
+from TTS.cache import TTSCache, get_tts_cache, voice_key
+from TTS.fallback import FallbackProvider
+from TTS.provider import BatchExecutor, ProviderLoop, supports_async, supports_batch
+from TTS.scheduler import scheduler_stats
 from utils import settings
+from utils.audio import audio_duration, audio_info, write_duration_manifest
 from utils.console import print_step, print_substep
 from utils.voice import sanitize_text
 
 DEFAULT_MAX_LENGTH: int = (
     50  # Video length variable, edit this on your own risk. It should work, but it's not supported
 )
+DEFAULT_CONCURRENCY: int = 4  # Clips synthesized at once, further capped by each provider
+CHARS_PER_SECOND: float = 15.0  # Speech rate assumed until the first clips are measured
+SILENCE_CACHE_DIR: str = "assets/cache/silence"
+
+_silence_lock = threading.Lock()
+
+
+class SynthesisUnit:
+    """One output clip of the TTS stage and the provider calls that produce it.
+
+    Args:
+        filename : Name of the final mp3 (without extension) inside the engine path.
+        parts    : (filename, text) pairs, one per provider call. Split posts have several.
+        split    : Whether the parts have to be joined into `filename` afterwards.
+    """
+
+    def __init__(self, filename: str, parts: List[Tuple[str, str]], split: bool = False):
+        self.filename = filename
+        self.parts = parts
+        self.split = split
+        self.futures: List[Future] = []
+
+    def cancel(self):
+        for future in self.futures:
+            future.cancel()
+
+    def discard(self, path: str):
+        """Removes any clip a cancelled unit managed to write before it was stopped."""
+        for future in self.futures:
+            if not future.cancelled():
+                future.exception()  # wait for it, the result is thrown away anyway
+        for name in [self.filename] + [name for name, _ in self.parts]:
+            Path(f"{path}/{name}.mp3").unlink(missing_ok=True)
 
 
 class TTSEngine:
@@ -30,6 +69,12 @@ class TTSEngine:
 
     Notes:
         tts_module must take the arguments text and filepath.
+        tts_module may set `max_concurrency` to the number of requests it can serve in parallel,
+        the engine never runs more than that (or the `concurrency` setting) at once.
+        tts_module may implement `TTS.provider.AsyncProvider`, its requests are then all driven
+        from one event loop instead of a thread each.
+        tts_module may implement `run_batch(jobs, random_voice)` taking (text, filepath) pairs,
+        up to `batch_size` clips are then queued and rendered together.
     """
 
     def __init__(
@@ -48,6 +93,9 @@ class TTSEngine:
         self.max_length = max_length
         self.length = 0
         self.last_clip_length = last_clip_length
+        self.cache: Optional[TTSCache] = None
+        self.durations: Dict[str, float] = {}
+        self.spoken_chars = 0  # characters behind self.length, for the speech rate
 
     def add_periods(
         self,
@@ -71,70 +119,216 @@ class TTSEngine:
         print_step("Saving Text to MP3 files...")
 
         self.add_periods()
-        self.call_tts("title", process_text(self.reddit_object["thread_title"]))
-        # processed_text = ##self.reddit_object["thread_post"] != ""
+        self.cache = get_tts_cache()
+        cache_stats = self.cache.stats() if self.cache else None
         idx = 0
+        speculative: List[SynthesisUnit] = []
+
+        try:
+            with self.make_pool() as pool:
+                title = self.submit(
+                    pool, self.plan("title", self.reddit_object["thread_title"], split=False)
+                )
+                # processed_text = ##self.reddit_object["thread_post"] != ""
+
+                if settings.config["settings"]["storymode"]:
+                    units = []
+                    if settings.config["settings"]["storymodemethod"] == 0:
+                        units.append(
+                            self.submit(
+                                pool, self.plan("postaudio", self.reddit_object["thread_post"])
+                            )
+                        )
+                    elif settings.config["settings"]["storymodemethod"] == 1:
+                        for idx, text in enumerate(self.reddit_object["thread_post"]):
+                            units.append(
+                                self.submit(pool, self.plan(f"postaudio-{idx}", text, split=False))
+                            )
+                    self.collect(title)
+                    for unit in track(units, "Saving..."):
+                        self.collect(unit)
 
-        if settings.config["settings"]["storymode"]:
-            if settings.config["settings"]["storymodemethod"] == 0:
-                if len(self.reddit_object["thread_post"]) > self.tts_module.max_chars:
-                    self.split_post(self.reddit_object["thread_post"], "postaudio")
                 else:
-                    self.call_tts("postaudio", process_text(self.reddit_object["thread_post"]))
-            elif settings.config["settings"]["storymodemethod"] == 1:
-                for idx, text in track(enumerate(self.reddit_object["thread_post"])):
-                    self.call_tts(f"postaudio-{idx}", process_text(text))
+                    idx, speculative = self.run_comments(pool, title)
+                    for unit in speculative:
+                        unit.cancel()
 
-        else:
-            for idx, comment in track(enumerate(self.reddit_object["comments"]), "Saving..."):
-                # ! Stop creating mp3 files if the length is greater than max length.
-                if self.length > self.max_length and idx > 1:
-                    self.length -= self.last_clip_length
-                    idx -= 1
-                    break
-                if (
-                    len(comment["comment_body"]) > self.tts_module.max_chars
-                ):  # Split the comment if it is too long
-                    self.split_post(comment["comment_body"], idx)  # Split the comment
-                else:  # If the comment is not too long, just call the tts engine
-                    self.call_tts(f"{idx}", process_text(comment["comment_body"]))
+            for unit in speculative:
+                unit.discard(self.path)
+        finally:
+            # a fallback chain holds a thread pool per provider for this video
+            if isinstance(self.tts_module, FallbackProvider):
+                self.tts_module.close()
+        write_duration_manifest(self.path, self.durations)
 
+        if self.cache:
+            hits = self.cache.hits - cache_stats["hits"]
+            misses = self.cache.misses - cache_stats["misses"]
+            evictions = self.cache.evictions - cache_stats["evictions"]
+            print_substep(
+                f"TTS cache: {hits} clips reused, {misses} synthesized, {evictions} evicted."
+            )
+        for name, stats in scheduler_stats().items():
+            if stats["retries"] or stats["throttled_seconds"]:
+                print_substep(
+                    f"{name} rate limit so far: {stats['throttled_seconds']}s throttled, "
+                    f"{stats['retries']} retries, up to {stats['max_queue_depth']} requests queued."
+                )
         print_substep("Saved Text to MP3 files successfully.", style="bold green")
         return self.length, idx
 
-    def split_post(self, text: str, idx):
-        split_files = []
-        split_text = [
+    def run_comments(
+        self, pool: Executor, title: Optional["SynthesisUnit"]
+    ) -> Tuple[int, List["SynthesisUnit"]]:
+        """Synthesizes the comments with up to `lookahead` of them queued at once.
+
+        Comments are collected strictly in index order, so the `max_length` cutoff sees exactly
+        the same running length as a sequential run. Units submitted ahead of the cutoff are
+        returned so the caller can cancel them and remove whatever they already wrote.
+        The title is collected once the first comments are queued, so batches include it.
+        """
+        comments = self.reddit_object["comments"]
+        units: List[SynthesisUnit] = []
+        idx = 0
+        consumed = 0
+        for idx, _ in track(enumerate(comments), "Saving..."):
+            # ! Stop creating mp3 files if the length is greater than max length.
+            if self.length > self.max_length and idx > 1:
+                self.length -= self.last_clip_length
+                idx -= 1
+                break
+            window = self.lookahead([comment["comment_body"] for comment in comments[idx:]])
+            while len(units) < min(len(comments), idx + window):
+                ahead = len(units)
+                units.append(
+                    self.submit(pool, self.plan(f"{ahead}", comments[ahead]["comment_body"]))
+                )
+            if title is not None:
+                self.collect(title)
+                title = None
+            self.collect(units[idx])
+            consumed = idx + 1
+        if title is not None:
+            self.collect(title)
+        return idx, units[consumed:]
+
+    def worker_count(self) -> int:
+        """Number of clips synthesized concurrently, capped by what the provider tolerates."""
+        configured = settings.config["settings"]["tts"].get("concurrency", DEFAULT_CONCURRENCY)
+        provider_limit = getattr(self.tts_module, "max_concurrency", 1)
+        return max(1, min(int(configured), int(provider_limit)))
+
+    def plan(self, filename: str, text: str, split: bool = True) -> "SynthesisUnit":
+        """Describes the TTS calls needed to produce `{filename}.mp3` from `text`.
+
+        Text longer than the provider's `max_chars` is cut into `{filename}-{idy}.part` chunks
+        which are joined back together once all of them are synthesized.
+        """
+        if not split or len(text) <= self.tts_module.max_chars:
+            return SynthesisUnit(filename, [(filename, process_text(text))])
+
+        parts = []
+        for idy, text_cut in enumerate(self.split_text(text)):
+            newtext = process_text(text_cut)
+            if not newtext or newtext.isspace():
+                print("newtext was blank because sanitized split text resulted in none")
+                continue
+            parts.append((f"{filename}-{idy}.part", newtext))
+        return SynthesisUnit(filename, parts, split=True)
+
+    def split_text(self, text: str) -> List[str]:
+        return [
             x.group().strip()
             for x in re.finditer(
                 r" *(((.|\n){0," + str(self.tts_module.max_chars) + "})(\.|.$))", text
             )
         ]
-        self.create_silence_mp3()
 
-        idy = None
-        for idy, text_cut in enumerate(split_text):
-            newtext = process_text(text_cut)
-            # print(f"{idx}-{idy}: {newtext}\n")
+    def lookahead(self, pending: List[str]) -> int:
+        """Number of comments queued ahead of the one being collected.
 
-            if not newtext or newtext.isspace():
-                print("newtext was blank because sanitized split text resulted in none")
-                continue
-            else:
-                self.call_tts(f"{idx}-{idy}.part", newtext)
-                with open(f"{self.path}/list.txt", "w") as f:
-                    for idz in range(0, len(split_text)):
-                        f.write("file " + f"'{idx}-{idz}.part.mp3'" + "\n")
-                    split_files.append(str(f"{self.path}/{idx}-{idy}.part.mp3"))
-                    f.write("file " + f"'silence.mp3'" + "\n")
-
-                os.system(
-                    "ffmpeg -f concat -y -hide_banner -loglevel panic -safe 0 "
-                    + "-i "
-                    + f"{self.path}/list.txt "
-                    + "-c copy "
-                    + f"{self.path}/{idx}.mp3"
-                )
+        A batch is rendered whole even when the `max_length` cutoff throws most of it away, so
+        batch providers only get the `pending` comments expected to fit in the length left,
+        at the speech rate measured so far, and the one expected to go over it.
+        """
+        if not supports_batch(self.tts_module):
+            return self.worker_count()
+        rate = CHARS_PER_SECOND
+        if self.length > 0 and self.spoken_chars > 0:
+            rate = self.spoken_chars / self.length
+        left = self.max_length - self.length
+        count = 0
+        for text in pending[: max(1, self.tts_module.batch_size)]:
+            count += 1
+            left -= len(text) / rate
+            if left < 0:
+                break
+        return max(1, count)
+
+    def make_pool(self) -> Executor:
+        if supports_batch(self.tts_module):
+            return BatchExecutor()
+        if supports_async(self.tts_module):
+            return ProviderLoop(self.worker_count())
+        return ThreadPoolExecutor(max_workers=self.worker_count(), thread_name_prefix="tts")
+
+    def submit(self, pool: Executor, unit: "SynthesisUnit") -> "SynthesisUnit":
+        if isinstance(pool, BatchExecutor):
+            task = self.synthesize_batch
+        elif isinstance(pool, ProviderLoop):
+            task = self.synthesize_async
+        else:
+            task = self.synthesize
+        unit.futures = [pool.submit(task, name, text) for name, text in unit.parts]
+        return unit
+
+    def collect(self, unit: "SynthesisUnit"):
+        """Waits for a unit and adds its clips to the running length, in order."""
+        durations = [future.result() for future in unit.futures]
+        for duration in durations:
+            self.add_length(duration)
+        if None not in durations:
+            self.spoken_chars += sum(len(text) for _, text in unit.parts)
+        if unit.split:
+            self.join_parts(unit)
+            try:
+                self.durations[unit.filename] = audio_duration(f"{self.path}/{unit.filename}.mp3")
+            except (OSError, ValueError):
+                pass
+        elif durations and durations[0] is not None:
+            self.durations[unit.filename] = durations[0]
+
+    def add_length(self, duration: Optional[float]):
+        if duration is None:
+            self.length = 0
+            self.spoken_chars = 0
+            return
+        self.last_clip_length = duration
+        self.length += duration
+
+    def split_post(self, text: str, idx):
+        with self.make_pool() as pool:
+            self.collect(self.submit(pool, self.plan(f"{idx}", text)))
+
+    def join_parts(self, unit: "SynthesisUnit"):
+        """Concatenates the parts of a split post and a trailing silence into one clip.
+
+        This is a single stream copy per post no matter how many parts it has.
+        """
+        split_files = [f"{self.path}/{name}.mp3" for name, _ in unit.parts]
+        if not split_files:
+            return
+        with open(f"{self.path}/list.txt", "w") as f:
+            for name, _ in unit.parts:
+                f.write("file " + f"'{name}.mp3'" + "\n")
+            f.write("file " + f"'{self.create_silence_mp3(split_files[0])}'" + "\n")
+
+        try:
+            ffmpeg.input(f"{self.path}/list.txt", f="concat", safe=0).output(
+                f"{self.path}/{unit.filename}.mp3", c="copy"
+            ).overwrite_output().run(quiet=True)
+        except ffmpeg.Error as e:
+            print(e.stderr.decode("utf8"))
         try:
             for i in range(0, len(split_files)):
                 os.unlink(split_files[i])
@@ -144,32 +338,149 @@ class TTSEngine:
             print("OSError")
 
     def call_tts(self, filename: str, text: str):
-        self.tts_module.run(
+        self.add_length(self.synthesize(filename, text))
+
+    def synthesize(self, filename: str, text: str) -> Optional[float]:
+        """Runs the TTS module for one clip and returns its duration, or None if it can't be read.
+
+        Clips already in the TTS cache are copied over without calling the provider at all.
+        This is executed on the worker threads, so it must not touch the engine's running totals.
+        """
+        if isinstance(self.tts_module, FallbackProvider):
+            return asyncio.run(self.synthesize_async(filename, text))
+        filepath = f"{self.path}/{filename}.mp3"
+        random_voice = settings.config["settings"]["tts"]["random_voice"]
+        key = self.cache_key(text, random_voice)
+        if key is not None:
+            duration = self.cache.get(key, filepath)
+            if duration is not None:
+                return duration
+
+        self.tts_module.run(text, filepath=filepath, random_voice=random_voice)
+        return self.measure(filepath, key)
+
+    async def synthesize_async(self, filename: str, text: str) -> Optional[float]:
+        """Same as `synthesize`, for providers with an async `synthesize(text, voice)`.
+
+        Only the provider request is awaited on the loop, file access goes to worker threads.
+        Clips of a fallback chain are stored under the provider that answered them.
+        """
+        filepath = f"{self.path}/{filename}.mp3"
+        random_voice = settings.config["settings"]["tts"]["random_voice"]
+        chain = self.tts_module if isinstance(self.tts_module, FallbackProvider) else None
+        provider = chain.provider_name if chain else None
+        key = self.cache_key(text, random_voice, provider)
+        if key is not None:
+            duration = await asyncio.to_thread(self.cache.get, key, filepath)
+            # a chain sticks to one provider, a hit of another one's clip is not used
+            if duration is not None and (chain is None or chain.settle(provider)):
+                return duration
+
+        if chain:
+            provider, data = await chain.answer(text)
+            key = self.cache_key(text, random_voice, provider)
+        else:
+            voice = await asyncio.to_thread(self.tts_module.get_voice, random_voice)
+            data = await self.tts_module.synthesize(text, voice)
+        if not data:
+            return None
+        return await asyncio.to_thread(self.store, filepath, data, key)
+
+    def synthesize_batch(self, jobs: List[Tuple[str, str]]) -> List[Optional[float]]:
+        """Same as `synthesize` for a list of (filename, text) jobs, for providers with `run_batch`.
+
+        Cache hits are copied over first, the provider renders all misses in a single batch.
+        """
+        random_voice = settings.config["settings"]["tts"]["random_voice"]
+        durations: List[Optional[float]] = [None] * len(jobs)
+        misses = []
+        for index, (filename, text) in enumerate(jobs):
+            filepath = f"{self.path}/{filename}.mp3"
+            key = self.cache_key(text, random_voice)
+            if key is not None:
+                durations[index] = self.cache.get(key, filepath)
+                if durations[index] is not None:
+                    continue
+            misses.append((index, filepath, key, text))
+
+        if misses:
+            self.tts_module.run_batch(
+                [(text, filepath) for _, filepath, _, text in misses], random_voice=random_voice
+            )
+            for index, filepath, key, _ in misses:
+                durations[index] = self.measure(filepath, key)
+        return durations
+
+    def cache_key(
+        self, text: str, random_voice: bool, provider: Optional[str] = None
+    ) -> Optional[str]:
+        """The cache key of a clip, by default for the provider the engine was created with.
+        Clips of a fallback chain pass the provider in it that answered them."""
+        if self.cache is None:
+            return None
+        provider = provider or type(self.tts_module).__name__
+        return TTSCache.key(
+            provider,
+            voice_key(provider, random_voice),
+            settings.config["reddit"]["thread"]["post_lang"],
             text,
-            filepath=f"{self.path}/{filename}.mp3",
-            random_voice=settings.config["settings"]["tts"]["random_voice"],
         )
+
+    def store(self, filepath: str, data: bytes, key: Optional[str]) -> Optional[float]:
+        with open(filepath, "wb") as f:
+            f.write(data)
+        return self.measure(filepath, key)
+
+    def measure(self, filepath: str, key: Optional[str]) -> Optional[float]:
+        """Returns the duration of a freshly written clip and adds it to the cache."""
         # try:
         #     self.length += MP3(f"{self.path}/{filename}.mp3").info.length
         # except (MutagenError, HeaderNotFoundError):
         #     self.length += sox.file_info.duration(f"{self.path}/{filename}.mp3")
         try:
-            clip = AudioFileClip(f"{self.path}/{filename}.mp3")
-            self.last_clip_length = clip.duration
-            self.length += clip.duration
-            clip.close()
-        except:
-            self.length = 0
+            duration = audio_duration(filepath)
+        except (OSError, ValueError):
+            # not a format the header reader knows, let ffmpeg figure it out
+            try:
+                clip = AudioFileClip(filepath)
+                duration = clip.duration
+                clip.close()
+            except:
+                return None
+        if key is not None:
+            self.cache.put(key, filepath, duration)
+        return duration
 
-    def create_silence_mp3(self):
-        silence_duration = settings.config["settings"]["tts"]["silence_duration"]
-        silence = AudioClip(
-            make_frame=lambda t: np.sin(440 * 2 * np.pi * t),
-            duration=silence_duration,
-            fps=44100,
-        )
-        silence = volumex(silence, 0)
-        silence.write_audiofile(f"{self.path}/silence.mp3", fps=44100, verbose=False, logger=None)
+    def create_silence_mp3(self, like: str) -> str:
+        """Returns the absolute path of a `silence_duration` long silence in the format of `like`.
+
+        The parts of a split post are stream copied, so the silence has to share their sample
+        rate and channel count. It is only generated once per format and duration.
+        """
+        silence_duration = float(settings.config["settings"]["tts"]["silence_duration"])
+        try:
+            info = audio_info(like)
+            sample_rate, channels = info.sample_rate, info.channels
+        except (OSError, ValueError):
+            sample_rate, channels = 44100, 1
+        return silence_mp3(silence_duration, sample_rate, channels)
+
+
+def silence_mp3(duration: float, sample_rate: int, channels: int) -> str:
+    """Generates (once) and returns an mp3 of silence, cached by duration and format."""
+    key = (round(duration, 3), sample_rate, channels)
+    with _silence_lock:
+        path = Path(SILENCE_CACHE_DIR) / f"silence-{key[0]}-{sample_rate}-{channels}.mp3"
+        if not path.is_file():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f".{os.getpid()}-{path.name}")
+            ffmpeg.input(
+                f"anullsrc=r={sample_rate}:cl={'mono' if channels == 1 else 'stereo'}",
+                f="lavfi",
+                t=key[0],
+            ).output(str(tmp), f="mp3").overwrite_output().run(quiet=True)
+            os.replace(tmp, path)
+        return str(path.resolve())
 
 
 def process_text(text: str, clean: bool = True):
@@ -0,0 +1,64 @@
+import hashlib
+import random
+import time
+
+import ffmpeg
+
+from TTS.provider import AsyncProvider
+from utils import settings
+
+__all__ = ["FakeTTS", "FakeTTSException"]
+
+CHARS_PER_SECOND: float = 15.0  # about the pace of the real voices
+MIN_DURATION: float = 0.5
+
+voices = ("tone", "noise")
+
+
+class FakeTTSException(Exception):
+    pass
+
+
+class FakeTTS(AsyncProvider):
+    """Offline stand-in for a real TTS provider, for benchmarks, CI and staging renders.
+
+    Every clip is a tone (or pink noise) as long as the text would take to read, with pitch and
+    noise seed derived from the text, so the same text always gives the same audio. Latency and
+    failures of a remote provider can be simulated with the `fake_latency` and
+    `fake_error_rate` settings, those are derived from the text as well.
+    """
+
+    def __init__(self):
+        tts_settings = settings.config["settings"]["tts"]
+        self.max_chars = 500
+        self.max_concurrency = 8
+        self.latency = float(tts_settings.get("fake_latency", 0))
+        self.error_rate = float(tts_settings.get("fake_error_rate", 0))
+
+    def get_voice(self, random_voice: bool = False) -> str:
+        if random_voice:
+            return self.randomvoice()
+        return voices[0]
+
+    def fetch(self, text: str, voice: str) -> bytes:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:4], "big")
+        rng = random.Random(seed)
+        if self.latency:
+            time.sleep(self.latency * (0.5 + rng.random()))
+        if rng.random() < self.error_rate:
+            raise FakeTTSException(f"Simulated failure for a {len(text)} character clip")
+
+        duration = max(MIN_DURATION, len(text) / CHARS_PER_SECOND)
+        if voice == "noise":
+            source = f"anoisesrc=color=pink:amplitude=0.2:seed={seed}:duration={duration:.3f}"
+        else:
+            source = f"sine=frequency={200 + seed % 400}:duration={duration:.3f}"
+        out, _ = (
+            ffmpeg.input(source, f="lavfi")
+            .output("pipe:", f="mp3", ac=1, ar=24000, **{"b:a": "64k"})
+            .run(capture_stdout=True, capture_stderr=True)
+        )
+        return out
+
+    def randomvoice(self):
+        return random.choice(voices)
@@ -0,0 +1,261 @@
+import asyncio
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from TTS.provider import AsyncProvider, supports_async
+from utils import settings
+
+__all__ = ["LatencyTracker", "FallbackProvider", "get_tracker"]
+
+DEFAULT_HEDGE_DELAY: float = 5.0  # seconds, until a provider's p95 is known
+
+
+class LatencyTracker:
+    """Exponentially weighted estimates of the median and 95th percentile latency.
+
+    Each quantile is nudged towards every new sample, by a step scaled to the EWMA of the
+    absolute deviation so it adapts to the provider's own timescale. Recent samples weigh
+    the most, so the estimates follow a provider that slows down or recovers.
+
+    Args:
+        alpha : Weight of a new sample, between 0 and 1.
+    """
+
+    def __init__(self, alpha: float = 0.1):
+        self.alpha = alpha
+        self.samples = 0
+        self.failures = 0
+        self.mean = 0.0
+        self.deviation = 0.0
+        self.p50 = 0.0
+        self.p95 = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, latency: float):
+        with self._lock:
+            if self.samples == 0:
+                self.mean = self.p50 = self.p95 = latency
+                self.deviation = latency / 2
+            else:
+                self.deviation += self.alpha * (abs(latency - self.mean) - self.deviation)
+                self.mean += self.alpha * (latency - self.mean)
+                self.p50 = self._step(self.p50, 0.50, latency)
+                self.p95 = self._step(self.p95, 0.95, latency)
+            self.samples += 1
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+
+    def _step(self, estimate: float, quantile: float, latency: float) -> float:
+        # settles where a `quantile` share of the samples lies below the estimate
+        below = 1.0 if latency < estimate else 0.0
+        return max(0.0, estimate + self.alpha * self.deviation * (quantile - below))
+
+    def hedge_delay(self, default: float) -> float:
+        """How long to wait on this provider before asking the next one as well."""
+        with self._lock:
+            return self.p95 if self.samples >= 5 else default
+
+
+_trackers: Dict[str, LatencyTracker] = {}
+_trackers_lock = threading.Lock()
+
+
+def get_tracker(name: str) -> LatencyTracker:
+    """Returns the process wide latency tracker of a provider, so it learns across videos."""
+    with _trackers_lock:
+        return _trackers.setdefault(name, LatencyTracker())
+
+
+class FallbackProvider(AsyncProvider):
+    """Asks a chain of TTS providers in turn, hedging against slow and failing ones.
+
+    Every clip goes to the first provider. If it fails, the next one is asked right away. If it
+    is still busy after its usual p95 latency, the next one is asked as well and whichever
+    answers first wins, the other request is cancelled. That keeps one slow or broken provider
+    from stalling the whole video.
+
+    The first provider to answer is kept for the rest of the video, so its voice does not
+    change halfway. From then on there is no hedging, the others are only asked when it fails.
+
+    Each provider's voice is chosen once and then pinned, so a video never switches voices
+    within a provider, random voices included. An instance lives for one video, `close()`
+    ends it.
+
+    Every provider has a thread pool of its own. A cancelled request keeps its thread until the
+    provider answers, so in a shared pool the requests of a slow provider would hold back the
+    hedges meant to get around it.
+
+    Args:
+        providers : The provider classes, primary first.
+        hedge_delay : Seconds to wait before hedging, until a provider's p95 is known.
+    """
+
+    def __init__(self, providers: list, hedge_delay: float = DEFAULT_HEDGE_DELAY):
+        self.members = []
+        self.names: List[str] = []
+        for index, provider in enumerate(providers):
+            try:
+                self.members.append(provider())
+            except Exception as e:
+                if index == 0:
+                    raise
+                print(f"Skipping the {provider.__name__} TTS fallback: {e}")
+                continue
+            self.names.append(provider.__name__)
+        self.executors = [
+            ThreadPoolExecutor(
+                max_workers=max(1, getattr(member, "max_concurrency", 1)),
+                thread_name_prefix=f"tts-{name}",
+            )
+            for member, name in zip(self.members, self.names)
+        ]
+        for member, executor in zip(self.members, self.executors):
+            if isinstance(member, AsyncProvider):
+                member.executor = executor
+        self.hedge_delay = hedge_delay
+        self.chosen: Optional[int] = None
+        self._voices: Dict[int, Optional[str]] = {}
+        self._lock = threading.Lock()
+        self._run_lock = threading.Lock()  # providers without an async side may not be thread safe
+
+        # the text is split once for all of them, so it has to fit the strictest provider
+        self.max_chars = min(member.max_chars for member in self.members)
+        self.max_concurrency = getattr(self.members[0], "max_concurrency", 1)
+
+    def close(self):
+        """Stops the thread pools of the providers, once the video is done."""
+        for executor in self.executors:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def voice(self, index: int) -> Optional[str]:
+        """The voice of a provider for this video, chosen on its first clip."""
+        with self._lock:
+            if index not in self._voices:
+                member = self.members[index]
+                random_voice = settings.config["settings"]["tts"]["random_voice"]
+                self._voices[index] = (
+                    member.get_voice(random_voice) if hasattr(member, "get_voice") else None
+                )
+            return self._voices[index]
+
+    def get_voice(self, random_voice: bool = False) -> Optional[str]:
+        return None  # every provider uses its own pinned voice
+
+    @property
+    def provider_name(self) -> str:
+        """The provider the next clips are expected from, the settled one or else the primary."""
+        return self.names[self.chosen if self.chosen is not None else 0]
+
+    def fetch(self, text: str, voice: Optional[str] = None) -> bytes:
+        return asyncio.run(self.synthesize(text, voice))
+
+    async def synthesize(self, text: str, voice: Optional[str] = None) -> bytes:
+        return (await self.answer(text))[1]
+
+    async def answer(self, text: str) -> Tuple[str, bytes]:
+        """Synthesizes one clip, returns the name of the provider that answered and the audio."""
+        tasks: Dict[asyncio.Task, int] = {}
+        answers: Dict[int, bytes] = {}
+        asked: List[int] = []
+        error: Optional[BaseException] = None
+
+        def ask(index: int):
+            tasks[asyncio.ensure_future(self.attempt(index, text))] = index
+            asked.append(index)
+
+        def ask_next():
+            ask(next(index for index in self.order() if index not in asked))
+
+        ask_next()
+        try:
+            while tasks:
+                timeout = None
+                if self.chosen is None and len(asked) < len(self.members):
+                    timeout = get_tracker(self.names[asked[-1]]).hedge_delay(self.hedge_delay)
+                done, _ = await asyncio.wait(
+                    tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:  # slower than it usually is, hedge with the next provider
+                    ask_next()
+                    continue
+                for task in done:
+                    index = tasks.pop(task)
+                    if task.exception() is None:
+                        answers[index] = task.result()
+                    else:
+                        error = task.exception()
+                if answers:
+                    chosen = self.choose(next(iter(answers)))
+                    if chosen in answers:
+                        return self.names[chosen], answers[chosen]
+                    if chosen not in asked:  # another clip settled on it in the meantime
+                        ask(chosen)
+                    elif chosen not in tasks.values():  # it failed on this clip
+                        index, data = next(iter(answers.items()))
+                        return self.names[index], data
+                elif not tasks and len(asked) < len(self.members):
+                    ask_next()  # everything asked so far failed
+        finally:
+            for task in tasks:
+                task.cancel()
+        raise error
+
+    def choose(self, index: int) -> int:
+        """Settles the video on the first provider that answers, and returns the settled one."""
+        with self._lock:
+            if self.chosen is None:
+                self.chosen = index
+            return self.chosen
+
+    def settle(self, name: str) -> bool:
+        """Settles the video on the named provider, unless it already settled on another one.
+        Returns whether the video goes on with that provider."""
+        index = self.names.index(name)
+        return self.choose(index) == index
+
+    def order(self) -> List[int]:
+        """The chain in the order it is asked, the provider the video settled on first."""
+        if self.chosen is None:
+            return list(range(len(self.members)))
+        return [self.chosen] + [i for i in range(len(self.members)) if i != self.chosen]
+
+    async def attempt(self, index: int, text: str) -> bytes:
+        """One request to one provider of the chain, timed for its latency tracker."""
+        member = self.members[index]
+        tracker = get_tracker(self.names[index])
+        start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        try:
+            voice = await asyncio.to_thread(self.voice, index)
+            if supports_async(member):
+                data = await member.synthesize(text, voice)
+            else:
+                data = await loop.run_in_executor(
+                    self.executors[index], self.run_member, member, text
+                )
+            if not data:
+                raise ValueError(f"{self.names[index]} returned no audio")
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            tracker.record_failure()
+            raise
+        tracker.record(time.perf_counter() - start)
+        return data
+
+    def run_member(self, member, text: str) -> bytes:
+        fd, path = tempfile.mkstemp(suffix=".mp3")
+        os.close(fd)
+        try:
+            with self._run_lock:
+                member.run(text, filepath=path, random_voice=False)
+            with open(path, "rb") as f:
+                return f.read()
+        finally:
+            os.unlink(path)
@@ -0,0 +1,200 @@
+import asyncio
+import concurrent.futures
+import inspect
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from typing import Dict, Optional, Set
+
+import requests
+from requests.adapters import HTTPAdapter
+
+__all__ = [
+    "AsyncProvider",
+    "BatchExecutor",
+    "ProviderLoop",
+    "http_session",
+    "supports_async",
+    "supports_batch",
+]
+
+HTTP_POOL_SIZE: int = 32  # keep-alive connections per host, above the largest `concurrency`
+
+_sessions: Dict[str, requests.Session] = {}
+_sessions_lock = threading.Lock()
+
+
+def http_session(name: str) -> requests.Session:
+    """Returns the long lived, connection pooled HTTP session of a provider.
+
+    Sessions are shared by every instance of a provider in the process, so consecutive videos
+    reuse the same TLS connections. Per request state such as cookies must be passed to each
+    request instead of being set on the session.
+    """
+    with _sessions_lock:
+        session = _sessions.get(name)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _sessions[name] = session
+        return session
+
+
+class AsyncProvider(ABC):
+    """The async side of the TTS provider protocol.
+
+    Providers implement `get_voice(random_voice)` and a blocking `fetch(text, voice)` returning
+    the encoded audio, a provider missing either cannot be created. `run()` writes that audio to
+    a file, `synthesize()` awaits it without blocking the event loop, so one loop can keep many
+    requests of a provider in flight.
+
+    Fetches run on `executor`, or on the loop's default thread pool when it is None.
+    """
+
+    executor: Optional[Executor] = None
+
+    @abstractmethod
+    def get_voice(self, random_voice: bool = False) -> Optional[str]: ...
+
+    @abstractmethod
+    def fetch(self, text: str, voice: Optional[str]) -> bytes: ...
+
+    async def synthesize(self, text: str, voice: Optional[str] = None) -> bytes:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.fetch, text, voice)
+
+    def run(self, text: str, filepath: str, random_voice: bool = False):
+        data = self.fetch(text, self.get_voice(random_voice))
+        if data:
+            with open(filepath, "wb") as f:
+                f.write(data)
+
+
+def supports_async(tts_module) -> bool:
+    return inspect.iscoroutinefunction(getattr(tts_module, "synthesize", None))
+
+
+def supports_batch(tts_module) -> bool:
+    """Whether a provider renders several clips at once through `run_batch(jobs, random_voice)`."""
+    return isinstance(getattr(tts_module, "batch_size", None), int) and callable(
+        getattr(tts_module, "run_batch", None)
+    )
+
+
+class ProviderLoop(Executor):
+    """An executor that runs coroutines on an event loop of its own, on a background thread.
+
+    `submit()` takes a coroutine function and returns a regular `concurrent.futures.Future`,
+    so synchronous callers can wait on, cancel and collect results as with a thread pool.
+    At most `max_in_flight` coroutines run at once, the rest wait for a slot in the loop.
+    Blocking calls inside the coroutines go to `asyncio.to_thread`, backed by a pool of the
+    same size, unless a provider brings an `executor` of its own.
+    """
+
+    def __init__(self, max_in_flight: int, name: str = "tts-loop"):
+        self.max_in_flight = max(1, max_in_flight)
+        self._loop = asyncio.new_event_loop()
+        self._loop.set_default_executor(
+            ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix=name)
+        )
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._pending: Set[Future] = set()
+        self._pending_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._loop.run_forever, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        future = asyncio.run_coroutine_threadsafe(self._limited(fn, args, kwargs), self._loop)
+        with self._pending_lock:
+            self._pending.add(future)
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future: Future):
+        with self._pending_lock:
+            self._pending.discard(future)
+
+    async def _limited(self, fn, args, kwargs):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_in_flight)
+        async with self._slots:
+            return await fn(*args, **kwargs)
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False):
+        with self._pending_lock:
+            pending = list(self._pending)
+        if cancel_futures:
+            for future in pending:
+                future.cancel()
+        if wait:
+            concurrent.futures.wait(pending)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.run_until_complete(self._loop.shutdown_default_executor())
+        self._loop.close()
+
+
+class _BatchFuture(Future):
+    """A future that flushes its executor's queue when its result is asked for."""
+
+    def __init__(self, executor: "BatchExecutor"):
+        super().__init__()
+        self._executor = executor
+
+    def result(self, timeout=None):
+        if not self.done():
+            self._executor.flush()
+        return super().result(timeout)
+
+    def exception(self, timeout=None):
+        if not self.done():
+            self._executor.flush()
+        return super().exception(timeout)
+
+
+class BatchExecutor(Executor):
+    """An executor that queues calls and runs them as one batch once any result is needed.
+
+    `fn` passed to `submit()` must take a list with the argument tuples of every queued call
+    and return their results in the same order. Calls cancelled before the flush are dropped.
+    This fits providers that render many clips in one go cheaper than one at a time.
+    """
+
+    def __init__(self):
+        self._queue = []
+        self._lock = threading.RLock()
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        if kwargs:
+            raise TypeError("BatchExecutor only queues positional arguments")
+        future = _BatchFuture(self)
+        with self._lock:
+            self._queue.append((fn, args, future))
+        return future
+
+    def flush(self):
+        with self._lock:
+            queue, self._queue = self._queue, []
+            batches: Dict[object, list] = {}
+            for fn, args, future in queue:
+                if future.set_running_or_notify_cancel():
+                    batches.setdefault(fn, []).append((args, future))
+            for fn, calls in batches.items():
+                try:
+                    results = fn([args for args, _ in calls])
+                except BaseException as e:
+                    for _, future in calls:
+                        future.set_exception(e)
+                    continue
+                for (_, future), result in zip(calls, results):
+                    future.set_result(result)
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False):
+        if cancel_futures:
+            with self._lock:
+                for _, _, future in self._queue:
+                    future.cancel()
+        if wait:
+            self.flush()
@@ -1,13 +1,26 @@
 import random
+from typing import List, Tuple
 
 import pyttsx3
 
 from utils import settings
 
+_engine = None
+
+
+def get_engine():
+    """The pyttsx3 engine, started once and kept alive for every following clip and video."""
+    global _engine
+    if _engine is None:
+        _engine = pyttsx3.init()
+    return _engine
+
 
 class pyttsx:
     def __init__(self):
         self.max_chars = 5000
+        self.max_concurrency = 1  # pyttsx3 engines are not thread safe
+        self.batch_size = 32  # most clips queued for one runAndWait, fewer near max_length
         self.voices = []
 
     def run(
@@ -16,27 +29,29 @@ class pyttsx:
         filepath: str,
         random_voice=False,
     ):
+        self.run_batch([(text, filepath)], random_voice)
+
+    def run_batch(self, jobs: List[Tuple[str, str]], random_voice=False):
+        """Queues every (text, filepath) job on one engine and renders them with one runAndWait."""
+        engine = get_engine()
+        voices = engine.getProperty("voices")
+        for text, filepath in jobs:
+            # property changes are queued along with the clips, so each clip gets its own voice
+            engine.setProperty(
+                "voice", voices[self.voice_id(random_voice)].id
+            )  # changing index changes voices but ony 0 and 1 are working here
+            engine.save_to_file(text, f"{filepath}")
+        engine.runAndWait()
+
+    def voice_id(self, random_voice=False) -> int:
         voice_id = settings.config["settings"]["tts"]["python_voice"]
         voice_num = settings.config["settings"]["tts"]["py_voice_num"]
         if voice_id == "" or voice_num == "":
-            voice_id = 2
-            voice_num = 3
             raise ValueError("set pyttsx values to a valid value, switching to defaults")
-        else:
-            voice_id = int(voice_id)
-            voice_num = int(voice_num)
-        for i in range(voice_num):
-            self.voices.append(i)
-            i = +1
+        self.voices = list(range(int(voice_num)))
         if random_voice:
-            voice_id = self.randomvoice()
-        engine = pyttsx3.init()
-        voices = engine.getProperty("voices")
-        engine.setProperty(
-            "voice", voices[voice_id].id
-        )  # changing index changes voices but ony 0 and 1 are working here
-        engine.save_to_file(text, f"{filepath}")
-        engine.runAndWait()
+            return self.randomvoice()
+        return int(voice_id)
 
     def randomvoice(self):
         return random.choice(self.voices)
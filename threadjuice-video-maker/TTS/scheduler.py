@@ -0,0 +1,288 @@
+import itertools
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, List, Mapping, Optional, Tuple
+
+import requests
+
+__all__ = [
+    "TokenBucket",
+    "RequestScheduler",
+    "RoundRobin",
+    "get_scheduler",
+    "scheduler_stats",
+]
+
+# (requests per second, burst) a provider starts out with, until its headers say otherwise
+DEFAULT_RATES: Dict[str, Tuple[float, int]] = {
+    "tiktok": (2.0, 4),
+    "streamlabs": (1.0, 2),
+}
+DEFAULT_RATE: Tuple[float, int] = (2.0, 2)
+
+RETRY_STATUS: Tuple[int, ...] = (429, 500, 502, 503, 504)
+
+
+def _header(headers: Mapping[str, str], name: str) -> Optional[str]:
+    for key, value in headers.items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+def _number(value: Optional[str]) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_delay(headers: Mapping[str, str], now: Optional[float] = None) -> Optional[float]:
+    """Seconds the server asked us to wait, from Retry-After or X-RateLimit-Reset.
+
+    Both may hold a delay in seconds. Retry-After may also be an HTTP date, and
+    X-RateLimit-Reset a unix timestamp (Streamlabs sends those).
+    """
+    now = time.time() if now is None else now
+    retry_after = _header(headers, "retry-after")
+    if retry_after is not None:
+        seconds = _number(retry_after)
+        if seconds is None:
+            try:
+                seconds = parsedate_to_datetime(retry_after).timestamp() - now
+            except (TypeError, ValueError):
+                seconds = None
+        if seconds is not None:
+            return max(0.0, seconds)
+    reset = _number(_header(headers, "x-ratelimit-reset"))
+    if reset is None:
+        return None
+    if reset > 1e9:  # a timestamp rather than a delay
+        reset -= now
+    return max(0.0, reset)
+
+
+class TokenBucket:
+    """Classic token bucket, refilled at `rate` tokens per second up to `capacity`.
+
+    The current fill is corrected from the rate limit headers of each response. A window with
+    little left also caps the rate until it resets, the configured rate applies again after
+    that, so one tight window does not slow the provider down for good.
+
+    Args:
+        rate : Tokens added per second.
+        capacity : The largest burst allowed.
+        clock : Monotonic clock, replaceable for tests.
+        sleep : Sleep function, replaceable for tests.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: int,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.blocked_until = 0.0
+        self.window_rate = rate  # the rate the last rate limit window allows, until it resets
+        self.window_until = 0.0
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def rate_at(self, now: float) -> float:
+        """Tokens added per second at `now`, the configured rate unless a window caps it."""
+        return min(self.rate, self.window_rate) if now < self.window_until else self.rate
+
+    def _refill(self, now: float):
+        capped = max(0.0, min(now, self.window_until) - self._updated)
+        added = capped * self.rate_at(self._updated) + (now - self._updated - capped) * self.rate
+        self.tokens = min(self.capacity, self.tokens + added)
+        self._updated = now
+
+    def acquire(self) -> float:
+        """Blocks until a token is available and takes it. Returns the seconds spent waiting."""
+        start = self._clock()
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._refill(now)
+                wait = self.blocked_until - now
+                if wait <= 0:
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return now - start
+                    wait = (1 - self.tokens) / self.rate_at(now)
+                    if now < self.window_until:
+                        wait = min(wait, self.window_until - now)
+            self._sleep(wait)
+
+    def pause(self, seconds: float):
+        """Hands out no tokens for `seconds`, to every caller sharing the bucket."""
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, self._clock() + seconds)
+
+    def update(self, headers: Mapping[str, str]):
+        """Seeds the bucket from X-RateLimit-Remaining and X-RateLimit-Reset, when sent."""
+        remaining = _number(_header(headers, "x-ratelimit-remaining"))
+        if remaining is None:
+            return
+        reset = retry_delay({"X-RateLimit-Reset": _header(headers, "x-ratelimit-reset")})
+        with self._lock:
+            self._refill(self._clock())
+            self.tokens = min(float(self.capacity), remaining)
+            if reset:
+                if remaining < 1:
+                    self.blocked_until = max(self.blocked_until, self._clock() + reset)
+                else:
+                    # spread what is left of the window evenly over the time until it resets
+                    self.window_rate = remaining / reset
+                    self.window_until = self._clock() + reset
+
+
+class RequestScheduler:
+    """Paces the HTTP requests of one provider and retries the ones it throttled.
+
+    Every request takes a token from the provider's bucket first. Throttled (429) and failed
+    (5xx, connection errors) requests are retried with exponential backoff and full jitter,
+    waiting at least as long as the server asked to. That pause is applied to the bucket,
+    so every thread talking to the provider backs off together instead of hammering it.
+
+    Args:
+        name : The provider, used in the stats.
+        rate : Requests per second before any header was seen.
+        burst : The bucket capacity.
+        max_retries : Retries per request before the last response (or error) is returned.
+        base_delay : Backoff of the first retry, doubled on every following one.
+        max_delay : Upper bound of the backoff.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        rate: float,
+        burst: int,
+        max_retries: int = 5,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        sleep: Callable[[float], None] = time.sleep,
+        bucket: Optional[TokenBucket] = None,
+    ):
+        self.name = name
+        self.bucket = bucket or TokenBucket(rate, burst, sleep=sleep)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+        self.throttled_seconds = 0.0
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+    def request(self, send: Callable[[], requests.Response]) -> requests.Response:
+        """Sends a request through the bucket, retrying it while the provider pushes back."""
+        attempt = 0
+        while True:
+            self._enter()
+            waited = 0.0
+            try:
+                waited = self.bucket.acquire()
+            finally:
+                self._leave(waited)
+
+            try:
+                response = send()
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.max_retries:
+                    raise
+                self._retry(self.backoff(attempt))
+                attempt += 1
+                continue
+
+            self.bucket.update(response.headers)
+            if response.status_code not in RETRY_STATUS or attempt >= self.max_retries:
+                return response
+            delay = max(retry_delay(response.headers) or 0.0, self.backoff(attempt))
+            self.bucket.pause(delay)
+            self._retry(0.0)
+            attempt += 1
+
+    def _enter(self):
+        with self._lock:
+            self.requests += 1
+            self.queue_depth += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+
+    def _leave(self, waited: float):
+        with self._lock:
+            self.queue_depth -= 1
+            self.throttled_seconds += waited
+
+    def _retry(self, delay: float):
+        with self._lock:
+            self.retries += 1
+            self.throttled_seconds += delay
+        if delay > 0:
+            self._sleep(delay)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "retries": self.retries,
+                "throttled_seconds": round(self.throttled_seconds, 3),
+                "queue_depth": self.queue_depth,
+                "max_queue_depth": self.max_queue_depth,
+            }
+
+
+class RoundRobin:
+    """Thread safe rotation over several credentials, e.g. TikTok session ids."""
+
+    def __init__(self, items: List[str]):
+        if not items:
+            raise ValueError("RoundRobin needs at least one item")
+        self.items = items
+        self._cycle = itertools.cycle(range(len(items)))
+        self._lock = threading.Lock()
+
+    def next(self) -> Tuple[int, str]:
+        with self._lock:
+            index = next(self._cycle)
+        return index, self.items[index]
+
+
+_schedulers: Dict[str, RequestScheduler] = {}
+_schedulers_lock = threading.Lock()
+
+
+def get_scheduler(name: str, provider: Optional[str] = None) -> RequestScheduler:
+    """Returns the process wide scheduler of `name`, so concurrent jobs share one budget.
+
+    `provider` picks the default rate, it defaults to `name`. Credentials with a budget of
+    their own get a scheduler each, e.g. "tiktok:0" and "tiktok:1" for two session ids.
+    """
+    with _schedulers_lock:
+        scheduler = _schedulers.get(name)
+        if scheduler is None:
+            rate, burst = DEFAULT_RATES.get(provider or name, DEFAULT_RATE)
+            scheduler = RequestScheduler(name, rate, burst)
+            _schedulers[name] = scheduler
+        return scheduler
+
+
+def scheduler_stats() -> Dict[str, Dict[str, float]]:
+    with _schedulers_lock:
+        schedulers = list(_schedulers.values())
+    return {scheduler.name: scheduler.stats() for scheduler in schedulers}
@@ -1,10 +1,10 @@
 import random
 
-import requests
 from requests.exceptions import JSONDecodeError
 
+from TTS.provider import AsyncProvider, http_session
+from TTS.scheduler import get_scheduler
 from utils import settings
-from utils.voice import check_ratelimit
 
 voices = [
     "Brian",
@@ -28,40 +28,39 @@ voices = [
 # valid voices https://lazypy.ro/tts/
 
 
-class StreamlabsPolly:
+class StreamlabsPolly(AsyncProvider):
     def __init__(self):
         self.url = "https://streamlabs.com/polly/speak"
         self.max_chars = 550
+        self.max_concurrency = 2
         self.voices = voices
+        self._session = http_session("streamlabs")
 
-    def run(self, text, filepath, random_voice: bool = False):
+    def get_voice(self, random_voice: bool = False) -> str:
         if random_voice:
-            voice = self.randomvoice()
-        else:
-            if not settings.config["settings"]["tts"]["streamlabs_polly_voice"]:
-                raise ValueError(
-                    f"Please set the config variable STREAMLABS_POLLY_VOICE to a valid voice. options are: {voices}"
-                )
-            voice = str(settings.config["settings"]["tts"]["streamlabs_polly_voice"]).capitalize()
+            return self.randomvoice()
+        if not settings.config["settings"]["tts"]["streamlabs_polly_voice"]:
+            raise ValueError(
+                f"Please set the config variable STREAMLABS_POLLY_VOICE to a valid voice. options are: {voices}"
+            )
+        return str(settings.config["settings"]["tts"]["streamlabs_polly_voice"]).capitalize()
 
+    def fetch(self, text: str, voice: str) -> bytes:
         body = {"voice": voice, "text": text, "service": "polly"}
         headers = {"Referer": "https://streamlabs.com/"}
-        response = requests.post(self.url, headers=headers, data=body)
+        response = get_scheduler("streamlabs").request(
+            lambda: self._session.post(self.url, headers=headers, data=body)
+        )
 
-        if not check_ratelimit(response):
-            self.run(text, filepath, random_voice)
-
-        else:
+        try:
+            return self._session.get(response.json()["speak_url"]).content
+        except (KeyError, JSONDecodeError):
             try:
-                voice_data = requests.get(response.json()["speak_url"])
-                with open(filepath, "wb") as f:
-                    f.write(voice_data.content)
+                if response.json()["error"] == "No text specified!":
+                    raise ValueError("Please specify a text to convert to speech.")
             except (KeyError, JSONDecodeError):
-                try:
-                    if response.json()["error"] == "No text specified!":
-                        raise ValueError("Please specify a text to convert to speech.")
-                except (KeyError, JSONDecodeError):
-                    print("Error occurred calling Streamlabs Polly")
+                print("Error occurred calling Streamlabs Polly")
+        return b""
 
     def randomvoice(self):
         return random.choice(self.voices)
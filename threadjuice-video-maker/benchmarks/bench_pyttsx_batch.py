@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+"""
+Benchmark for the pyttsx batch mode
+Compares rendering clips one runAndWait at a time with queueing them all on one engine
+
+Usage:
+    python benchmarks/bench_pyttsx_batch.py [--clips 10 30] [--repeat 3]
+
+Requires a pyttsx3 driver (espeak on Linux, SAPI5 on Windows, NSSpeechSynthesizer on macOS).
+"""
+
+import argparse
+import json
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+import pyttsx3
+
+from TTS.pyttsx import pyttsx
+from utils import settings
+
+SENTENCE = "My roommate labelled every single egg in the fridge with a different name. "
+
+
+def per_clip(provider: pyttsx, jobs):
+    """The path as it was before: a fresh engine and a runAndWait for every clip"""
+    for text, filepath in jobs:
+        engine = pyttsx3.init()
+        voices = engine.getProperty("voices")
+        engine.setProperty("voice", voices[provider.voice_id()].id)
+        engine.save_to_file(text, filepath)
+        engine.runAndWait()
+        del engine
+
+
+def batched(provider: pyttsx, jobs):
+    provider.run_batch(jobs)
+
+
+def measure(function, provider, jobs, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(provider, jobs)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pyttsx batch synthesis")
+    parser.add_argument("--clips", type=int, nargs="+", default=[10, 30])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    settings.config = {
+        "settings": {"tts": {"python_voice": "0", "py_voice_num": "1", "random_voice": False}}
+    }
+
+    workdir = Path(tempfile.mkdtemp(prefix="bench-pyttsx-"))
+    provider = pyttsx()
+    results = []
+    try:
+        for clips in args.clips:
+            jobs = [(SENTENCE * 2, str(workdir / f"{i}.mp3")) for i in range(clips)]
+            legacy = measure(per_clip, provider, jobs, args.repeat)
+            batch = measure(batched, provider, jobs, args.repeat)
+            results.append(
+                {
+                    "clips": clips,
+                    "per_clip_seconds": round(legacy, 3),
+                    "batch_seconds": round(batch, 3),
+                    "speedup": round(legacy / batch, 1),
+                }
+            )
+            print(json.dumps(results[-1]))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(json.dumps({"pyttsx_batch": results}, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+"""
+Benchmark for TTSEngine.split_post
+Compares the old concat-per-chunk assembly with the single concat on long posts
+
+Usage:
+    python benchmarks/bench_split_post.py [--sizes 5000 10000 15000 20000] [--repeat 3]
+
+The TTS provider is a stub that copies a pre-generated tone, so only the assembly is measured.
+Requires ffmpeg on the PATH.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+import ffmpeg
+
+from TTS.engine_wrapper import TTSEngine
+from utils import settings
+
+SENTENCE = "My landlord said the rent covers everything except the things I actually use. "
+
+
+class StubTTS:
+    """Copies a fixed clip instead of calling a provider, TikTok sized chunks"""
+
+    clip = None
+
+    def __init__(self):
+        self.max_chars = 200
+        self.max_concurrency = 4
+
+    def run(self, text, filepath, random_voice: bool = False):
+        shutil.copyfile(self.clip, filepath)
+
+
+def legacy_split_post(engine: TTSEngine, text: str, idx):
+    """The assembly as it was before: list.txt and a concat for every single chunk"""
+    split_files = []
+    split_text = engine.split_text(text)
+    silence = engine.create_silence_mp3(StubTTS.clip)
+    for idy, text_cut in enumerate(split_text):
+        engine.call_tts(f"{idx}-{idy}.part", text_cut)
+        with open(f"{engine.path}/list.txt", "w") as f:
+            for idz in range(0, idy + 1):
+                f.write("file " + f"'{idx}-{idz}.part.mp3'" + "\n")
+            split_files.append(str(f"{engine.path}/{idx}-{idy}.part.mp3"))
+            f.write("file " + f"'{silence}'" + "\n")
+        os.system(
+            "ffmpeg -f concat -y -hide_banner -loglevel panic -safe 0 "
+            + f"-i {engine.path}/list.txt -c copy {engine.path}/{idx}.mp3"
+        )
+    for file in split_files:
+        os.unlink(file)
+
+
+def measure(function, engine, text, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(engine, text, 0)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark split post assembly")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5000, 10000, 15000, 20000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    settings.config = {
+        "settings": {
+            "storymode": False,
+            "tts": {
+                "random_voice": False,
+                "silence_duration": 0.3,
+                "no_emojis": False,
+                "cache": False,
+                "concurrency": 4,
+            },
+        },
+        "reddit": {"thread": {"post_lang": ""}},
+    }
+
+    workdir = Path(tempfile.mkdtemp(prefix="bench-split-"))
+    os.chdir(workdir)  # the silence cache lives relative to the working directory
+    StubTTS.clip = str(workdir / "tone.mp3")
+    ffmpeg.input("sine=frequency=440:duration=3", f="lavfi").output(
+        StubTTS.clip, ar=24000, ac=1
+    ).run(quiet=True)
+
+    results = []
+    try:
+        for size in args.sizes:
+            text = (SENTENCE * (size // len(SENTENCE) + 1))[:size]
+            engine = TTSEngine(StubTTS, {"thread_id": f"bench{size}"}, path=f"{workdir}/")
+            Path(engine.path).mkdir(parents=True, exist_ok=True)
+            chunks = len(engine.split_text(text))
+            legacy = measure(legacy_split_post, engine, text, args.repeat)
+            current = measure(TTSEngine.split_post, engine, text, args.repeat)
+            results.append(
+                {
+                    "characters": size,
+                    "chunks": chunks,
+                    "legacy_seconds": round(legacy, 3),
+                    "single_concat_seconds": round(current, 3),
+                    "speedup": round(legacy / current, 1),
+                }
+            )
+            print(json.dumps(results[-1]))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(json.dumps({"split_post": results}, indent=4))
+
+
+if __name__ == "__main__":
+    main()
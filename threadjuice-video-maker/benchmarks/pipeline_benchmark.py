@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+"""
+End to end pipeline benchmark, fully offline
+Runs save_text_to_mp3 -> chop_background -> make_final_video on the fixture stories
+
+Usage:
+    python benchmarks/pipeline_benchmark.py [--stories 3] [--latency 0] [--error-rate 0] [--output results.json]
+
+Audio comes from the fake TTS provider, the background from lavfi test sources and the
+screenshots are plain cards drawn with PIL, so nothing touches the network.
+Peak RSS is the high-water mark so far, of this process and of its largest child (ffmpeg).
+Requires ffmpeg on the PATH. Run it from anywhere, it works from the project root.
+"""
+
+import argparse
+import json
+import os
+import resource
+import shutil
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.append(str(ROOT))
+os.chdir(ROOT)  # the pipeline uses paths relative to the project root
+
+import ffmpeg
+import toml
+from PIL import Image, ImageDraw, ImageFont
+
+from threadjuice.story_fetcher import ThreadJuiceStory
+from utils import settings
+
+FIXTURES = ROOT / "tests" / "fixtures" / "mock_stories.json"
+SUBREDDIT = "benchmark"
+BACKGROUND = {
+    "video": ("", "lavfi.mp4", "benchmark", "center"),
+    "audio": ("", "lavfi.mp3", "benchmark"),
+}
+
+
+def template_defaults(node: dict) -> dict:
+    """The config template with every setting at its default"""
+    config = {}
+    for key, value in node.items():
+        if isinstance(value, dict) and "optional" not in value:
+            config[key] = template_defaults(value)
+        elif isinstance(value, dict):
+            config[key] = value.get("default", "")
+    return config
+
+
+def configure(latency: float, error_rate: float):
+    config = template_defaults(toml.load(ROOT / "utils" / ".config.template.toml"))
+    config["reddit"]["thread"]["subreddit"] = SUBREDDIT
+    config["settings"]["storymode"] = False
+    config["settings"]["background"]["background_thumbnail"] = False
+    config["settings"]["background"]["enable_extra_audio"] = False
+    config["settings"]["tts"].update(
+        {
+            "voice_choice": "fake",
+            "random_voice": False,
+            "cache": False,
+            "fake_latency": latency,
+            "fake_error_rate": error_rate,
+        }
+    )
+    settings.config = config
+
+
+def make_backgrounds(duration: int = 180):
+    """Generates the background footage and music once, with lavfi sources"""
+    video = Path("assets/backgrounds/video/benchmark-lavfi.mp4")
+    audio = Path("assets/backgrounds/audio/benchmark-lavfi.mp3")
+    video.parent.mkdir(parents=True, exist_ok=True)
+    audio.parent.mkdir(parents=True, exist_ok=True)
+    if not video.exists():
+        ffmpeg.input(f"testsrc2=size=1920x1080:rate=30:duration={duration}", f="lavfi").output(
+            str(video), pix_fmt="yuv420p"
+        ).run(quiet=True)
+    if not audio.exists():
+        ffmpeg.input(f"anoisesrc=color=brown:amplitude=0.1:duration={duration}", f="lavfi").output(
+            str(audio)
+        ).run(quiet=True)
+
+
+def to_reddit_object(story: ThreadJuiceStory) -> dict:
+    """The same conversion threadjuice_main does"""
+    return {
+        "thread_id": f"bench-{story.data['slug']}"[:60],
+        "thread_title": story.title,
+        "thread_post": story.selftext,
+        "thread_url": story.url,
+        "is_nsfw": False,
+        "comments": [
+            {
+                "comment_id": f"comment_{i}",
+                "comment_body": comment["body"],
+                "comment_url": story.url,
+            }
+            for i, comment in enumerate(story.comments)
+        ],
+    }
+
+
+def draw_cards(reddit_object: dict):
+    """Stands in for the screenshot stage, one card per comment"""
+    folder = Path(f"assets/temp/{reddit_object['thread_id']}/png")
+    folder.mkdir(parents=True, exist_ok=True)
+    font = ImageFont.truetype(os.path.join("fonts", "Roboto-Regular.ttf"), 32)
+    for i, comment in enumerate(reddit_object["comments"] + [{"comment_body": ""}]):
+        card = Image.new("RGBA", (1000, 300), (26, 26, 27, 255))
+        ImageDraw.Draw(card).multiline_text((30, 30), comment["comment_body"][:60], font=font)
+        card.save(folder / f"comment_{i}.png")
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return (
+        round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+    )
+
+
+def timed(stages: dict, name: str, function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    own, child = peak_rss_mb()
+    stages[name] = {
+        "seconds": round(time.perf_counter() - start, 3),
+        "peak_rss_mb": own,
+        "peak_child_rss_mb": child,
+    }
+    return result
+
+
+def run_story(story: ThreadJuiceStory) -> dict:
+    from video_creation.background import chop_background
+    from video_creation.final_video import make_final_video
+    from video_creation.voices import save_text_to_mp3
+
+    reddit_object = to_reddit_object(story)
+    temp = Path(f"assets/temp/{reddit_object['thread_id']}")
+    (temp / "mp3").mkdir(parents=True, exist_ok=True)
+    stages = {}
+    start = time.perf_counter()
+    try:
+        length, number_of_comments = timed(stages, "tts", save_text_to_mp3, reddit_object)
+        timed(stages, "cards", draw_cards, reddit_object)
+        timed(stages, "chop_background", chop_background, BACKGROUND, length, reddit_object)
+        timed(
+            stages,
+            "final_video",
+            make_final_video,
+            number_of_comments,
+            int(length),
+            reddit_object,
+            BACKGROUND,
+        )
+    finally:
+        shutil.rmtree(temp, ignore_errors=True)
+    return {
+        "story": story.data["slug"],
+        "audio_seconds": round(length, 2),
+        "comments": number_of_comments,
+        "total_seconds": round(time.perf_counter() - start, 3),
+        "stages": stages,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the video pipeline offline")
+    parser.add_argument("--stories", type=int, default=3, help="How many fixture stories to render")
+    parser.add_argument("--latency", type=float, default=0.0, help="Simulated TTS latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Simulated TTS failures")
+    parser.add_argument("--output", type=str, help="Also write the report to this file")
+    args = parser.parse_args()
+
+    configure(args.latency, args.error_rate)
+    make_backgrounds()
+
+    with open(FIXTURES, encoding="utf-8") as f:
+        stories = [ThreadJuiceStory(data) for data in json.load(f)["stories"][: args.stories]]
+
+    # rendering appends to the list of done videos, keep it as it was. It is not part of a
+    # fresh checkout, so an empty one is made for the run and removed afterwards
+    videos_json = Path("video_creation/data/videos.json")
+    saved_videos = videos_json.read_text(encoding="utf-8") if videos_json.exists() else None
+    if saved_videos is None:
+        videos_json.parent.mkdir(parents=True, exist_ok=True)
+        videos_json.write_text("[]", encoding="utf-8")
+    try:
+        runs = [run_story(story) for story in stories]
+    finally:
+        if saved_videos is not None:
+            videos_json.write_text(saved_videos, encoding="utf-8")
+        else:
+            videos_json.unlink(missing_ok=True)
+        shutil.rmtree(f"results/{SUBREDDIT}", ignore_errors=True)
+
+    report = {
+        "python": sys.version.split()[0],
+        "cpu_count": os.cpu_count(),
+        "stories": runs,
+        "total_seconds": round(sum(run["total_seconds"] for run in runs), 3),
+    }
+    print(json.dumps(report, indent=4))
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=4), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
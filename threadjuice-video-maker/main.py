@@ -1,4 +1,5 @@
 #!/usr/bin/env python
+import argparse
 import math
 import sys
 from os import name
@@ -10,6 +11,7 @@ from prawcore import ResponseException
 
 from reddit.subreddit import get_subreddit_threads
 from utils import settings
+from utils.checkpoint import JobManifest, forget_job, last_job, remember_job
 from utils.cleanup import cleanup
 from utils.console import print_markdown, print_step, print_substep
 from utils.ffmpeg_install import ffmpeg_install
@@ -21,7 +23,7 @@ from video_creation.background import (
     download_background_video,
     get_background_config,
 )
-from video_creation.final_video import make_final_video
+from video_creation.final_video import Preview, make_final_video
 from video_creation.screenshot_downloader import get_screenshots_of_reddit_posts
 from video_creation.voices import save_text_to_mp3
 
@@ -43,29 +45,85 @@ print_markdown(
 checkversion(__VERSION__)
 
 
-def main(POST_ID=None) -> None:
+def main(POST_ID=None, resume=False, preview=None) -> None:
     global redditid, reddit_object
-    reddit_object = get_subreddit_threads(POST_ID)
+    if resume and POST_ID is None:
+        POST_ID = last_job()  # the video that failed last time
+    thread_settings = {
+        key: value for key, value in settings.config["reddit"]["thread"].items() if key != "post_id"
+    }
+    manifest = JobManifest(POST_ID, resume) if POST_ID else None
+    if manifest is not None and manifest.is_done("fetch", [POST_ID, thread_settings]):
+        reddit_object = manifest.result("fetch")
+    else:
+        reddit_object = get_subreddit_threads(POST_ID)
+        manifest = JobManifest(reddit_object["thread_id"], resume)
+        manifest.record("fetch", [reddit_object["thread_id"], thread_settings], result=reddit_object)
+    remember_job(reddit_object["thread_id"])
     redditid = id(reddit_object)
-    length, number_of_comments = save_text_to_mp3(reddit_object)
-    length = math.ceil(length)
-    get_screenshots_of_reddit_posts(reddit_object, number_of_comments)
-    bg_config = {
-        "video": get_background_config("video"),
-        "audio": get_background_config("audio"),
+    folder = manifest.folder
+    video_settings = {
+        key: settings.config["settings"][key]
+        for key in ("storymode", "storymodemethod", "resolution_w", "resolution_h", "theme", "zoom")
     }
+
+    length, number_of_comments = manifest.run(
+        "tts",
+        [reddit_object, settings.config["settings"]["tts"], video_settings, thread_settings],
+        lambda: save_text_to_mp3(reddit_object),
+        outputs=[folder / "mp3"],
+    )
+    length = math.ceil(length)
+    manifest.run(
+        "screenshots",
+        [reddit_object, number_of_comments, video_settings, thread_settings],
+        lambda: get_screenshots_of_reddit_posts(reddit_object, number_of_comments),
+        outputs=[folder / "png"],
+    )
+
+    background_settings = settings.config["settings"]["background"]
+    # the choice may be random, so it is recorded to keep the same background when resuming.
+    # The position of the video is left out, the crop of the render graph is always centered
+    chosen = manifest.run(
+        "background",
+        [background_settings["background_video"], background_settings["background_audio"]],
+        lambda: {
+            "video": list(get_background_config("video")[:3]),
+            "audio": list(get_background_config("audio")),
+        },
+    )
+    bg_config = {"video": (*chosen["video"], "center"), "audio": tuple(chosen["audio"])}
     download_background_video(bg_config["video"])
     download_background_audio(bg_config["audio"])
-    chop_background(bg_config, length, reddit_object)
-    make_final_video(number_of_comments, length, reddit_object, bg_config)
+    manifest.run(
+        "chop",
+        [chosen, length, background_settings["background_audio_volume"]],
+        lambda: chop_background(bg_config, length, reddit_object),
+        outputs=[folder / "background.json"],
+    )
+    manifest.run(
+        "render" if preview is None else "preview",
+        [
+            preview,
+            folder / "mp3",
+            folder / "png",
+            folder / "background.json",
+            settings.config["settings"],
+            reddit_object,
+        ],
+        lambda: make_final_video(number_of_comments, length, reddit_object, bg_config, preview),
+        outputs=lambda video_path: [video_path],
+    )
+    if preview is None:
+        forget_job()  # after a preview, --resume goes on with the real render
 
 
-def run_many(times) -> None:
+def run_many(times, resume=False, preview=None) -> None:
     for x in range(1, times + 1):
         print_step(
             f'on the {x}{("th", "st", "nd", "rd", "th", "th", "th", "th", "th", "th")[x % 10]} iteration of {times}'
         )  # correct 1st 2nd 3rd 4th 5th....
-        main()
+        main(resume=resume and x == 1, preview=preview)
         Popen("cls" if name == "nt" else "clear", shell=True).wait()
 
 
@@ -84,6 +142,22 @@ if __name__ == "__main__":
             "Hey! Congratulations, you've made it so far (which is pretty rare with no Python 3.10). Unfortunately, this program only works on Python 3.10. Please install Python 3.10 and try again."
         )
         sys.exit()
+    parser = argparse.ArgumentParser(description="Make videos out of Reddit threads")
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Pick up the last failed video, skipping the stages it already finished",
+    )
+    parser.add_argument(
+        "--preview",
+        action="store_true",
+        help="Render a quick low resolution preview to check the timing and layout",
+    )
+    parser.add_argument(
+        "--preview-seconds", type=float, help="Only preview the first seconds of the video"
+    )
+    args = parser.parse_args()
+    preview = Preview(seconds=args.preview_seconds) if args.preview else None
     ffmpeg_install()
     directory = Path().absolute()
     config = settings.check_toml(
@@ -107,12 +181,12 @@ if __name__ == "__main__":
                 print_step(
                     f'on the {index}{("st" if index % 10 == 1 else ("nd" if index % 10 == 2 else ("rd" if index % 10 == 3 else "th")))} post of {len(config["reddit"]["thread"]["post_id"].split("+"))}'
                 )
-                main(post_id)
+                main(post_id, resume=args.resume, preview=preview)
                 Popen("cls" if name == "nt" else "clear", shell=True).wait()
         elif config["settings"]["times_to_run"]:
-            run_many(config["settings"]["times_to_run"])
+            run_many(config["settings"]["times_to_run"], resume=args.resume, preview=preview)
         else:
-            main()
+            main(resume=args.resume, preview=preview)
     except KeyboardInterrupt:
         shutdown()
     except ResponseException:
@@ -0,0 +1,63 @@
+"""
+Integration tests for on-demand background segments
+Testing range fetches against a local HTTP server serving a generated MP4
+"""
+
+import functools
+import shutil
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import ffmpeg
+import pytest
+
+from video_creation.background_segments import fetch_chunk
+
+pytestmark = pytest.mark.skipif(
+    shutil.which('ffmpeg') is None or shutil.which('ffprobe') is None,
+    reason='ffmpeg is not installed'
+)
+
+
+@pytest.fixture
+def served_video(tmp_path):
+    """A 60 second MP4 with a keyframe every 2 seconds, served over HTTP"""
+    served = tmp_path / 'served'
+    served.mkdir()
+    ffmpeg.input('testsrc2=size=320x568:rate=30:duration=60', f='lavfi').output(
+        str(served / 'fixture.mp4'), g=60, movflags='+faststart', **{'c:v': 'libx264', 'preset': 'ultrafast'}
+    ).overwrite_output().run(quiet=True)
+
+    handler = functools.partial(SimpleHTTPRequestHandler, directory=str(served))
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}/fixture.mp4'
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.integration
+@pytest.mark.slow
+class TestFetchChunk:
+    """Test copying a range out of a remote video"""
+
+    def test_fetches_only_the_range(self, served_video, tmp_path):
+        """The chunk holds the asked seconds, without re-encoding"""
+        path = tmp_path / 'chunks' / '20-40.mp4'
+        duration = fetch_chunk(served_video, 20, 20, path)
+
+        assert path.is_file()
+        assert not path.with_suffix('.part.mp4').exists()
+        assert 19 <= duration <= 22
+        [stream] = ffmpeg.probe(str(path))['streams']
+        assert stream['codec_name'] == 'h264'
+
+    def test_failed_fetch_leaves_nothing(self, served_video, tmp_path):
+        """A missing source raises and leaves no partial chunk"""
+        path = tmp_path / 'chunks' / '0-20.mp4'
+        with pytest.raises(ffmpeg.Error):
+            fetch_chunk(served_video.replace('fixture', 'missing'), 0, 20, path)
+
+        assert not path.exists()
+        assert not path.with_suffix('.part.mp4').exists()
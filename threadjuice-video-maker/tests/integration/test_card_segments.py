@@ -0,0 +1,53 @@
+"""
+Integration tests for the card track of a segmented render
+Testing that the parts show every card on the same frames as the whole, with ffmpeg's framemd5
+"""
+
+import random
+import shutil
+
+import ffmpeg
+import pytest
+from PIL import Image
+
+from video_creation.card_track import CardTrack
+from video_creation.final_video import segment_bounds
+
+pytestmark = pytest.mark.skipif(shutil.which('ffmpeg') is None, reason='ffmpeg is not installed')
+
+
+def framemd5(stream, fps, frames):
+    """The hash of every frame ffmpeg renders from a card stream at the video frame rate"""
+    out, _ = stream.output(
+        'pipe:', f='framemd5', r=fps, pix_fmt='rgba', **{'frames:v': frames}
+    ).run(capture_stdout=True, quiet=True)
+    return [line.split(',')[-1].strip() for line in out.decode().splitlines() if not line.startswith('#')]
+
+
+@pytest.mark.integration
+@pytest.mark.slow
+class TestSegmentedCards:
+    """Test cutting the card track for a parallel render"""
+
+    @pytest.mark.parametrize('fps', [15, 30, 60])
+    @pytest.mark.parametrize('seed', range(20))
+    def test_parts_match_the_whole(self, seed, fps, tmp_path):
+        """The frames of the parts, one after the other, are the frames of the whole track"""
+        rng = random.Random(seed)
+        track = CardTrack(str(tmp_path / 'cards'), width=40, fps=fps)
+        time = 0.0
+        for i in range(8):
+            image = tmp_path / f'shot_{i}.png'
+            Image.new('RGB', (40, 20), (30 * i, seed, 100)).save(image)
+            start = time + rng.uniform(0, 0.5)
+            time = start + rng.uniform(0.5, 4)
+            track.add(str(image), start, time)
+        length = time
+        bounds = segment_bounds(length, [card.start for card in track.cards[1:]], workers=4, fps=fps, min_length=2)
+        assert len(bounds) > 1
+
+        whole = framemd5(track.input(), fps, round(length * fps))
+        parts = []
+        for start, end in bounds:
+            parts += framemd5(track.input(start, end), fps, round(end * fps) - round(start * fps))
+        assert parts == whole
@@ -0,0 +1,109 @@
+"""
+Unit tests for header-only audio duration reading
+Testing MP3 frame walking, Xing headers, WAV chunks and the duration manifest
+"""
+
+import struct
+import wave
+
+import pytest
+
+from utils.audio import (
+    audio_info,
+    clip_duration,
+    read_duration_manifest,
+    write_duration_manifest,
+)
+
+# MPEG-1 Layer III, 128 kbps, 44.1 kHz, no padding, mono: 417 byte frames of 1152 samples
+MPEG1_L3_MONO = struct.pack('>I', 0xFFFB90C0)
+# MPEG-2 Layer III, 64 kbps, 24 kHz, no padding, mono: 192 byte frames of 576 samples
+MPEG2_L3_MONO = struct.pack('>I', 0xFFF384C0)
+
+
+def mp3_bytes(header, frame_length, frames, id3=False):
+    frame = header + b'\x00' * (frame_length - 4)
+    tag = b''
+    if id3:
+        tag = b'ID3\x04\x00\x00' + bytes([0, 0, 1, 0]) + b'\x00' * 128  # 128 byte syncsafe size
+    return tag + frame * frames
+
+
+class TestAudioInfo:
+    """Test reading durations from file headers"""
+
+    @pytest.mark.unit
+    def test_cbr_mp3_is_measured_by_walking_frames(self, tmp_path):
+        """Every frame header counts for 1152 samples at 44.1 kHz"""
+        path = tmp_path / 'clip.mp3'
+        path.write_bytes(mp3_bytes(MPEG1_L3_MONO, 417, 100, id3=True))
+
+        info = audio_info(str(path))
+
+        assert info.duration == pytest.approx(100 * 1152 / 44100)
+        assert info.sample_rate == 44100
+        assert info.channels == 1
+
+    @pytest.mark.unit
+    def test_mpeg2_frames(self, tmp_path):
+        """MPEG-2 Layer III frames hold 576 samples, as TikTok clips do"""
+        path = tmp_path / 'clip.mp3'
+        path.write_bytes(mp3_bytes(MPEG2_L3_MONO, 192, 50))
+
+        info = audio_info(str(path))
+
+        assert info.duration == pytest.approx(50 * 576 / 24000)
+        assert info.sample_rate == 24000
+
+    @pytest.mark.unit
+    def test_xing_header_frame_count_is_used(self, tmp_path):
+        """A VBR Info header gives the frame count without walking the file"""
+        first = bytearray(MPEG1_L3_MONO + b'\x00' * 413)
+        first[4 + 17:4 + 17 + 12] = b'Info' + struct.pack('>II', 1, 1000)
+        path = tmp_path / 'clip.mp3'
+        path.write_bytes(bytes(first) + mp3_bytes(MPEG1_L3_MONO, 417, 3))
+
+        assert audio_info(str(path)).duration == pytest.approx(1000 * 1152 / 44100)
+
+    @pytest.mark.unit
+    def test_wav_data_is_sniffed_regardless_of_extension(self, tmp_path):
+        """pyttsx can write WAV data to an .mp3 path"""
+        path = tmp_path / 'clip.mp3'
+        with wave.open(str(path), 'wb') as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(22050)
+            wav.writeframes(b'\x00\x00' * 22050 * 2)
+
+        info = audio_info(str(path))
+
+        assert info.duration == pytest.approx(2.0)
+        assert info.sample_rate == 22050
+
+    @pytest.mark.unit
+    def test_unknown_data_raises(self, tmp_path):
+        path = tmp_path / 'clip.mp3'
+        path.write_bytes(b'not audio at all' * 10)
+
+        with pytest.raises(ValueError):
+            audio_info(str(path))
+
+
+class TestDurationManifest:
+    """Test the per-job duration manifest"""
+
+    @pytest.mark.unit
+    def test_manifest_round_trip_and_fallback(self, tmp_path):
+        """Listed clips come from the manifest, others are read from their headers"""
+        write_duration_manifest(str(tmp_path), {'title': 2.5, '0': 4.0})
+        (tmp_path / '1.mp3').write_bytes(mp3_bytes(MPEG1_L3_MONO, 417, 10))
+
+        manifest = read_duration_manifest(str(tmp_path))
+
+        assert manifest == {'title': 2.5, '0': 4.0}
+        assert clip_duration(str(tmp_path), 'title', manifest) == 2.5
+        assert clip_duration(str(tmp_path), '1', manifest) == pytest.approx(10 * 1152 / 44100)
+
+    @pytest.mark.unit
+    def test_missing_manifest_is_empty(self, tmp_path):
+        assert read_duration_manifest(str(tmp_path)) == {}
@@ -0,0 +1,73 @@
+"""
+Unit tests for the in-memory audio timeline
+Testing clip offsets, gaps, slot sizing and the WAV output
+"""
+
+import wave
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+from utils.audio import write_duration_manifest
+from video_creation.audio_timeline import AudioTimeline
+
+
+@pytest.fixture
+def mp3_folder(tmp_path):
+    write_duration_manifest(str(tmp_path), {'title': 1.5, '0': 2.0, '1': 0.5})
+    return str(tmp_path)
+
+
+def tone(samples, value):
+    return np.full((samples, 1), value, dtype=np.int16)
+
+
+class TestAudioTimeline:
+    """Test laying clips out on one timeline"""
+
+    @pytest.mark.unit
+    def test_offsets_follow_the_manifest(self, mp3_folder):
+        """Clips are placed back to back, gaps push the next clip back"""
+        timeline = AudioTimeline(mp3_folder, sample_rate=1000)
+        timeline.add('title', gap=0.25)
+        timeline.add('0')
+        timeline.add('1')
+
+        assert [(c.name, c.start, c.end) for c in timeline.clips] == [
+            ('title', 0.0, 1.5),
+            ('0', 1.75, 3.75),
+            ('1', 3.75, 4.25),
+        ]
+        assert timeline.duration == 4.25
+
+    @pytest.mark.unit
+    @pytest.mark.mock
+    def test_render_fits_decoded_clips_into_their_slots(self, mp3_folder):
+        """Longer decodes are trimmed and shorter ones padded with silence"""
+        timeline = AudioTimeline(mp3_folder, sample_rate=1000)
+        timeline.add('title')
+        timeline.add('0')
+        decoded = {'title': tone(1600, 1), '0': tone(1900, 2)}
+
+        with patch.object(
+            AudioTimeline, 'decode', side_effect=lambda path: decoded[path.rsplit('/', 1)[1][:-4]]
+        ):
+            buffer = timeline.render()
+
+        assert buffer.shape == (3500, 1)
+        assert (buffer[:1500] == 1).all()
+        assert (buffer[1500:3400] == 2).all()
+        assert (buffer[3400:] == 0).all()
+
+    @pytest.mark.unit
+    def test_write_wav(self, mp3_folder, tmp_path):
+        """The buffer is written as 16 bit PCM at the timeline's format"""
+        timeline = AudioTimeline(mp3_folder, sample_rate=8000)
+        path = timeline.write_wav(str(tmp_path / 'audio.wav'), tone(8000, 7))
+
+        with wave.open(path) as f:
+            assert f.getframerate() == 8000
+            assert f.getnchannels() == 1
+            assert f.getsampwidth() == 2
+            assert f.getnframes() == 8000
@@ -0,0 +1,122 @@
+"""
+Unit tests for the background video cache
+Testing the keyframe index, the window choice and when the cache is rebuilt, without running ffmpeg
+"""
+
+import json
+import random
+from unittest.mock import patch
+
+import pytest
+
+from video_creation import background_cache
+from video_creation.background_cache import (
+    cache_paths,
+    cached_background,
+    keyframe_window,
+    load_metadata,
+    media_duration,
+    parse_keyframes,
+)
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / 'bbswitzer-parkour.mp4'
+    path.write_bytes(b'not really a video')
+    return str(path)
+
+
+def write_cache(source, root, **data):
+    video, metadata = cache_paths(source, 1080, 1920, str(root))
+    video.parent.mkdir(parents=True)
+    video.write_bytes(b'cached')
+    metadata.write_text(json.dumps({
+        'source_stat': background_cache._source_stat(source),
+        'width': 1080,
+        'height': 1920,
+        'duration': 600.0,
+        'keyframes': [0.0, 2.0, 4.0],
+        **data,
+    }))
+
+
+class TestKeyframes:
+    """Test reading keyframes and picking windows on them"""
+
+    @pytest.mark.unit
+    def test_parse_keyframes(self):
+        """Only the packets flagged as keyframes are kept"""
+        packets = [
+            {'pts_time': '2.000000', 'flags': 'K__'},
+            {'pts_time': '0.033333', 'flags': '___'},
+            {'pts_time': '0.000000', 'flags': 'K__'},
+            {'pts_time': 'N/A', 'flags': 'K__'},
+        ]
+        assert parse_keyframes(packets) == [0.0, 2.0]
+
+    @pytest.mark.unit
+    def test_window_starts_on_a_keyframe(self):
+        """The window starts on a keyframe after the intro and fits in the video"""
+        keyframes = [float(t) for t in range(0, 600, 2)]
+        for seed in range(20):
+            start, end = keyframe_window(keyframes, 600.0, 60, random.Random(seed))
+            assert start in keyframes
+            assert start >= 180
+            assert end == start + 60 <= 600
+
+    @pytest.mark.unit
+    def test_short_background_skips_less_intro(self):
+        """A background barely longer than the video still gets a window"""
+        start, end = keyframe_window([0.0, 2.0, 4.0, 6.0], 70.0, 65, random.Random(1))
+        assert (start, end) in [(0.0, 65.0), (2.0, 67.0), (4.0, 69.0)]
+
+    @pytest.mark.unit
+    def test_too_short_background(self):
+        """There must be room for the video after some keyframe"""
+        with pytest.raises(Exception, match='too short'):
+            keyframe_window([0.0, 2.0], 30.0, 60)
+
+
+class TestCache:
+    """Test when the cache is used and when it is rebuilt"""
+
+    @pytest.mark.unit
+    def test_cache_is_per_resolution(self, source, tmp_path):
+        """Every size has its own copy of the background"""
+        video, metadata = cache_paths(source, 720, 1280, str(tmp_path))
+        assert video == tmp_path / '720x1280' / 'bbswitzer-parkour.mp4'
+        assert metadata == tmp_path / '720x1280' / 'bbswitzer-parkour.json'
+
+    @pytest.mark.unit
+    @pytest.mark.mock
+    def test_cached_background_is_reused(self, source, tmp_path):
+        """A valid cache is read back without transcoding"""
+        write_cache(source, tmp_path / 'cache')
+        with patch.object(background_cache, 'build') as build:
+            cached = cached_background(source, 1080, 1920, str(tmp_path / 'cache'))
+
+        build.assert_not_called()
+        assert cached['keyframes'] == [0.0, 2.0, 4.0]
+        assert cached['path'].endswith('1080x1920/bbswitzer-parkour.mp4')
+
+    @pytest.mark.unit
+    def test_changed_source_invalidates_cache(self, source, tmp_path):
+        """A new download of the background is transcoded again"""
+        write_cache(source, tmp_path / 'cache')
+        with open(source, 'ab') as f:
+            f.write(b' and more')
+        assert load_metadata(source, 1080, 1920, str(tmp_path / 'cache')) is None
+
+    @pytest.mark.unit
+    @pytest.mark.mock
+    def test_duration_is_probed_once(self, source, tmp_path):
+        """Durations are read from the cache until the file changes"""
+        with patch.object(background_cache, 'probe_duration', return_value=300.0) as probe:
+            assert media_duration(source, str(tmp_path)) == 300.0
+            assert media_duration(source, str(tmp_path)) == 300.0
+            assert probe.call_count == 1
+            with open(source, 'ab') as f:
+                f.write(b' and more')
+            media_duration(source, str(tmp_path))
+            assert probe.call_count == 2
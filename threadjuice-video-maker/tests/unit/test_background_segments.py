@@ -0,0 +1,99 @@
+"""
+Unit tests for on-demand background segments
+Testing which ranges are fetched and when fetched chunks are reused, without network or ffmpeg
+"""
+
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from video_creation import background_segments
+from video_creation.background_segments import CHUNK_SECONDS, SLACK, find_chunk, prefetch, segment_window
+
+CONFIG = ('https://www.youtube.com/watch?v=n_Dv4JMiwK8', 'parkour.mp4', 'bbswitzer', 'center')
+
+
+def fake_fetch(url, start, length, path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b'chunk')
+    return length
+
+
+class TestSegmentWindow:
+    """Test fetching only the part of the background a video needs"""
+
+    @pytest.mark.unit
+    def test_find_chunk(self):
+        """A chunk is only used when it holds the whole window"""
+        chunks = [{'path': 'a.mp4', 'start': 100, 'end': 400}]
+        assert find_chunk(chunks, 150, 210) == chunks[0]
+        assert find_chunk(chunks, 350, 410) is None
+
+    @pytest.mark.unit
+    @pytest.mark.mock
+    def test_fetches_range_with_slack(self, tmp_path):
+        """The chunk starts a little before the window and runs for CHUNK_SECONDS"""
+        with patch.object(background_segments, 'resolve_stream', return_value=('https://media', 3600.0)), \
+             patch.object(background_segments, 'fetch_chunk', side_effect=fake_fetch) as fetch:
+            path, start, end = segment_window(CONFIG, 60, lambda length, duration: (1000, 1060), str(tmp_path))
+
+        fetch.assert_called_once()
+        url, chunk_start, chunk_length, _ = fetch.call_args.args
+        assert url == 'https://media'
+        assert chunk_start == 1000 - SLACK
+        assert chunk_length == CHUNK_SECONDS
+        assert (start, end) == (SLACK, SLACK + 60)
+        assert Path(path).parent == tmp_path / 'bbswitzer-parkour'
+
+    @pytest.mark.unit
+    @pytest.mark.mock
+    def test_window_in_fetched_chunk_is_reused(self, tmp_path):
+        """A later window inside a fetched chunk needs no download nor URL"""
+        with patch.object(background_segments, 'resolve_stream', return_value=('https://media', 3600.0)), \
+             patch.object(background_segments, 'fetch_chunk', side_effect=fake_fetch):
+            first, _, _ = segment_window(CONFIG, 60, lambda length, duration: (1000, 1060), str(tmp_path))
+
+        with patch.object(background_segments, 'resolve_stream') as resolve, \
+             patch.object(background_segments, 'fetch_chunk') as fetch:
+            path, start, end = segment_window(CONFIG, 60, lambda length, duration: (1100, 1160), str(tmp_path))
+
+        resolve.assert_not_called()
+        fetch.assert_not_called()
+        assert path == first
+        assert (start, end) == (110, 170)
+
+    @pytest.mark.unit
+    @pytest.mark.mock
+    def test_chunk_is_clipped_to_the_source(self, tmp_path):
+        """No range is asked past the end of the video"""
+        with patch.object(background_segments, 'resolve_stream', return_value=('https://media', 1100.0)), \
+             patch.object(background_segments, 'fetch_chunk', side_effect=fake_fetch) as fetch:
+            segment_window(CONFIG, 60, lambda length, duration: (1000, 1060), str(tmp_path))
+
+        _, chunk_start, chunk_length, _ = fetch.call_args.args
+        assert chunk_start + chunk_length == 1100
+
+
+class TestPrefetch:
+    """Test the full downloads running on the side"""
+
+    @pytest.mark.unit
+    def test_one_download_per_background(self):
+        """Asking again while a download runs does not start another one"""
+        import threading
+
+        release = threading.Event()
+        calls = []
+
+        def download():
+            calls.append(1)
+            release.wait(5)
+
+        first = prefetch('test-prefetch', download)
+        second = prefetch('test-prefetch', download)
+        release.set()
+        first.join(5)
+
+        assert first is second
+        assert calls == [1]
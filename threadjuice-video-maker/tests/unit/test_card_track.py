@@ -0,0 +1,136 @@
+"""
+Unit tests for the card track
+Testing card scaling, baked opacity, padding and the concat list timing
+"""
+
+import hashlib
+import math
+import random
+from fractions import Fraction
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+from video_creation.card_track import IMAGE_RATE, CardTrack
+from video_creation.final_video import segment_bounds
+
+
+@pytest.fixture
+def screenshots(tmp_path):
+    paths = []
+    for i, size in enumerate([(400, 100), (800, 400)]):
+        path = tmp_path / f'comment_{i}.png'
+        Image.new('RGB', size, (255, 0, 0)).save(path)
+        paths.append(str(path))
+    return paths
+
+
+def frame_hashes(list_path, fps, frames):
+    """The hash of the card on each frame, placed as the concat demuxer and the fps filter do:
+    durations add up in microseconds, each card is stamped on the grid of the image rate, moved
+    to the nearest frame and shows from there, the later card winning a frame both land on."""
+    folder = Path(list_path).parent
+    lines = Path(list_path).read_text().splitlines()[1:]
+    entries = []
+    at = 0
+    for file_line, duration_line in zip(lines[::2], lines[1::2]):
+        stamp = math.floor(Fraction(at, 1_000_000) * IMAGE_RATE + Fraction(1, 2))
+        image = (folder / file_line.split()[1]).read_bytes()
+        entries.append((Fraction(stamp, IMAGE_RATE), hashlib.md5(image).hexdigest()))
+        at += round(float(duration_line.split()[1]) * 1_000_000)
+    return [
+        next(digest for stamp, digest in reversed(entries) if math.floor(stamp * fps + Fraction(1, 2)) <= n)
+        for n in range(frames)
+    ]
+
+
+class TestCardTrack:
+    """Test preparing the screenshots for a single overlay"""
+
+    @pytest.mark.unit
+    def test_cards_are_scaled_with_opacity_baked_in(self, tmp_path, screenshots):
+        """Cards come out at the overlay width, their alpha scaled by the opacity"""
+        track = CardTrack(str(tmp_path / 'cards'), width=200)
+        card = track.add(screenshots[0], 0.0, 1.0, opacity=0.5)
+
+        assert card.image.size == (200, 50)
+        assert card.image.getpixel((10, 10)) == (255, 0, 0, 128)
+
+    @pytest.mark.unit
+    def test_concat_list_fills_the_gaps(self, tmp_path, screenshots):
+        """Every card lasts as long as its clip, on the nearest frames, with blank frames in between"""
+        track = CardTrack(str(tmp_path / 'cards'), width=200)
+        track.add(screenshots[0], 0.0, 1.5)
+        track.add(screenshots[1], 1.75, 3.0)
+        lines = open(track.write()).read().splitlines()
+
+        assert lines == [
+            'ffconcat version 1.0',
+            'file card_0.png',
+            'duration 1.500000',
+            'file blank.png',
+            'duration 0.233333',
+            'file card_1.png',
+            'duration 1.266667',
+            'file blank.png',
+            'duration 0.040000',
+            'file blank.png',
+        ]
+
+    @pytest.mark.unit
+    def test_cards_share_one_canvas(self, tmp_path, screenshots):
+        """Cards are padded to the tallest one, so the stream keeps one frame size"""
+        track = CardTrack(str(tmp_path / 'cards'), width=200)
+        track.add(screenshots[0], 0.0, 1.0)
+        track.add(screenshots[1], 1.0, 2.0)
+        track.write()
+
+        card = Image.open(tmp_path / 'cards' / 'card_0.png')
+        assert card.size == Image.open(tmp_path / 'cards' / 'blank.png').size == (200, 100)
+        assert card.getpixel((10, 0))[3] == 0  # padding above the short card
+        assert card.getpixel((10, 50))[3] == 255
+
+    @pytest.mark.unit
+    def test_window_of_the_track(self, tmp_path, screenshots):
+        """A part of the track starts at zero, cut at its start and running on past its end"""
+        track = CardTrack(str(tmp_path / 'cards'), width=200)
+        track.add(screenshots[0], 0.0, 1.5)
+        track.add(screenshots[1], 1.75, 3.0)
+        track.add(screenshots[0], 3.5, 5.0)
+        lines = open(track.write(start=1.0, end=2.0)).read().splitlines()
+
+        assert lines[1:9] == [
+            'file card_0.png',
+            'duration 0.500000',
+            'file blank.png',
+            'duration 0.233333',
+            'file card_1.png',
+            'duration 1.266667',
+            'file blank.png',
+            'duration 0.040000',
+        ]
+
+    @pytest.mark.unit
+    def test_segments_show_cards_on_the_same_frames(self, tmp_path):
+        """The parts of a segmented render put every card on the frames of the one-piece render"""
+        for seed in range(20):
+            rng = random.Random(seed)
+            track = CardTrack(str(tmp_path / f'cards_{seed}'), width=40)
+            time = 0.0
+            for i in range(8):
+                image = tmp_path / f'shot_{seed}_{i}.png'
+                Image.new('RGB', (40, 20), (30 * i, seed, 100)).save(image)
+                start = time + rng.uniform(0, 0.5)
+                time = start + rng.uniform(0.5, 4)
+                track.add(str(image), start, time)
+            length = time
+            cuts = [card.start for card in track.cards[1:]]
+            bounds = segment_bounds(length, cuts, workers=4, fps=30, min_length=2)
+            assert len(bounds) > 1
+
+            whole = frame_hashes(track.write(), 30, round(length * 30))
+            parts = []
+            for start, end in bounds:
+                parts += frame_hashes(track.write(start, end), 30, round(end * 30) - round(start * 30))
+            assert parts == whole, f'layout {seed}'
@@ -0,0 +1,127 @@
+"""
+Unit tests for the job manifest
+Testing stage skipping on resume, input changes, missing outputs and the last job pointer
+"""
+
+from pathlib import Path
+
+import pytest
+
+from utils.checkpoint import JobManifest, digest, forget_job, last_job, remember_job
+
+
+class Counter:
+    def __init__(self, result=None):
+        self.calls = 0
+        self.result = result
+
+    def __call__(self):
+        self.calls += 1
+        return self.result
+
+
+class TestJobManifest:
+    """Test recording and skipping stages"""
+
+    @pytest.mark.unit
+    def test_resume_skips_finished_stages(self, tmp_path):
+        """A finished stage with the same inputs is skipped and its result reused"""
+        tts = Counter(result=(42.5, 3))
+        JobManifest('abc123', root=str(tmp_path)).run('tts', ['text'], tts)
+
+        resumed = JobManifest('abc123', resume=True, root=str(tmp_path))
+        assert resumed.run('tts', ['text'], tts) == [42.5, 3]
+        assert tts.calls == 1
+
+    @pytest.mark.unit
+    def test_changed_inputs_run_again(self, tmp_path):
+        """A stage runs again when its inputs changed"""
+        tts = Counter()
+        JobManifest('abc123', root=str(tmp_path)).run('tts', ['text'], tts)
+        JobManifest('abc123', resume=True, root=str(tmp_path)).run('tts', ['edited text'], tts)
+        assert tts.calls == 2
+
+    @pytest.mark.unit
+    def test_missing_outputs_run_again(self, tmp_path):
+        """A stage whose files are gone runs again"""
+        output = tmp_path / 'background.json'
+        output.write_text('{}')
+        chop = Counter()
+        JobManifest('abc123', root=str(tmp_path)).run('chop', [60], chop, outputs=[output])
+        output.unlink()
+        JobManifest('abc123', resume=True, root=str(tmp_path)).run('chop', [60], chop, outputs=[output])
+        assert chop.calls == 2
+
+    @pytest.mark.unit
+    def test_outputs_named_by_the_result(self, tmp_path):
+        """A render whose video was deleted runs again, its path only known once it is done"""
+        video = tmp_path / 'results' / 'video.mp4'
+
+        def render():
+            video.parent.mkdir(exist_ok=True)
+            video.write_bytes(b'mp4')
+            render.calls += 1
+            return str(video)
+
+        render.calls = 0
+        for _ in range(2):
+            JobManifest('abc123', resume=True, root=str(tmp_path)).run(
+                'render', ['everything'], render, outputs=lambda path: [path]
+            )
+        assert render.calls == 1
+
+        video.unlink()
+        JobManifest('abc123', resume=True, root=str(tmp_path)).run(
+            'render', ['everything'], render, outputs=lambda path: [path]
+        )
+        assert render.calls == 2
+
+    @pytest.mark.unit
+    def test_without_resume_everything_runs(self, tmp_path):
+        """Resuming is opt in"""
+        tts = Counter()
+        JobManifest('abc123', root=str(tmp_path)).run('tts', ['text'], tts)
+        JobManifest('abc123', root=str(tmp_path)).run('tts', ['text'], tts)
+        assert tts.calls == 2
+
+    @pytest.mark.unit
+    def test_failed_stage_is_not_recorded(self, tmp_path):
+        """Only completed stages end up in the manifest"""
+        def render():
+            raise RuntimeError('ffmpeg failed')
+
+        manifest = JobManifest('abc123', root=str(tmp_path))
+        manifest.run('tts', ['text'], Counter())
+        with pytest.raises(RuntimeError):
+            manifest.run('render', ['everything'], render)
+
+        assert set(JobManifest('abc123', resume=True, root=str(tmp_path)).stages) == {'tts'}
+
+
+class TestDigest:
+    """Test hashing stage inputs"""
+
+    @pytest.mark.unit
+    def test_files_are_hashed_by_their_state(self, tmp_path):
+        """Editing a file in an input folder changes the hash"""
+        (tmp_path / 'mp3').mkdir()
+        clip = tmp_path / 'mp3' / '0.mp3'
+        clip.write_bytes(b'one')
+        before = digest([Path(tmp_path / 'mp3'), {'voice': 'en_us_001'}])
+        assert before == digest([Path(tmp_path / 'mp3'), {'voice': 'en_us_001'}])
+
+        clip.write_bytes(b'longer')
+        assert before != digest([Path(tmp_path / 'mp3'), {'voice': 'en_us_001'}])
+
+
+class TestLastJob:
+    """Test the pointer to the job to resume"""
+
+    @pytest.mark.unit
+    def test_remember_and_forget(self, tmp_path):
+        """The job in progress is remembered until it is done"""
+        assert last_job(root=str(tmp_path)) is None
+        remember_job('abc123', root=str(tmp_path))
+        assert last_job(root=str(tmp_path)) == 'abc123'
+        forget_job(root=str(tmp_path))
+        assert last_job(root=str(tmp_path)) is None
@@ -0,0 +1,73 @@
+"""
+Unit tests for the encoder profiles
+Testing the ffmpeg arguments, profile selection and the autotuner's choice
+"""
+
+import json
+from dataclasses import asdict
+from unittest.mock import patch
+
+import pytest
+
+from utils import encoder
+from utils.encoder import PROFILES, EncoderProfile, get_profile, parse_ssim, pick_fastest
+
+
+class TestEncoderProfile:
+    """Test profiles and how they are picked"""
+
+    @pytest.mark.unit
+    def test_output_args(self):
+        """Presets, CRF, VBV and frame rate end up as ffmpeg arguments"""
+        args = PROFILES['social'].output_args()
+        assert args['c:v'] == 'libx264'
+        assert args['preset'] == 'veryfast'
+        assert args['crf'] == 23
+        assert (args['maxrate'], args['bufsize']) == ('8M', '16M')
+        assert args['r'] == 30
+        assert 'maxrate' not in PROFILES['archive'].output_args()
+
+    @pytest.mark.unit
+    @pytest.mark.mock
+    def test_profile_from_config(self):
+        """The configured profile is used, unknown names fall back to social"""
+        with patch('utils.settings.config', {'settings': {'encoder_profile': 'draft'}}):
+            assert get_profile().preset == 'ultrafast'
+        with patch('utils.settings.config', {'settings': {}}):
+            assert get_profile() == PROFILES['social']
+        assert get_profile('nonsense') == PROFILES['social']
+
+    @pytest.mark.unit
+    def test_autotuned_profile(self, tmp_path):
+        """The calibrated profile is read back, a missing calibration falls back to social"""
+        path = tmp_path / 'encoder_autotune.json'
+        with patch.object(encoder, 'AUTOTUNE_PATH', str(path)):
+            assert get_profile('autotune') == PROFILES['social']
+
+            profile = EncoderProfile('autotune', preset='faster', crf=26)
+            path.write_text(json.dumps({'profile': asdict(profile)}))
+            assert get_profile('autotune') == profile
+
+
+class TestAutotune:
+    """Test scoring the autotune candidates"""
+
+    @pytest.mark.unit
+    def test_parse_ssim(self):
+        """The overall score is read from the ssim filter summary"""
+        stderr = '[Parsed_ssim_0 @ 0x1] SSIM Y:0.981 (17.2) U:0.99 (20.1) V:0.99 (20.3) All:0.984321 (18.0)\n'
+        assert parse_ssim(stderr) == pytest.approx(0.984321)
+        with pytest.raises(ValueError):
+            parse_ssim('Conversion failed!')
+
+    @pytest.mark.unit
+    def test_pick_fastest_meeting_targets(self):
+        """Too big or too blurry candidates lose, however fast they are"""
+        results = [
+            {'preset': 'ultrafast', 'crf': 20, 'seconds': 1.0, 'mb_per_minute': 90, 'ssim': 0.99},
+            {'preset': 'ultrafast', 'crf': 26, 'seconds': 1.1, 'mb_per_minute': 20, 'ssim': 0.95},
+            {'preset': 'veryfast', 'crf': 23, 'seconds': 2.0, 'mb_per_minute': 22, 'ssim': 0.98},
+            {'preset': 'medium', 'crf': 23, 'seconds': 4.0, 'mb_per_minute': 18, 'ssim': 0.985},
+        ]
+        assert pick_fastest(results, max_mb=25, min_ssim=0.97)['preset'] == 'veryfast'
+        assert pick_fastest(results, max_mb=10, min_ssim=0.97) is None
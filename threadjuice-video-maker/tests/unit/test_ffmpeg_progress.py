@@ -0,0 +1,137 @@
+"""
+Unit tests for the ffmpeg progress stream
+Testing parsing of the -progress blocks, subscribers and error reporting
+"""
+
+import io
+from unittest.mock import MagicMock, patch
+
+import ffmpeg
+import pytest
+
+from utils.ffmpeg_progress import FfmpegProgress, ProgressParser, subscribe_all, unsubscribe_all
+
+BLOCK = """frame=450
+fps=87.31
+stream_0_0_q=28.0
+bitrate=2412.5kbits/s
+total_size=4521984
+out_time_us=15000000
+out_time_ms=15000000
+out_time=00:00:15.000000
+dup_frames=2
+drop_frames=0
+speed=2.91x
+progress=continue
+"""
+
+FIRST_BLOCK = """frame=0
+fps=0.00
+bitrate=N/A
+total_size=N/A
+out_time_us=N/A
+speed=N/A
+progress=continue
+"""
+
+
+def feed(parser, text):
+    events = [parser.feed(line) for line in text.splitlines()]
+    return [event for event in events if event is not None]
+
+
+def fake_process(stdout, returncode=0, stderr=b''):
+    process = MagicMock()
+    process.stdout = io.BytesIO(stdout.encode())
+    process.stderr = io.BytesIO(stderr)
+    process.returncode = returncode
+    process.poll.return_value = returncode
+    return process
+
+
+class TestProgressParser:
+    """Test turning progress lines into events"""
+
+    @pytest.mark.unit
+    def test_parses_every_key(self):
+        """One event per block, with typed values"""
+        [event] = feed(ProgressParser('render', duration=60), BLOCK)
+
+        assert event.frame == 450
+        assert event.fps == pytest.approx(87.31)
+        assert event.bitrate_kbps == pytest.approx(2412.5)
+        assert event.total_size == 4521984
+        assert event.out_time == 15.0
+        assert event.speed == pytest.approx(2.91)
+        assert event.dup_frames == 2
+        assert event.fraction == 0.25
+        assert event.eta == pytest.approx(45 / 2.91)
+        assert event.raw['stream_0_0_q'] == '28.0'
+        assert not event.done
+
+    @pytest.mark.unit
+    def test_not_available_values(self):
+        """N/A values of the first report are None, not errors"""
+        [event] = feed(ProgressParser('render', duration=60), FIRST_BLOCK)
+
+        assert event.bitrate_kbps is None
+        assert event.total_size is None
+        assert event.speed is None
+        assert event.eta is None
+        assert event.fraction == 0.0
+
+    @pytest.mark.unit
+    def test_end_block(self):
+        """The last report marks the job as done"""
+        [event] = feed(ProgressParser('render', duration=60), BLOCK.replace('continue', 'end'))
+        assert event.done
+        assert event.fraction == 1.0
+
+
+class TestFfmpegProgress:
+    """Test running ffmpeg with a progress pipe"""
+
+    @pytest.mark.unit
+    @pytest.mark.mock
+    def test_events_reach_every_subscriber(self):
+        """Events are yielded and sent to the job and the global subscribers"""
+        output = ffmpeg.input('in.mp4').output('out.mp4')
+        process = fake_process(FIRST_BLOCK + BLOCK + BLOCK.replace('continue', 'end'))
+        seen, everywhere = [], []
+        subscriber = subscribe_all(everywhere.append)
+        try:
+            with patch.object(ffmpeg.nodes.OutputStream, 'run_async', return_value=process) as run_async:
+                progress = FfmpegProgress(output, 60, job='story').subscribe(seen.append)
+                events = list(progress)
+        finally:
+            unsubscribe_all(subscriber)
+
+        assert [event.frame for event in events] == [0, 450, 450]
+        assert seen == events == everywhere
+        assert {event.job for event in events} == {'story'}
+        assert progress.last.done
+        run_async.assert_called_once_with(pipe_stdout=True, pipe_stderr=True)
+
+    @pytest.mark.unit
+    @pytest.mark.mock
+    def test_failure_raises_with_stderr(self):
+        """A failed ffmpeg raises ffmpeg.Error carrying its stderr"""
+        output = ffmpeg.input('in.mp4').output('out.mp4')
+        process = fake_process(FIRST_BLOCK, returncode=1, stderr=b'in.mp4: No such file')
+        with patch.object(ffmpeg.nodes.OutputStream, 'run_async', return_value=process):
+            with pytest.raises(ffmpeg.Error) as error:
+                FfmpegProgress(output, 60).run()
+        assert b'No such file' in error.value.stderr
+
+    @pytest.mark.unit
+    @pytest.mark.mock
+    def test_broken_subscriber_does_not_stop_the_render(self):
+        """A failing subscriber is reported, the render goes on"""
+        output = ffmpeg.input('in.mp4').output('out.mp4')
+        process = fake_process(BLOCK.replace('continue', 'end'))
+
+        def broken(event):
+            raise RuntimeError('dashboard is down')
+
+        with patch.object(ffmpeg.nodes.OutputStream, 'run_async', return_value=process):
+            assert FfmpegProgress(output, 60).subscribe(broken).run().done
@@ -0,0 +1,174 @@
+"""
+Unit tests for the final video render graph
+Testing the ffmpeg command lines make_final_video compiles, without running ffmpeg
+"""
+
+import json
+from unittest.mock import patch
+
+import ffmpeg
+import pytest
+
+from utils.encoder import PROFILES
+from video_creation.final_video import (
+    background_input,
+    even,
+    merge_background_audio,
+    mux_audio,
+    segment_bounds,
+)
+
+
+@pytest.fixture
+def temp_folder(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    folder = tmp_path / 'assets' / 'temp' / 'abc123'
+    folder.mkdir(parents=True)
+    window = {'video': {'path': 'assets/backgrounds/video/bbswitzer-parkour.mp4', 'start': 42, 'end': 102}}
+    (folder / 'background.json').write_text(json.dumps(window))
+    return folder
+
+
+class TestBackgroundInput:
+    """Test cutting the background inside the render graph"""
+
+    @pytest.mark.unit
+    def test_seeks_into_the_source(self, temp_folder):
+        """The window is an input seek on the source, not a separate cut file"""
+        args = background_input('abc123', W=1080, H=1920).output('out.mp4').compile()
+
+        source = args.index('assets/backgrounds/video/bbswitzer-parkour.mp4')
+        assert args[source - 5:source] == ['-ss', '42', '-t', '60', '-i']
+        assert 'crop=ih*(1080/1920):ih' in args[args.index('-filter_complex') + 1]
+        assert not any('background.mp4' in arg for arg in args)
+
+    @pytest.mark.unit
+    def test_cached_background_is_not_cropped(self, temp_folder):
+        """A background from the cache already has the size of the video"""
+        window = {'video': {'path': 'assets/backgrounds/cache/1080x1920/bbswitzer-parkour.mp4',
+                            'width': 1080, 'height': 1920, 'start': 42, 'end': 102}}
+        (temp_folder / 'background.json').write_text(json.dumps(window))
+        args = background_input('abc123', W=540, H=960).output('out.mp4').compile()
+
+        assert 'assets/backgrounds/cache/1080x1920/bbswitzer-parkour.mp4' in args
+        assert '-filter_complex' not in args
+
+    @pytest.mark.unit
+    def test_segment_seeks_further(self, temp_folder):
+        """A part of the video seeks to its own start within the window"""
+        args = background_input('abc123', W=1080, H=1920, start=20, end=35).output('out.mp4').compile()
+
+        source = args.index('assets/backgrounds/video/bbswitzer-parkour.mp4')
+        assert args[source - 5:source] == ['-ss', '62', '-t', '15', '-i']
+
+
+class TestBackgroundAudio:
+    """Test mixing the background audio in the render graph"""
+
+    @pytest.mark.unit
+    def test_seeks_into_the_track(self, temp_folder):
+        """The audio window is an input seek and a trim, there is no background.mp3"""
+        window = json.loads((temp_folder / 'background.json').read_text())
+        window['audio'] = {'path': 'assets/backgrounds/audio/lofi.mp3', 'start': 30, 'end': 90}
+        (temp_folder / 'background.json').write_text(json.dumps(window))
+        config = {'settings': {'background': {'background_audio_volume': 0.15}}}
+        with patch('utils.settings.config', config):
+            mixed = merge_background_audio(ffmpeg.input('audio.wav'), 'abc123')
+        args = mixed.output('out.mp4').compile()
+
+        source = args.index('assets/backgrounds/audio/lofi.mp3')
+        assert args[source - 5:source] == ['-ss', '30', '-t', '60', '-i']
+        graph = args[args.index('-filter_complex') + 1]
+        assert 'atrim=duration=60' in graph
+        assert 'volume=0.15' in graph
+        assert 'amix' in graph
+
+    @pytest.mark.unit
+    def test_no_audio_window(self, temp_folder):
+        """Without a background track the narration is used as it is"""
+        config = {'settings': {'background': {'background_audio_volume': 0.15}}}
+        audio = ffmpeg.input('audio.wav')
+        with patch('utils.settings.config', config):
+            assert merge_background_audio(audio, 'abc123') is audio
+
+
+class TestMuxAudio:
+    """Test adding audio variants to the rendered video"""
+
+    @pytest.mark.unit
+    @pytest.mark.mock
+    def test_video_stream_is_copied(self):
+        """A variant copies the encoded video and only encodes its own audio"""
+        commands = []
+        run = lambda self, **kwargs: commands.append(self.compile())
+        with patch.object(ffmpeg.nodes.OutputStream, 'run', run):
+            audio = ffmpeg.input('audio.wav').filter('volume', 1.0)
+            mux_audio('video.mp4', audio, 'results/OnlyTTS/story.mp4')
+
+        [args] = commands
+        assert args[args.index('-c:v') + 1] == 'copy'
+        assert args[args.index('-c:v') + 2] == 'results/OnlyTTS/story.mp4'
+        assert args[args.index('-map') + 1] == '0:v'
+
+    @pytest.mark.unit
+    @pytest.mark.mock
+    def test_preview_is_cut_to_length(self):
+        """A preview of the first seconds cuts the audio at the same length as the video"""
+        commands = []
+        run = lambda self, **kwargs: commands.append(self.compile())
+        with patch.object(ffmpeg.nodes.OutputStream, 'run', run):
+            audio = ffmpeg.input('audio.wav').filter('volume', 1.0)
+            mux_audio('video.mp4', audio, 'results/OnlyTTS/preview/story.mp4', duration=20)
+
+        [args] = commands
+        assert args[args.index('-t') + 1] == '20'
+
+
+class TestPreview:
+    """Test the reduced settings of preview renders"""
+
+    @pytest.mark.unit
+    def test_frame_size_stays_even(self):
+        """Scaled sizes are rounded down to even numbers for yuv420p"""
+        assert even(1080 * 0.5) == 540
+        assert even(1920 * 0.33) == 632
+        assert even(1) == 2
+
+    @pytest.mark.unit
+    def test_preview_profile_is_fast(self):
+        """Previews use the fastest preset at a lower frame rate"""
+        profile = PROFILES['preview']
+        assert profile.preset == 'ultrafast'
+        assert profile.output_args()['r'] == 15
+
+
+class TestSegmentBounds:
+    """Test splitting the video for a parallel render"""
+
+    @pytest.mark.unit
+    def test_single_worker_renders_in_one_piece(self):
+        """No split without workers to share it, or for short videos"""
+        assert segment_bounds(60, [10, 20, 30], workers=1) == [(0, 60)]
+        assert segment_bounds(8, [2, 4, 6], workers=4) == [(0, 8)]
+
+    @pytest.mark.unit
+    def test_cuts_at_screenshot_changes(self):
+        """Parts end where the nearest screenshot comes up, snapped to a frame on the card grid"""
+        cuts = [4.2, 13.1, 21.7, 29.05, 41.3, 50.2]
+        bounds = segment_bounds(60, cuts, workers=4, fps=30)
+
+        assert [end for _, end in bounds] == [pytest.approx(13.2), pytest.approx(29.0), pytest.approx(41.2), 60]
+        assert all(a[1] == b[0] for a, b in zip(bounds, bounds[1:]))
+        assert all(round(start * 30, 6) == round(start * 30) for start, _ in bounds)
+        assert all(round(start * 25, 6) == round(start * 25) for start, _ in bounds)
+
+    @pytest.mark.unit
+    def test_fixed_cuts_without_screenshot_changes(self):
+        """Without a screenshot change nearby, the video is cut evenly"""
+        assert segment_bounds(60, [], workers=3) == [(0, 20), (20, 40), (40, 60)]
+
+    @pytest.mark.unit
+    def test_parts_are_not_too_short(self):
+        """Cut points closer than the minimum part length are dropped"""
+        bounds = segment_bounds(20, [9.0, 10.0, 11.0], workers=8, min_length=5)
+        assert all(end - start >= 5 for start, end in bounds)
@@ -0,0 +1,57 @@
+"""
+Unit tests for the output ladder
+Testing the ladder setting, shared encodes per size and the split render graph
+"""
+
+import ffmpeg
+import pytest
+
+from utils.encoder import PROFILES
+from video_creation.ladder import encode_renditions, parse_ladder, plan_renditions
+
+
+class TestLadder:
+    """Test planning the renditions of one composition"""
+
+    @pytest.mark.unit
+    def test_parse_ladder(self):
+        """Entries are name=WIDTHxHEIGHT, separated by commas"""
+        assert parse_ladder('') == []
+        assert parse_ladder('web=720x1280, preview = 540x960') == [
+            ('web', 720, 1280),
+            ('preview', 540, 960),
+        ]
+        with pytest.raises(ValueError):
+            parse_ladder('web=720p')
+        with pytest.raises(ValueError):
+            parse_ladder('web=720x1280,web=540x960')
+        with pytest.raises(ValueError, match='even'):
+            parse_ladder('web=721x1280')
+        with pytest.raises(ValueError, match='even'):
+            parse_ladder('web=720x0')
+
+    @pytest.mark.unit
+    def test_same_size_shares_an_encode(self):
+        """A ladder entry at an already encoded size is muxed from that encode"""
+        ladder = parse_ladder('tiktok=1080x1920,shorts=1080x1920,web=720x1280')
+        renditions, entries = plan_renditions((1080, 1920), ladder, 'assets/temp/abc123')
+
+        assert [(r.name, r.width, r.height) for r in renditions] == [
+            ('main', 1080, 1920),
+            ('web', 720, 1280),
+        ]
+        assert entries['tiktok'] is entries['shorts'] is renditions[0]
+        assert entries['web'].video_path == 'assets/temp/abc123/video_web.mp4'
+
+    @pytest.mark.unit
+    def test_one_process_for_every_rendition(self):
+        """The composition is split once, each extra rendition only adds a scale and an encode"""
+        renditions, _ = plan_renditions((1080, 1920), parse_ladder('web=720x1280'), 'tmp')
+        video = ffmpeg.input('background.mp4').video.filter('scale', 1080, 1920)
+        args = encode_renditions(video, renditions, PROFILES['draft']).compile()
+
+        graph = args[args.index('-filter_complex') + 1]
+        assert graph.count('split=2') == 1
+        assert 'scale=720:1280' in graph
+        assert args.count('-i') == 1
+        assert 'tmp/video.mp4' in args and 'tmp/video_web.mp4' in args
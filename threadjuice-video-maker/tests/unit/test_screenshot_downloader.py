@@ -0,0 +1,94 @@
+"""
+Unit tests for the comment screenshots
+Testing the single page capture and the permalink fallback, with mocked pages
+"""
+
+from unittest.mock import MagicMock, call, patch
+
+import pytest
+from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+
+from video_creation import screenshot_downloader
+from video_creation.screenshot_downloader import capture_permalinks, expand_comments
+from video_creation.screenshot_service import CaptureMetrics
+
+
+def comment(comment_id):
+    return {'comment_id': comment_id, 'comment_url': f'/r/AskReddit/comments/abc/_/{comment_id}/'}
+
+
+class TestExpandComments:
+    """Test loading the thread until it shows the comments"""
+
+    @pytest.mark.unit
+    @pytest.mark.mock
+    def test_nothing_to_expand(self):
+        """A thread showing every comment is not scrolled"""
+        page = MagicMock()
+        page.evaluate.return_value = []
+
+        assert expand_comments(page, ['c1', 'c2']) == []
+        page.wait_for_function.assert_not_called()
+
+    @pytest.mark.unit
+    @pytest.mark.mock
+    def test_loads_more_until_found(self):
+        """More comments are loaded while some are missing"""
+        page = MagicMock()
+        page.evaluate.side_effect = [['c2'], None, []]
+        page.locator.return_value.first.is_visible.return_value = False
+
+        assert expand_comments(page, ['c1', 'c2']) == []
+        assert page.wait_for_function.call_count == 1
+
+    @pytest.mark.unit
+    @pytest.mark.mock
+    def test_stops_when_nothing_more_loads(self):
+        """The comments the thread never shows are returned for the fallback"""
+        page = MagicMock()
+        page.evaluate.side_effect = [['c2'], None]
+        page.locator.return_value.first.is_visible.return_value = False
+        page.wait_for_function.side_effect = PlaywrightTimeoutError('no more comments')
+
+        assert expand_comments(page, ['c1', 'c2']) == ['c2']
+
+
+class TestPermalinks:
+    """Test capturing the missing comments from their permalinks"""
+
+    @pytest.mark.unit
+    @pytest.mark.mock
+    def test_sharded_across_pages(self):
+        """Comments are spread over the pages, each round loading them side by side"""
+        service = MagicMock()
+        pages = [MagicMock(name=f'page{i}') for i in range(2)]
+        service.new_page.side_effect = pages
+        for page in pages:
+            page.locator.return_value.is_visible.return_value = False
+        comments = [comment(f'c{i}') for i in range(3)]
+        paths = {c['comment_id']: f"{c['comment_id']}.png" for c in comments}
+
+        with patch.object(screenshot_downloader, 'capture_comment') as capture:
+            capture_permalinks(service, MagicMock(), comments, paths, CaptureMetrics(), shards=2)
+
+        assert service.new_page.call_count == 2
+        assert [c.args[0] for c in pages[0].goto.call_args_list] == [
+            'https://new.reddit.com//r/AskReddit/comments/abc/_/c0/',
+            'https://new.reddit.com//r/AskReddit/comments/abc/_/c2/',
+        ]
+        assert capture.call_args_list == [
+            call(pages[0], comments[0], 'c0.png'),
+            call(pages[1], comments[1], 'c1.png'),
+            call(pages[0], comments[2], 'c2.png'),
+        ]
+        for page in pages:
+            page.close.assert_called_once()
+
+    @pytest.mark.unit
+    @pytest.mark.mock
+    def test_no_more_pages_than_comments(self):
+        """A single missing comment opens a single page"""
+        service = MagicMock()
+        with patch.object(screenshot_downloader, 'capture_comment'):
+            capture_permalinks(service, MagicMock(), [comment('c0')], {'c0': 'c0.png'}, CaptureMetrics(), shards=4)
+        assert service.new_page.call_count == 1
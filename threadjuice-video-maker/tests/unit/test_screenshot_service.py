@@ -0,0 +1,169 @@
+"""
+Unit tests for the screenshot service
+Testing the context pool, its recycling and the saved Reddit login, with a mocked browser
+"""
+
+import json
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from video_creation.screenshot_service import (
+    BrowserOptions,
+    CaptureMetrics,
+    ScreenshotService,
+    has_session,
+    is_blocked,
+)
+
+SESSION = {'name': 'reddit_session', 'value': 'abc', 'expires': -1}
+
+
+@pytest.fixture
+def service(tmp_path):
+    cookie_file = tmp_path / 'cookies.json'
+    cookie_file.write_text(json.dumps([{'name': 'theme', 'value': 'dark'}]))
+    service = ScreenshotService(
+        BrowserOptions(1080, 1920, 'en-us', str(cookie_file)),
+        recycle_after=2,
+        storage_state=str(tmp_path / 'state.json'),
+    )
+    service._browser = MagicMock()
+    service._browser.new_context.side_effect = lambda **kwargs: MagicMock(**{'cookies.return_value': [SESSION]})
+    return service
+
+
+class TestSession:
+    """Test telling whether the saved login still holds"""
+
+    @pytest.mark.unit
+    def test_session_cookie(self):
+        """Only an unexpired reddit_session cookie counts as logged in"""
+        assert has_session([SESSION])
+        assert has_session([{**SESSION, 'expires': 2000}], now=1000)
+        assert not has_session([{**SESSION, 'expires': 500}], now=1000)
+        assert not has_session([{'name': 'theme', 'value': 'dark'}])
+
+    @pytest.mark.unit
+    @pytest.mark.mock
+    def test_login_only_without_session(self, service):
+        """Contexts restored with a live session skip the login form"""
+        with patch.object(ScreenshotService, 'login') as login:
+            with service.page():
+                pass
+        login.assert_not_called()
+
+        service._browser.new_context.side_effect = lambda **kwargs: MagicMock(**{'cookies.return_value': []})
+        service._idle.clear()
+        with patch.object(ScreenshotService, 'login') as login:
+            with service.page():
+                pass
+        login.assert_called_once()
+
+    @pytest.mark.unit
+    @pytest.mark.mock
+    def test_saved_state_is_loaded(self, service):
+        """New contexts start from the saved storage state once there is one"""
+        service.storage_state.write_text('{}')
+        with service.page():
+            pass
+        kwargs = service._browser.new_context.call_args.kwargs
+        assert kwargs['storage_state'] == str(service.storage_state)
+
+
+class TestPool:
+    """Test reusing and recycling contexts"""
+
+    @pytest.mark.unit
+    @pytest.mark.mock
+    def test_context_is_reused(self, service):
+        """A second job gets the warm context of the first"""
+        with service.context() as first:
+            pass
+        with service.context() as second:
+            pass
+        assert first is second
+        assert service._browser.new_context.call_count == 1
+
+    @pytest.mark.unit
+    @pytest.mark.mock
+    def test_context_is_recycled(self, service):
+        """After recycle_after pages the context is closed and replaced"""
+        with service.page():
+            pass
+        with service.page():
+            pass
+        assert service._browser.new_context.call_count == 1
+        assert not service._idle
+
+        with service.page():
+            pass
+        assert service._browser.new_context.call_count == 2
+
+    @pytest.mark.unit
+    @pytest.mark.mock
+    def test_failed_context_is_dropped(self, service):
+        """A job that fails does not give its context back"""
+        with pytest.raises(RuntimeError):
+            with service.context() as context:
+                raise RuntimeError('page crashed')
+        context.close.assert_called_once()
+        assert not service._idle
+
+
+class TestCapture:
+    """Test resource blocking, timeouts and metrics"""
+
+    @pytest.mark.unit
+    def test_is_blocked(self):
+        """Ads, trackers and media are blocked, the page and its images are not"""
+        assert is_blocked('media', 'https://v.redd.it/abc/DASH_720.mp4')
+        assert is_blocked('script', 'https://securepubads.g.doubleclick.net/tag/js/gpt.js')
+        assert is_blocked('xhr', 'https://w3-reporting.reddit.com/reports')
+        assert not is_blocked('document', 'https://www.reddit.com/r/AskReddit/comments/abc/')
+        assert not is_blocked('image', 'https://preview.redd.it/avatar.png')
+        assert not is_blocked('script', 'https://notdoubleclick.net/app.js')
+
+    @pytest.mark.unit
+    @pytest.mark.mock
+    def test_route_aborts_blocked_requests(self, service):
+        """Blocked requests are aborted and counted, the rest go through"""
+        blocked = MagicMock()
+        blocked.request.resource_type = 'media'
+        blocked.request.url = 'https://v.redd.it/abc.mp4'
+        allowed = MagicMock()
+        allowed.request.resource_type = 'document'
+        allowed.request.url = 'https://www.reddit.com/'
+
+        service._route(blocked)
+        service._route(allowed)
+
+        blocked.abort.assert_called_once()
+        allowed.continue_.assert_called_once()
+        assert service.metrics.blocked == {'media': 1}
+
+    @pytest.mark.unit
+    @pytest.mark.mock
+    def test_contexts_get_timeouts_and_routes(self, service):
+        """Every step of a context is bounded and its requests go through the filter"""
+        service.timeout = 12
+        with service.context() as context:
+            pass
+        context.set_default_timeout.assert_called_once_with(12000)
+        context.set_default_navigation_timeout.assert_called_once_with(12000)
+        context.route.assert_called_once_with('**/*', service._route)
+
+    @pytest.mark.unit
+    def test_metrics_record_failed_steps(self, tmp_path):
+        """Steps are timed even when they fail, and written as JSON"""
+        metrics = CaptureMetrics()
+        with metrics.step('thread'):
+            pass
+        with pytest.raises(TimeoutError):
+            with metrics.step('comment_0'):
+                raise TimeoutError()
+        metrics.blocked['media'] += 3
+
+        report = metrics.write(str(tmp_path / 'metrics.json'))
+        assert [(step['step'], step['ok']) for step in report['steps']] == [('thread', True), ('comment_0', False)]
+        assert json.loads((tmp_path / 'metrics.json').read_text())['blocked_requests'] == {'media': 3}
@@ -0,0 +1,99 @@
+"""
+Unit tests for the on-disk TTS audio cache
+Testing hits, misses, LRU eviction and key stability
+"""
+
+import os
+import time
+
+import pytest
+from unittest.mock import patch
+
+from TTS.cache import TTSCache, voice_key
+
+
+def write_clip(path, size=1000):
+    path.write_bytes(b'\xff' * size)
+    return str(path)
+
+
+class TestTTSCache:
+    """Test the content-addressed TTS cache"""
+
+    @pytest.mark.unit
+    def test_miss_then_hit(self, tmp_path):
+        """A stored clip is copied back with its duration on the next lookup"""
+        cache = TTSCache(directory=str(tmp_path / 'cache'))
+        key = TTSCache.key('TikTok', 'en_us_001', '', 'ThreadJuice presents')
+
+        assert cache.get(key, str(tmp_path / 'title.mp3')) is None
+
+        cache.put(key, write_clip(tmp_path / 'synth.mp3'), 1.25)
+        assert cache.get(key, str(tmp_path / 'title.mp3')) == 1.25
+        assert (tmp_path / 'title.mp3').read_bytes() == (tmp_path / 'synth.mp3').read_bytes()
+        assert cache.stats() == {'hits': 1, 'misses': 1, 'evictions': 0}
+
+    @pytest.mark.unit
+    def test_key_depends_on_every_part(self):
+        """Provider, voice, language and text all change the key"""
+        base = TTSCache.key('TikTok', 'en_us_001', '', 'Hello')
+
+        assert base == TTSCache.key('TikTok', 'en_us_001', None, 'Hello')
+        assert base != TTSCache.key('StreamlabsPolly', 'en_us_001', '', 'Hello')
+        assert base != TTSCache.key('TikTok', 'en_us_002', '', 'Hello')
+        assert base != TTSCache.key('TikTok', 'en_us_001', 'es', 'Hello')
+        assert base != TTSCache.key('TikTok', 'en_us_001', '', 'Hello!')
+
+    @pytest.mark.unit
+    def test_least_recently_used_entry_is_evicted(self, tmp_path):
+        """Going over the size cap removes the entry that was used longest ago"""
+        cache = TTSCache(directory=str(tmp_path / 'cache'), max_bytes=2500)
+        clip = write_clip(tmp_path / 'clip.mp3')
+
+        cache.put('old', clip, 1.0)
+        cache.put('recent', clip, 1.0)
+        past = time.time() - 60
+        os.utime(tmp_path / 'cache' / 'recent.mp3', (past, past))
+        os.utime(tmp_path / 'cache' / 'old.mp3', (past - 60, past - 60))
+
+        # 'recent' is used again, so 'old' is the least recently used one
+        assert cache.get('recent', str(tmp_path / 'out.mp3')) == 1.0
+        cache.put('new', clip, 1.0)
+
+        assert cache.evictions == 1
+        assert not (tmp_path / 'cache' / 'old.mp3').exists()
+        assert not (tmp_path / 'cache' / 'old.json').exists()
+        assert cache.get('recent', str(tmp_path / 'out.mp3')) == 1.0
+        assert cache.get('new', str(tmp_path / 'out.mp3')) == 1.0
+
+    @pytest.mark.unit
+    def test_storing_a_key_again_replaces_its_size(self, tmp_path):
+        """Re-putting a clip counts its bytes once, so nothing is evicted for it"""
+        cache = TTSCache(directory=str(tmp_path / 'cache'), max_bytes=2500)
+        clip = write_clip(tmp_path / 'clip.mp3')
+
+        cache.put('other', clip, 1.0)
+        for _ in range(3):
+            cache.put('same', clip, 1.0)
+
+        assert cache.evictions == 0
+        assert cache._size == sum(f.stat().st_size for f in (tmp_path / 'cache').iterdir())
+
+    @pytest.mark.unit
+    def test_entry_without_duration_is_a_miss(self, tmp_path):
+        """Audio left behind without its json marker is never served"""
+        cache = TTSCache(directory=str(tmp_path))
+        write_clip(tmp_path / 'orphan.mp3')
+
+        assert cache.get('orphan', str(tmp_path / 'out.mp3')) is None
+        assert not (tmp_path / 'out.mp3').exists()
+
+    @pytest.mark.unit
+    def test_voice_key(self):
+        """Configured voices are part of the key, random voices are not"""
+        with patch('utils.settings.config', {
+            'settings': {'tts': {'tiktok_voice': 'en_US_001'}}
+        }):
+            assert voice_key('TikTok', random_voice=False) == 'en_us_001'
+            assert voice_key('TikTok', random_voice=True) == 'random'
+            assert voice_key('GTTS', random_voice=False) == ''
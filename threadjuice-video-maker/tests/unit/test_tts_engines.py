@@ -3,13 +3,16 @@ Unit tests for Text-to-Speech engines
 Testing various TTS providers and fallback mechanisms
 """
 
+import io
 import pytest
+import wave
 from unittest.mock import Mock, patch, MagicMock, mock_open
 from pathlib import Path
 import tempfile
 
 from TTS.GTTS import GTTS
 from TTS.engine_wrapper import TTSEngine
+from TTS.provider import AsyncProvider, ProviderLoop
 from video_creation.voices import save_text_to_mp3
 
 
@@ -166,6 +169,193 @@ class TestTTSEngine:
             assert num_comments > 0
             assert length > 0
     
+    @pytest.mark.unit
+    @pytest.mark.mock
+    @pytest.mark.parametrize("concurrency", [1, 4])
+    def test_engine_concurrent_run_keeps_max_length_cutoff(self, concurrency, tmp_path):
+        """Concurrent synthesis stops at the same comment as a sequential run"""
+        reddit_obj = {
+            'thread_id': 'test123',
+            'thread_title': 'Test Title',
+            'comments': [
+                {'comment_id': f'c{i}', 'comment_body': f'Comment number {i}.'}
+                for i in range(6)
+            ]
+        }
+
+        mock_tts_instance = Mock()
+        mock_tts_instance.max_chars = 1000
+        mock_tts_instance.max_concurrency = 4
+        mock_tts_module = Mock(return_value=mock_tts_instance)
+
+        with patch('TTS.engine_wrapper.process_text', side_effect=lambda x: x), \
+             patch('utils.settings.config', {
+                 'settings': {
+                     'storymode': False,
+                     'tts': {'random_voice': False, 'concurrency': concurrency, 'cache': False}
+                 }
+             }), \
+             patch('TTS.engine_wrapper.AudioFileClip') as mock_audio:
+
+            mock_audio.return_value.duration = 20.0
+
+            engine = TTSEngine(mock_tts_module, reddit_obj, path=f"{tmp_path}/")
+            length, num_comments = engine.run()
+
+            # title + comment 0 + comment 1 pass the 50s limit, comment 1 is dropped again
+            assert length == 40.0
+            assert num_comments == 1
+            written = {c.kwargs['filepath'] for c in mock_tts_instance.run.call_args_list}
+            assert {
+                f"{tmp_path}/test123/mp3/title.mp3",
+                f"{tmp_path}/test123/mp3/0.mp3",
+                f"{tmp_path}/test123/mp3/1.mp3",
+            } <= written
+
+    @pytest.mark.unit
+    @pytest.mark.mock
+    def test_engine_drives_async_providers_from_one_loop(self, tmp_path):
+        """Async providers get the same cutoff, with their audio written by the engine"""
+        reddit_obj = {
+            'thread_id': 'test123',
+            'thread_title': 'Test Title',
+            'comments': [
+                {'comment_id': f'c{i}', 'comment_body': f'Comment number {i}.'}
+                for i in range(6)
+            ]
+        }
+        buffer = io.BytesIO()
+        with wave.open(buffer, 'wb') as f:
+            f.setnchannels(1)
+            f.setsampwidth(1)
+            f.setframerate(1000)
+            f.writeframes(b'\x80' * 20000)  # 20 seconds
+
+        class FakeProvider(AsyncProvider):
+            def __init__(self):
+                self.max_chars = 1000
+                self.max_concurrency = 4
+                self.texts = []
+
+            def get_voice(self, random_voice=False):
+                return 'narrator'
+
+            def fetch(self, text, voice):
+                self.texts.append(text)
+                return buffer.getvalue()
+
+        with patch('TTS.engine_wrapper.process_text', side_effect=lambda x: x), \
+             patch('utils.settings.config', {
+                 'settings': {
+                     'storymode': False,
+                     'tts': {'random_voice': False, 'concurrency': 4, 'cache': False}
+                 }
+             }):
+
+            engine = TTSEngine(FakeProvider, reddit_obj, path=f"{tmp_path}/")
+            assert isinstance(engine.make_pool(), ProviderLoop)
+            length, num_comments = engine.run()
+
+            assert length == 40.0
+            assert num_comments == 1
+            assert 'Test Title' in engine.tts_module.texts
+            assert (tmp_path / 'test123' / 'mp3' / '0.mp3').exists()
+
+    @pytest.mark.unit
+    @pytest.mark.mock
+    def test_engine_renders_batch_providers_in_batches(self, tmp_path):
+        """Batch providers get the title and the queued comments in one call"""
+        reddit_obj = {
+            'thread_id': 'test123',
+            'thread_title': 'Test Title',
+            'comments': [
+                {'comment_id': f'c{i}', 'comment_body': f'Comment number {i}.'}
+                for i in range(6)
+            ]
+        }
+        buffer = io.BytesIO()
+        with wave.open(buffer, 'wb') as f:
+            f.setnchannels(1)
+            f.setsampwidth(1)
+            f.setframerate(1000)
+            f.writeframes(b'\x80' * 20000)  # 20 seconds
+
+        class BatchProvider:
+            def __init__(self):
+                self.max_chars = 1000
+                self.max_concurrency = 1
+                self.batch_size = 3
+                self.batches = []
+
+            def run_batch(self, jobs, random_voice=False):
+                self.batches.append([text for text, _ in jobs])
+                for _, filepath in jobs:
+                    Path(filepath).write_bytes(buffer.getvalue())
+
+        with patch('TTS.engine_wrapper.process_text', side_effect=lambda x: x), \
+             patch('utils.settings.config', {
+                 'settings': {
+                     'storymode': False,
+                     'tts': {'random_voice': False, 'cache': False}
+                 }
+             }):
+
+            engine = TTSEngine(BatchProvider, reddit_obj, path=f"{tmp_path}/")
+            length, num_comments = engine.run()
+
+            assert length == 40.0
+            assert num_comments == 1
+            assert engine.tts_module.batches == [[
+                'Test Title', 'Comment number 0.', 'Comment number 1.', 'Comment number 2.'
+            ]]
+            assert not (tmp_path / 'test123' / 'mp3' / '2.mp3').exists()
+
+    @pytest.mark.unit
+    @pytest.mark.mock
+    def test_batches_stop_near_max_length(self, tmp_path):
+        """Large batches only queue the comments expected to fit in the length left"""
+        reddit_obj = {
+            'thread_id': 'test123',
+            'thread_title': 'Test Title',
+            'comments': [
+                {'comment_id': f'c{i}', 'comment_body': f'Comment {i:03d} ' + 'x' * 138 + '.'}
+                for i in range(40)
+            ]
+        }
+
+        class BatchProvider:
+            def __init__(self):
+                self.max_chars = 1000
+                self.max_concurrency = 1
+                self.batch_size = 32
+                self.batches = []
+
+            def run_batch(self, jobs, random_voice=False):
+                self.batches.append([text for text, _ in jobs])
+                for text, filepath in jobs:
+                    buffer = io.BytesIO()
+                    with wave.open(buffer, 'wb') as f:
+                        f.setnchannels(1)
+                        f.setsampwidth(1)
+                        f.setframerate(1000)
+                        f.writeframes(b'\x80' * round(len(text) / 15 * 1000))  # 15 characters a second
+                    Path(filepath).write_bytes(buffer.getvalue())
+
+        with patch('TTS.engine_wrapper.process_text', side_effect=lambda x: x), \
+             patch('utils.settings.config', {
+                 'settings': {
+                     'storymode': False,
+                     'tts': {'random_voice': False, 'cache': False}
+                 }
+             }):
+
+            engine = TTSEngine(BatchProvider, reddit_obj, path=f"{tmp_path}/")
+            length, num_comments = engine.run()
+
+            rendered = sum(len(batch) for batch in engine.tts_module.batches)
+            assert num_comments == 4
+            assert rendered <= num_comments + 3, engine.tts_module.batches
+
     @pytest.mark.unit
     def test_engine_text_processing(self):
         """Test text processing for TTS"""
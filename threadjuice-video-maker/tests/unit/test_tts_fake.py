@@ -0,0 +1,77 @@
+"""
+Unit tests for the fake TTS provider
+Testing that audio, latency and failures are derived from the text alone
+"""
+
+from unittest.mock import patch
+
+import pytest
+
+from TTS.fake import FakeTTS, FakeTTSException
+
+
+def config(error_rate=0.0):
+    return {'settings': {'tts': {'fake_latency': 0, 'fake_error_rate': error_rate}}}
+
+
+def lavfi_source(mock_ffmpeg):
+    return mock_ffmpeg.input.call_args[0][0]
+
+
+class TestFakeTTS:
+    """Test the offline provider"""
+
+    @pytest.mark.unit
+    @pytest.mark.mock
+    @patch('TTS.fake.ffmpeg')
+    def test_same_text_same_audio(self, mock_ffmpeg):
+        """The tone depends on the text and nothing else"""
+        mock_ffmpeg.input.return_value.output.return_value.run.return_value = (b'mp3', b'')
+        with patch('utils.settings.config', config()):
+            tts = FakeTTS()
+            assert tts.fetch('Hello there', 'tone') == b'mp3'
+            first = lavfi_source(mock_ffmpeg)
+            tts.fetch('Hello there', 'tone')
+            assert lavfi_source(mock_ffmpeg) == first
+            tts.fetch('Something else entirely', 'tone')
+            assert lavfi_source(mock_ffmpeg) != first
+
+    @pytest.mark.unit
+    @pytest.mark.mock
+    @patch('TTS.fake.ffmpeg')
+    def test_duration_follows_text_length(self, mock_ffmpeg):
+        """Longer text reads for longer, with a floor for short clips"""
+        mock_ffmpeg.input.return_value.output.return_value.run.return_value = (b'mp3', b'')
+        with patch('utils.settings.config', config()):
+            tts = FakeTTS()
+            tts.fetch('x' * 150, 'noise')
+            assert 'duration=10.000' in lavfi_source(mock_ffmpeg)
+            tts.fetch('x', 'tone')
+            assert 'duration=0.500' in lavfi_source(mock_ffmpeg)
+
+    @pytest.mark.unit
+    @pytest.mark.mock
+    @patch('TTS.fake.ffmpeg')
+    def test_error_rate(self, mock_ffmpeg):
+        """Failures are simulated at the configured rate, the same texts failing every run"""
+        mock_ffmpeg.input.return_value.output.return_value.run.return_value = (b'mp3', b'')
+        with patch('utils.settings.config', config(error_rate=1.0)):
+            with pytest.raises(FakeTTSException):
+                FakeTTS().fetch('Hello there', 'tone')
+
+        texts = [f'Comment number {i}.' for i in range(200)]
+
+        def failures():
+            failed = []
+            for text in texts:
+                try:
+                    tts.fetch(text, 'tone')
+                except FakeTTSException:
+                    failed.append(text)
+            return failed
+
+        with patch('utils.settings.config', config(error_rate=0.25)):
+            tts = FakeTTS()
+            failed = failures()
+            assert 20 < len(failed) < 80
+            assert failures() == failed
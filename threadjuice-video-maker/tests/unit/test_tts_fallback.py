@@ -0,0 +1,282 @@
+"""
+Unit tests for hedged TTS requests
+Testing latency tracking, fallback on errors, hedging and voice pinning
+"""
+
+import asyncio
+import io
+import random
+import time
+import wave
+from unittest.mock import patch
+
+import pytest
+
+from TTS.cache import TTSCache
+from TTS.engine_wrapper import TTSEngine
+from TTS.fallback import FallbackProvider, LatencyTracker, get_tracker
+from TTS.provider import AsyncProvider, ProviderLoop
+
+CONFIG = {'settings': {'tts': {'random_voice': True}}}
+
+
+def provider(name, delay=0.0, fail=False):
+    """Builds a provider class answering with its own name after `delay` seconds"""
+
+    class Provider(AsyncProvider):
+        max_chars = 300
+        max_concurrency = 2
+
+        def __init__(self):
+            self.calls = 0
+
+        def get_voice(self, random_voice=False):
+            return f'{name}-{random.random()}' if random_voice else name
+
+        async def synthesize(self, text, voice=None):
+            self.calls += 1
+            await asyncio.sleep(delay)
+            if fail:
+                raise RuntimeError(f'{name} is down')
+            return f'{name}:{voice}:{text}'.encode()
+
+        def fetch(self, text, voice):
+            return asyncio.run(self.synthesize(text, voice))
+
+    Provider.__name__ = name
+    return Provider
+
+
+def blocking_provider(name, delay=0.0):
+    """Builds a provider class with a blocking fetch, served from a thread pool"""
+
+    class Provider(AsyncProvider):
+        max_chars = 300
+        max_concurrency = 4
+
+        def get_voice(self, random_voice=False):
+            return name
+
+        def fetch(self, text, voice):
+            time.sleep(delay)
+            return f'{name}:{voice}:{text}'.encode()
+
+    Provider.__name__ = name
+    return Provider
+
+
+class TestLatencyTracker:
+    """Test the EWMA quantile estimates"""
+
+    @pytest.mark.unit
+    def test_tracks_median_and_tail(self):
+        """Estimates settle near the real quantiles of the samples"""
+        random.seed(7)
+        tracker = LatencyTracker()
+        for _ in range(3000):
+            tracker.record(random.uniform(0, 10))
+
+        assert 3.5 < tracker.p50 < 6.5
+        assert 8.5 < tracker.p95 <= 10.5
+
+    @pytest.mark.unit
+    def test_hedge_delay_waits_for_enough_samples(self):
+        """The default delay applies until the p95 means something"""
+        tracker = LatencyTracker()
+        tracker.record(1.0)
+        assert tracker.hedge_delay(5.0) == 5.0
+        for _ in range(5):
+            tracker.record(1.0)
+        assert 1.0 <= tracker.hedge_delay(5.0) < 1.5
+
+
+class TestFallbackProvider:
+    """Test asking the chain of providers"""
+
+    @pytest.mark.unit
+    @pytest.mark.mock
+    def test_primary_answers_alone(self):
+        """A healthy primary is the only provider asked"""
+        with patch('utils.settings.config', CONFIG):
+            chain = FallbackProvider([provider('FastA'), provider('FastB')])
+            assert asyncio.run(chain.synthesize('hello')).startswith(b'FastA:')
+        assert chain.members[1].calls == 0
+        assert chain.max_chars == 300
+
+    @pytest.mark.unit
+    @pytest.mark.mock
+    def test_errors_fall_through_the_chain(self):
+        """A failing provider hands the clip to the next one right away"""
+        with patch('utils.settings.config', CONFIG):
+            chain = FallbackProvider(
+                [provider('DownA', fail=True), provider('DownB', fail=True), provider('UpC')],
+                hedge_delay=10,
+            )
+            assert asyncio.run(chain.synthesize('hello')).startswith(b'UpC:')
+        assert get_tracker('DownA').failures >= 1
+
+    @pytest.mark.unit
+    @pytest.mark.mock
+    def test_all_failing_raises_the_last_error(self):
+        """Nothing answering is an error, not silence"""
+        with patch('utils.settings.config', CONFIG):
+            chain = FallbackProvider([provider('BrokenA', fail=True), provider('BrokenB', fail=True)])
+            with pytest.raises(RuntimeError, match='BrokenB'):
+                asyncio.run(chain.synthesize('hello'))
+
+    @pytest.mark.unit
+    @pytest.mark.mock
+    def test_slow_primary_is_hedged(self):
+        """After the hedge delay the next provider is asked too, and the first answer wins"""
+        with patch('utils.settings.config', CONFIG):
+            chain = FallbackProvider(
+                [provider('SlowA', delay=5), provider('QuickB', delay=0.01)], hedge_delay=0.05
+            )
+            result = asyncio.run(asyncio.wait_for(chain.synthesize('hello'), timeout=2))
+        assert result.startswith(b'QuickB:')
+
+    @pytest.mark.unit
+    @pytest.mark.mock
+    def test_hedge_winner_is_kept(self):
+        """Once a hedge answered, the next clips go to the same provider without hedging"""
+        with patch('utils.settings.config', CONFIG):
+            chain = FallbackProvider(
+                [provider('LaggyA', delay=0.5), provider('KeptB', delay=0.01)], hedge_delay=0.05
+            )
+            results = [asyncio.run(chain.synthesize(text)) for text in ('one', 'two', 'three')]
+        assert all(result.startswith(b'KeptB:') for result in results)
+        assert chain.members[0].calls == 1
+
+    @pytest.mark.unit
+    @pytest.mark.mock
+    def test_errors_still_fail_over_after_settling(self):
+        """The settled provider failing on a clip hands it on, and stays the first one asked"""
+        outage = {'on': False}
+
+        class Flaky(provider('FlakyA')):
+            async def synthesize(self, text, voice=None):
+                if outage['on']:
+                    raise RuntimeError('FlakyA is down')
+                return await super().synthesize(text, voice)
+
+        Flaky.__name__ = 'FlakyA'
+        with patch('utils.settings.config', CONFIG):
+            chain = FallbackProvider([Flaky, provider('BackupB')], hedge_delay=10)
+            assert asyncio.run(chain.synthesize('one')).startswith(b'FlakyA:')
+            outage['on'] = True
+            assert asyncio.run(chain.synthesize('two')).startswith(b'BackupB:')
+            outage['on'] = False
+            assert asyncio.run(chain.synthesize('three')).startswith(b'FlakyA:')
+
+    @pytest.mark.unit
+    @pytest.mark.mock
+    def test_voice_is_pinned_per_video(self):
+        """Random voices are drawn once per provider, not once per clip"""
+        with patch('utils.settings.config', CONFIG):
+            chain = FallbackProvider([provider('PinnedA'), provider('PinnedB')])
+            first = asyncio.run(chain.synthesize('one')).split(b':')[1]
+            second = asyncio.run(chain.synthesize('two')).split(b':')[1]
+        assert first == second
+
+    @pytest.mark.unit
+    @pytest.mark.mock
+    def test_hedges_are_not_held_back_by_slow_requests(self):
+        """With every slot taken by a slow primary, the hedges still answer right away"""
+        with patch('utils.settings.config', CONFIG):
+            chain = FallbackProvider(
+                [blocking_provider('StuckA', delay=1.5), blocking_provider('SpareB')], hedge_delay=0.05
+            )
+            start = time.perf_counter()
+            with ProviderLoop(4) as loop:
+                futures = [loop.submit(chain.synthesize, f'clip {i}') for i in range(8)]
+                results = [future.result(timeout=5) for future in futures]
+                elapsed = time.perf_counter() - start
+
+        assert all(result.startswith(b'SpareB:') for result in results)
+        assert elapsed < 1.0
+
+
+def silent_wav(seconds):
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(1)
+        f.setframerate(1000)
+        f.writeframes(b'\x80' * int(seconds * 1000))
+    return buffer.getvalue()
+
+
+class TestChainCache:
+    """Test caching the clips of a fallback chain"""
+
+    @pytest.mark.unit
+    @pytest.mark.mock
+    def test_clips_are_keyed_on_the_provider_that_answered(self, tmp_path):
+        """A clip is cached under the answering provider and its voice, never the chain"""
+
+        class TikTok(AsyncProvider):
+            max_chars = 300
+
+            def get_voice(self, random_voice=False):
+                return 'en_us_001'
+
+            def fetch(self, text, voice):
+                raise RuntimeError('TikTok is down')
+
+        class StreamlabsPolly(AsyncProvider):
+            max_chars = 300
+
+            def get_voice(self, random_voice=False):
+                return 'Brian'
+
+            def fetch(self, text, voice):
+                return silent_wav(2)
+
+        config = {
+            'settings': {'tts': {'random_voice': False, 'tiktok_voice': 'en_us_001',
+                                 'streamlabs_polly_voice': 'Brian'}},
+            'reddit': {'thread': {'post_lang': ''}},
+        }
+        reddit_obj = {'thread_id': 'chain', 'thread_title': 'Title', 'comments': []}
+        with patch('utils.settings.config', config):
+            engine = TTSEngine(
+                lambda: FallbackProvider([TikTok, StreamlabsPolly], hedge_delay=10),
+                reddit_obj, path=f'{tmp_path}/',
+            )
+            engine.cache = TTSCache(directory=str(tmp_path / 'cache'))
+            (tmp_path / 'chain' / 'mp3').mkdir(parents=True)
+            assert asyncio.run(engine.synthesize_async('0', 'hello')) == 2.0
+
+            answered = TTSCache.key('StreamlabsPolly', 'brian', '', 'hello')
+            chain = TTSCache.key('FallbackProvider', '', '', 'hello')
+            assert engine.cache.get(answered, str(tmp_path / 'hit.mp3')) == 2.0
+            assert engine.cache.get(chain, str(tmp_path / 'miss.mp3')) is None
+            assert engine.tts_module.provider_name == 'StreamlabsPolly'
+
+    @pytest.mark.unit
+    @pytest.mark.mock
+    def test_engine_closes_the_chain(self, tmp_path):
+        """The thread pools of a chain are stopped once its video is voiced"""
+
+        class QuietA(AsyncProvider):
+            max_chars = 300
+            max_concurrency = 2
+
+            def get_voice(self, random_voice=False):
+                return 'a'
+
+            def fetch(self, text, voice):
+                return silent_wav(1)
+
+        reddit_obj = {
+            'thread_id': 'closed',
+            'thread_title': 'Title',
+            'comments': [{'comment_id': 'c0', 'comment_body': 'One comment.'}],
+        }
+        config = {'settings': {'storymode': False, 'tts': {'random_voice': False, 'cache': False}}}
+        with patch('TTS.engine_wrapper.process_text', side_effect=lambda x: x), \
+             patch('utils.settings.config', config):
+            engine = TTSEngine(lambda: FallbackProvider([QuietA, provider('SpareB')]), reddit_obj, path=f'{tmp_path}/')
+            engine.run()
+
+        assert all(executor._shutdown for executor in engine.tts_module.executors)
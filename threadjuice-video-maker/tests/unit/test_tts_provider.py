@@ -0,0 +1,141 @@
+"""
+Unit tests for the async TTS provider protocol
+Testing the provider event loop and the shared HTTP sessions
+"""
+
+import asyncio
+import threading
+
+import pytest
+
+from TTS.provider import (
+    AsyncProvider,
+    BatchExecutor,
+    ProviderLoop,
+    http_session,
+    supports_async,
+)
+
+
+class EchoProvider(AsyncProvider):
+    def get_voice(self, random_voice=False):
+        return 'echo'
+
+    def fetch(self, text, voice):
+        return f'{voice}:{text}'.encode()
+
+
+class TestAsyncProvider:
+    """Test the provider side of the protocol"""
+
+    @pytest.mark.unit
+    def test_synthesize_awaits_fetch(self):
+        """synthesize returns what fetch returns, off the event loop thread"""
+        assert asyncio.run(EchoProvider().synthesize('hi', 'echo')) == b'echo:hi'
+        assert supports_async(EchoProvider())
+        assert not supports_async(object())
+
+    @pytest.mark.unit
+    def test_run_writes_the_fetched_audio(self, tmp_path):
+        """The blocking run() stays available next to synthesize()"""
+        EchoProvider().run('hi', str(tmp_path / 'clip.mp3'))
+        assert (tmp_path / 'clip.mp3').read_bytes() == b'echo:hi'
+
+    @pytest.mark.unit
+    def test_provider_missing_a_method_cannot_be_created(self):
+        """Leaving out get_voice or fetch fails when the provider is built, not when voiced"""
+
+        class Voiceless(AsyncProvider):
+            def fetch(self, text, voice):
+                return b''
+
+        with pytest.raises(TypeError, match='get_voice'):
+            Voiceless()
+
+    @pytest.mark.unit
+    def test_http_sessions_are_shared_per_provider(self):
+        """Every instance of a provider reuses one pooled session"""
+        assert http_session('test-provider') is http_session('test-provider')
+        assert http_session('test-provider') is not http_session('other-provider')
+
+
+class TestProviderLoop:
+    """Test driving coroutines from synchronous code"""
+
+    @pytest.mark.unit
+    def test_limits_requests_in_flight(self):
+        """No more than max_in_flight coroutines run at the same time"""
+        running = 0
+        peak = 0
+        lock = threading.Lock()
+
+        async def request(value):
+            nonlocal running, peak
+            with lock:
+                running += 1
+                peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            with lock:
+                running -= 1
+            return value * 2
+
+        with ProviderLoop(3) as loop:
+            futures = [loop.submit(request, i) for i in range(12)]
+            results = [future.result() for future in futures]
+
+        assert results == [i * 2 for i in range(12)]
+        assert peak == 3
+
+    @pytest.mark.unit
+    def test_cancelled_requests_never_finish(self):
+        """Cancelling the returned future cancels the coroutine on the loop"""
+        finished = []
+        release = threading.Event()
+
+        async def request(value):
+            await asyncio.to_thread(release.wait)
+            finished.append(value)
+
+        with ProviderLoop(1) as loop:
+            first = loop.submit(request, 1)
+            second = loop.submit(request, 2)
+            assert second.cancel()
+            release.set()
+            first.result()
+
+        assert finished == [1]
+        assert second.cancelled()
+
+
+class TestBatchExecutor:
+    """Test queueing calls into batches"""
+
+    @pytest.mark.unit
+    def test_queued_calls_run_as_one_batch(self):
+        """The first result needed flushes everything queued so far"""
+        batches = []
+
+        def double(calls):
+            batches.append(calls)
+            return [value * 2 for (value,) in calls]
+
+        pool = BatchExecutor()
+        futures = [pool.submit(double, i) for i in range(4)]
+        assert batches == []
+
+        assert futures[2].result() == 4
+        assert [future.result() for future in futures] == [0, 2, 4, 6]
+        assert batches == [[(0,), (1,), (2,), (3,)]]
+
+    @pytest.mark.unit
+    def test_cancelled_calls_are_dropped(self):
+        """Cancelled calls never reach the batch, errors reach every future of it"""
+        def fail(calls):
+            raise RuntimeError(f'{len(calls)} calls')
+
+        with BatchExecutor() as pool:
+            kept = pool.submit(fail, 1)
+            dropped = pool.submit(fail, 2)
+            assert dropped.cancel()
+            with pytest.raises(RuntimeError, match='1 calls'):
+                kept.result()
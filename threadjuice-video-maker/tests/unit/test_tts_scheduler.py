@@ -0,0 +1,136 @@
+"""
+Unit tests for the TTS request scheduler
+Testing token buckets, rate limit headers, backoff and session rotation
+"""
+
+from unittest.mock import Mock
+
+import pytest
+import requests
+
+from TTS.scheduler import RequestScheduler, RoundRobin, TokenBucket, retry_delay
+
+
+class FakeClock:
+    """A clock that only moves when something sleeps"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def response(status=200, headers=None):
+    mock = Mock(spec=requests.Response)
+    mock.status_code = status
+    mock.headers = headers or {}
+    return mock
+
+
+class TestTokenBucket:
+    """Test pacing requests with a token bucket"""
+
+    @pytest.mark.unit
+    def test_burst_then_paced(self):
+        """The burst is free, every further token waits 1/rate"""
+        clock = FakeClock()
+        bucket = TokenBucket(rate=2.0, capacity=2, clock=clock, sleep=clock.sleep)
+
+        waits = [bucket.acquire() for _ in range(4)]
+
+        assert waits[:2] == [0.0, 0.0]
+        assert waits[2:] == [pytest.approx(0.5), pytest.approx(0.5)]
+
+    @pytest.mark.unit
+    def test_headers_reseed_the_bucket(self):
+        """An exhausted window blocks until its reset, a partial one caps the rate until then"""
+        clock = FakeClock()
+        bucket = TokenBucket(rate=10.0, capacity=5, clock=clock, sleep=clock.sleep)
+
+        bucket.update({'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': '30'})
+        assert bucket.acquire() == pytest.approx(30.0)
+
+        bucket.update({'x-ratelimit-remaining': '20', 'x-ratelimit-reset': '10'})
+        assert bucket.rate_at(clock()) == 2.0
+        assert bucket.tokens == 5
+
+        clock.now += 10
+        assert bucket.rate_at(clock()) == bucket.rate == 10.0
+
+    @pytest.mark.unit
+    def test_tight_window_does_not_outlast_its_reset(self):
+        """A window of 1 request in 60 seconds slows the bucket for those 60 seconds only"""
+        clock = FakeClock()
+        bucket = TokenBucket(rate=10.0, capacity=1, clock=clock, sleep=clock.sleep)
+        bucket.acquire()
+
+        bucket.update({'X-RateLimit-Remaining': '1', 'X-RateLimit-Reset': '60'})
+        bucket.acquire()
+        assert bucket.acquire() == pytest.approx(60.0)
+        assert [bucket.acquire() for _ in range(3)] == [pytest.approx(0.1)] * 3
+
+    @pytest.mark.unit
+    def test_retry_delay_formats(self):
+        """Delays, unix timestamps and HTTP dates are all understood"""
+        assert retry_delay({'Retry-After': '7'}) == 7.0
+        assert retry_delay({'X-RateLimit-Reset': '2000000010'}, now=2000000000) == 10.0
+        assert retry_delay({'Retry-After': 'Wed, 21 Oct 2015 07:28:10 GMT'}, now=1445412480) == 10.0
+        assert retry_delay({}) is None
+
+
+class TestRequestScheduler:
+    """Test retrying throttled requests"""
+
+    @pytest.mark.unit
+    @pytest.mark.mock
+    def test_retries_429_after_the_requested_delay(self):
+        """The pause the server asks for applies before the retry"""
+        clock = FakeClock()
+        bucket = TokenBucket(rate=100.0, capacity=10, clock=clock, sleep=clock.sleep)
+        scheduler = RequestScheduler(
+            'test', 100.0, 10, base_delay=0.0, sleep=clock.sleep, bucket=bucket
+        )
+        send = Mock(side_effect=[response(429, {'Retry-After': '5'}), response(200)])
+
+        assert scheduler.request(send).status_code == 200
+        assert send.call_count == 2
+        assert clock.now == pytest.approx(5.0)
+        stats = scheduler.stats()
+        assert stats['retries'] == 1
+        assert stats['throttled_seconds'] == pytest.approx(5.0)
+        assert stats['queue_depth'] == 0
+
+    @pytest.mark.unit
+    @pytest.mark.mock
+    def test_gives_up_after_max_retries(self):
+        """Connection errors are raised once the retries are used up"""
+        clock = FakeClock()
+        scheduler = RequestScheduler('test', 100.0, 10, max_retries=2, sleep=clock.sleep)
+        send = Mock(side_effect=requests.ConnectionError)
+
+        with pytest.raises(requests.ConnectionError):
+            scheduler.request(send)
+        assert send.call_count == 3
+
+    @pytest.mark.unit
+    def test_backoff_is_capped_and_jittered(self):
+        """Backoff doubles per attempt but never exceeds max_delay"""
+        scheduler = RequestScheduler('test', 1.0, 1, base_delay=1.0, max_delay=8.0)
+        for attempt in range(10):
+            assert 0 <= scheduler.backoff(attempt) <= min(8.0, 2**attempt)
+
+
+class TestRoundRobin:
+    """Test rotating credentials"""
+
+    @pytest.mark.unit
+    def test_cycles_through_items(self):
+        """Items are handed out in turn, with their index"""
+        rotation = RoundRobin(['a', 'b'])
+        assert [rotation.next() for _ in range(3)] == [(0, 'a'), (1, 'b'), (0, 'a')]
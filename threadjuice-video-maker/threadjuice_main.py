@@ -16,8 +16,13 @@ from threadjuice.story_fetcher import ThreadJuiceFetcher, ThreadJuiceStory
 from threadjuice.pexels_videos import VideoSelector
 from utils import settings
 from utils.console import print_markdown, print_step, print_substep
-from video_creation.background import chop_background, download_background_video
-from video_creation.final_video import make_final_video
+from video_creation.background import (
+    chop_background,
+    download_background_audio,
+    download_background_video,
+    get_background_config,
+)
+from video_creation.final_video import Preview, make_final_video
 from video_creation.screenshot_downloader import get_screenshots_of_reddit_posts
 from video_creation.voices import save_text_to_mp3
 
@@ -45,18 +50,26 @@ def load_env_vars():
                     os.environ[key] = value.strip('"\'')
                     
 
-def create_threadjuice_video(story_slug: Optional[str] = None, use_pexels: bool = True):
+def create_threadjuice_video(story_slug: Optional[str] = None, use_pexels: bool = True,
+                             preview: Optional[Preview] = None):
     """
     Main function to create a video from a ThreadJuice story
     
     Args:
         story_slug: Specific story slug to use, or None for latest
         use_pexels: Whether to use Pexels for dynamic backgrounds
+        preview: Render a quick low resolution preview instead of the final video
     """
     print_step("Setting up ThreadJuice Video Maker...")
     
     # Load environment variables
     load_env_vars()
+
+    # Load the config, unless the caller already did
+    if not isinstance(settings.config, dict):
+        directory = Path(__file__).parent.absolute()
+        if settings.check_toml(f"{directory}/utils/.config.template.toml", f"{directory}/config.toml") is False:
+            sys.exit()
     
     # Initialize fetcher
     fetcher = ThreadJuiceFetcher()
@@ -130,8 +143,13 @@ def create_threadjuice_video(story_slug: Optional[str] = None, use_pexels: bool
     
     # Download and prepare background
     print_step("Preparing background video...")
-    download_background_video(settings.config["settings"]["background"]["background_video"])
-    chop_background(length)
+    bg_config = {
+        "video": get_background_config("video"),
+        "audio": get_background_config("audio"),
+    }
+    download_background_video(bg_config["video"])
+    download_background_audio(bg_config["audio"])
+    chop_background(bg_config, length, reddit_object)
     
     # Create screenshots (with ThreadJuice branding)
     print_step("Creating story screenshots...")
@@ -139,7 +157,7 @@ def create_threadjuice_video(story_slug: Optional[str] = None, use_pexels: bool
     
     # Compile final video
     print_step("Creating final video...")
-    final_video_path = make_final_video(number_of_comments, length, reddit_object)
+    final_video_path = make_final_video(number_of_comments, length, reddit_object, bg_config, preview)
     
     print_markdown(f"""
 ### ✅ Video Created Successfully!
@@ -170,6 +188,9 @@ def main():
     parser.add_argument('--category', type=str, help='Filter by category')
     parser.add_argument('--no-pexels', action='store_true', help='Disable Pexels backgrounds')
     parser.add_argument('--list', action='store_true', help='List available stories')
+    parser.add_argument('--preview', action='store_true',
+                        help='Render a quick low resolution preview to check captions, timing and layout')
+    parser.add_argument('--preview-seconds', type=float, help='Only preview the first seconds of the video')
     
     args = parser.parse_args()
     
@@ -187,9 +208,13 @@ def main():
         return
     
     # Create video
+    options = {}
+    if args.preview:
+        options['preview'] = Preview(seconds=args.preview_seconds)
     create_threadjuice_video(
         story_slug=args.slug,
-        use_pexels=not args.no_pexels
+        use_pexels=not args.no_pexels,
+        **options
     )
 
 
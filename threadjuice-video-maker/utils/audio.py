@@ -0,0 +1,177 @@
+import json
+import struct
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional
+
+__all__ = [
+    "AudioInfo",
+    "audio_info",
+    "audio_duration",
+    "read_duration_manifest",
+    "write_duration_manifest",
+    "clip_duration",
+]
+
+MANIFEST_NAME = "durations.json"
+
+# kbps, indexed by [version is MPEG-1][layer][bitrate index]
+_BITRATES = {
+    True: {
+        1: (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+        2: (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+        3: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    },
+    False: {
+        1: (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+        2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+        3: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    },
+}
+# Hz, indexed by the version bits of the frame header (0: MPEG-2.5, 2: MPEG-2, 3: MPEG-1)
+_SAMPLE_RATES = {0: (11025, 12000, 8000), 2: (22050, 24000, 16000), 3: (44100, 48000, 32000)}
+
+
+class AudioInfo(NamedTuple):
+    duration: float
+    sample_rate: int
+    channels: int
+
+
+class _Frame(NamedTuple):
+    length: int
+    samples: int
+    sample_rate: int
+    channels: int
+    mpeg1: bool
+
+
+def audio_info(path: str) -> AudioInfo:
+    """Reads the duration and format of an MP3 or WAV file from its headers alone.
+
+    Nothing is decoded and no subprocess is started. The format is sniffed from the content,
+    not the extension, since some providers write WAV data to `.mp3` paths.
+
+    Raises:
+        ValueError: If the file is neither a WAV nor an MPEG audio file.
+    """
+    data = Path(path).read_bytes()
+    if data[:4] == b"RIFF" and data[8:12] == b"WAVE":
+        return _wav_info(data)
+    return _mp3_info(data)
+
+
+def audio_duration(path: str) -> float:
+    return audio_info(path).duration
+
+
+def _wav_info(data: bytes) -> AudioInfo:
+    pos = 12
+    channels = sample_rate = byte_rate = None
+    while pos + 8 <= len(data):
+        chunk_id, size = struct.unpack_from("<4sI", data, pos)
+        if chunk_id == b"fmt ":
+            channels, sample_rate, byte_rate = struct.unpack_from("<HII", data, pos + 10)
+        elif chunk_id == b"data" and byte_rate:
+            size = min(size, len(data) - pos - 8)  # streamed WAVs may leave the size unset
+            return AudioInfo(size / byte_rate, sample_rate, channels)
+        pos += 8 + size + (size & 1)
+    raise ValueError("WAV file without a fmt and data chunk")
+
+
+def _parse_frame(data: bytes, pos: int) -> Optional[_Frame]:
+    if pos + 4 > len(data):
+        return None
+    header = struct.unpack_from(">I", data, pos)[0]
+    if header >> 21 != 0x7FF:
+        return None
+    version = (header >> 19) & 0b11
+    layer = 4 - ((header >> 17) & 0b11)
+    bitrate_index = (header >> 12) & 0b1111
+    sample_rate_index = (header >> 10) & 0b11
+    if version == 1 or layer == 4 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+
+    mpeg1 = version == 3
+    bitrate = _BITRATES[mpeg1][layer][bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[version][sample_rate_index]
+    padding = (header >> 9) & 1
+    channels = 1 if (header >> 6) & 0b11 == 0b11 else 2
+
+    if layer == 1:
+        return _Frame((12 * bitrate // sample_rate + padding) * 4, 384, sample_rate, channels, mpeg1)
+    if layer == 3 and not mpeg1:
+        return _Frame(72 * bitrate // sample_rate + padding, 576, sample_rate, channels, mpeg1)
+    return _Frame(144 * bitrate // sample_rate + padding, 1152, sample_rate, channels, mpeg1)
+
+
+def _mp3_info(data: bytes) -> AudioInfo:
+    pos = 0
+    if data[:3] == b"ID3":
+        size = 0
+        for byte in data[6:10]:  # syncsafe integer
+            size = (size << 7) | (byte & 0x7F)
+        pos = 10 + size + (10 if data[5] & 0x10 else 0)
+
+    # find the first frame whose successor is a frame as well, to skip over garbage
+    first = None
+    while pos < len(data) - 4:
+        first = _parse_frame(data, pos)
+        if first is not None and (
+            pos + first.length >= len(data) or _parse_frame(data, pos + first.length) is not None
+        ):
+            break
+        first = None
+        pos += 1
+    if first is None:
+        raise ValueError("No MPEG audio frames found")
+
+    # a Xing/Info or VBRI header in the first frame stores the frame count directly
+    side_info = (
+        (32 if first.channels == 2 else 17) if first.mpeg1 else (17 if first.channels == 2 else 9)
+    )
+    for offset, tag in ((4 + side_info, (b"Xing", b"Info")), (36, (b"VBRI",))):
+        if data[pos + offset : pos + offset + 4] in tag:
+            if tag[0] == b"VBRI":
+                frames = struct.unpack_from(">I", data, pos + offset + 14)[0]
+            elif struct.unpack_from(">I", data, pos + offset + 4)[0] & 1:
+                frames = struct.unpack_from(">I", data, pos + offset + 8)[0]
+            else:
+                break
+            return AudioInfo(
+                frames * first.samples / first.sample_rate, first.sample_rate, first.channels
+            )
+
+    # otherwise walk the frame headers, this reads a few bytes per frame and decodes nothing
+    samples = 0
+    frame = first
+    while frame is not None:
+        samples += frame.samples
+        pos += frame.length
+        frame = _parse_frame(data, pos)
+    return AudioInfo(samples / first.sample_rate, first.sample_rate, first.channels)
+
+
+def read_duration_manifest(folder: str) -> Dict[str, float]:
+    """Returns the clip durations recorded by the TTS stage, keyed by file name without extension."""
+    try:
+        with open(f"{folder}/{MANIFEST_NAME}", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def write_duration_manifest(folder: str, durations: Dict[str, float]):
+    with open(f"{folder}/{MANIFEST_NAME}", "w", encoding="utf-8") as f:
+        json.dump(durations, f, indent=4)
+
+
+def clip_duration(folder: str, name: str, manifest: Optional[Dict[str, float]] = None) -> float:
+    """Duration of `{folder}/{name}.mp3`, from the manifest when it is listed there.
+
+    Clips missing from the manifest are measured from their headers instead.
+    """
+    if manifest is None:
+        manifest = read_duration_manifest(folder)
+    if name in manifest:
+        return float(manifest[name])
+    return audio_duration(f"{folder}/{name}.mp3")
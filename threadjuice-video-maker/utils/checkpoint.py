@@ -0,0 +1,142 @@
+import hashlib
+import json
+import os
+import re
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Optional, Union
+
+from utils.console import print_substep
+
+__all__ = ["JobManifest", "digest", "remember_job", "last_job", "forget_job"]
+
+TEMP_ROOT: str = "assets/temp"
+MANIFEST: str = "manifest.json"
+LAST_JOB: str = "last_job.json"
+
+
+def _fingerprint(value: Any) -> Any:
+    """Replaces the paths in a value by their size and modification time, recursively"""
+    if isinstance(value, Path):
+        if value.is_dir():
+            return sorted(
+                (str(path.relative_to(value)), _fingerprint(path))
+                for path in value.rglob("*")
+                if path.is_file()
+            )
+        if value.is_file():
+            stat = value.stat()
+            return [str(value), stat.st_size, stat.st_mtime_ns]
+        return [str(value), None]
+    if isinstance(value, dict):
+        return {str(key): _fingerprint(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_fingerprint(item) for item in value]
+    return value
+
+
+def digest(value: Any) -> str:
+    """Hash of the inputs of a stage. Anything JSON can hold, files and folders given as Path
+    are hashed by their size and modification time rather than read in full."""
+    encoded = json.dumps(_fingerprint(value), sort_keys=True, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class JobManifest:
+    """Records the completed stages of one video in `assets/temp/{id}/manifest.json`.
+
+    Each stage is stored with a hash of its inputs, the files it wrote and its return value.
+    When resuming, a stage whose inputs hash the same and whose outputs are all still there is
+    skipped and its recorded return value is used instead, so a failed render only costs the
+    render when it is run again. Without resume every stage runs and the manifest starts over.
+
+    Args:
+        job_id : The thread id of the video.
+        resume : Whether completed stages are skipped.
+        root : The folder holding the temporary files of every job.
+    """
+
+    def __init__(self, job_id: str, resume: bool = False, root: str = TEMP_ROOT):
+        self.job_id = re.sub(r"[^\w\s-]", "", job_id)
+        self.folder = Path(root) / self.job_id
+        self.path = self.folder / MANIFEST
+        self.resume = resume
+        self.stages: Dict[str, dict] = self._load() if resume else {}
+
+    def _load(self) -> Dict[str, dict]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)["stages"]
+        except (OSError, ValueError, KeyError):
+            return {}
+
+    def _save(self):
+        self.folder.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"job": self.job_id, "stages": self.stages}, f, indent=4)
+        os.replace(tmp, self.path)  # a crash mid-write must not lose the earlier stages
+
+    def is_done(self, stage: str, inputs: Any) -> bool:
+        entry = self.stages.get(stage)
+        return (
+            self.resume
+            and entry is not None
+            and entry["inputs"] == digest(inputs)
+            and all(Path(path).exists() for path in entry["outputs"])
+        )
+
+    def result(self, stage: str) -> Any:
+        return self.stages[stage]["result"]
+
+    def record(self, stage: str, inputs: Any, outputs: Iterable[str] = (), result: Any = None):
+        self.stages[stage] = {
+            "inputs": digest(inputs),
+            "outputs": [str(path) for path in outputs],
+            "result": result,
+            "finished": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        self._save()
+
+    def run(
+        self,
+        stage: str,
+        inputs: Any,
+        function: Callable[[], Any],
+        outputs: Union[Iterable[str], Callable[[Any], Iterable[str]]] = (),
+    ) -> Any:
+        """Runs `function` for the stage, unless it already completed with the same inputs.
+
+        `outputs` may also be a function of the result, for stages that only know where their
+        files went once they are done.
+
+        Returns:
+            Any: What `function` returned, or what it returned the last time. Tuples come back
+            as lists when they are read from the manifest.
+        """
+        if self.is_done(stage, inputs):
+            print_substep(f"Resuming: the {stage} stage is already done, skipping it.")
+            return self.result(stage)
+        result = function()
+        self.record(stage, inputs, outputs(result) if callable(outputs) else outputs, result)
+        return result
+
+
+def remember_job(job_id: str, root: str = TEMP_ROOT):
+    """Notes the job in progress, for `--resume` without a post id"""
+    Path(root).mkdir(parents=True, exist_ok=True)
+    with open(Path(root) / LAST_JOB, "w", encoding="utf-8") as f:
+        json.dump({"job": job_id}, f)
+
+
+def last_job(root: str = TEMP_ROOT) -> Optional[str]:
+    try:
+        with open(Path(root) / LAST_JOB, "r", encoding="utf-8") as f:
+            return json.load(f)["job"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def forget_job(root: str = TEMP_ROOT):
+    """Called once a video is done, there is nothing left to resume"""
+    Path(root, LAST_JOB).unlink(missing_ok=True)
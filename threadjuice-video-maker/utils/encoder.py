@@ -0,0 +1,212 @@
+"""Encoder profiles for the final render, and an autotuner that calibrates one for this machine.
+
+Usage:
+    python -m utils.encoder autotune [--seconds 10] [--target-mb 25] [--min-ssim 0.97]
+"""
+
+import argparse
+import json
+import os
+import platform
+import re
+import tempfile
+import time
+from dataclasses import asdict, dataclass, replace
+from typing import Dict, List, Optional
+
+import ffmpeg
+
+from utils import settings
+
+__all__ = ["EncoderProfile", "PROFILES", "get_profile", "autotune"]
+
+AUTOTUNE_PATH: str = "video_creation/data/encoder_autotune.json"
+DEFAULT_PROFILE: str = "social"
+
+
+@dataclass(frozen=True)
+class EncoderProfile:
+    """How the final video is encoded.
+
+    Args:
+        name : Name of the profile, as used in the `encoder_profile` setting.
+        preset : The x264 preset, trading encode speed for file size.
+        crf : Constant rate factor, lower is better quality and bigger files.
+        maxrate : Optional VBV cap of the bitrate, for platforms with upload limits.
+        bufsize : VBV buffer size, only used with maxrate.
+        fps : Output frame rate, None keeps the rate of the background.
+        threads : Encoder threads, 0 lets ffmpeg pick from the core count.
+    """
+
+    name: str
+    preset: str = "medium"
+    crf: int = 23
+    maxrate: Optional[str] = None
+    bufsize: Optional[str] = None
+    fps: Optional[int] = None
+    threads: int = 0
+    codec: str = "libx264"
+
+    def output_args(self) -> Dict[str, object]:
+        """The video encoder arguments of ffmpeg.output"""
+        args = {
+            "c:v": self.codec,
+            "preset": self.preset,
+            "crf": self.crf,
+            "pix_fmt": "yuv420p",
+            "threads": self.threads,
+        }
+        if self.maxrate:
+            args["maxrate"] = self.maxrate
+            args["bufsize"] = self.bufsize or self.maxrate
+        if self.fps:
+            args["r"] = self.fps
+        return args
+
+
+PROFILES: Dict[str, EncoderProfile] = {
+    # fast to render, good enough to check the timing and the layout
+    "draft": EncoderProfile("draft", preset="ultrafast", crf=30, fps=30),
+    # what TikTok, Shorts and Reels re-encode anyway, capped for their upload limits
+    "social": EncoderProfile(
+        "social", preset="veryfast", crf=23, maxrate="8M", bufsize="16M", fps=30
+    ),
+    # a master copy to re-edit later
+    "archive": EncoderProfile("archive", preset="slow", crf=18),
+    # editorial previews, see make_final_video, not meant to be published
+    "preview": EncoderProfile("preview", preset="ultrafast", crf=32, fps=15),
+}
+
+
+def load_autotuned(path: Optional[str] = None) -> Optional[EncoderProfile]:
+    try:
+        with open(path or AUTOTUNE_PATH, "r", encoding="utf-8") as f:
+            return EncoderProfile(**json.load(f)["profile"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def get_profile(name: Optional[str] = None) -> EncoderProfile:
+    """Returns the encoder profile named in the config, `autotune` being the calibrated one"""
+    if name is None:
+        name = settings.config["settings"].get("encoder_profile", DEFAULT_PROFILE)
+    if name == "autotune":
+        profile = load_autotuned()
+        if profile is not None:
+            return profile
+        print(f"No encoder calibration found, using the {DEFAULT_PROFILE} profile.")
+        print("Run `python -m utils.encoder autotune` to calibrate one for this machine.")
+        name = DEFAULT_PROFILE
+    return PROFILES.get(name, PROFILES[DEFAULT_PROFILE])
+
+
+def candidates() -> List[EncoderProfile]:
+    """The settings the autotuner tries, from the fastest to the slowest preset"""
+    social = PROFILES["social"]
+    return [
+        replace(social, name="autotune", preset=preset, crf=crf)
+        for preset in ("ultrafast", "superfast", "veryfast", "faster", "fast", "medium")
+        for crf in (20, 23, 26)
+    ]
+
+
+def parse_ssim(stderr: str) -> float:
+    """The overall SSIM from the output of ffmpeg's ssim filter"""
+    matches = re.findall(r"All:(\d+(?:\.\d+)?)", stderr)
+    if not matches:
+        raise ValueError("No SSIM in the ffmpeg output")
+    return float(matches[-1])
+
+
+def pick_fastest(results: List[dict], max_mb: float, min_ssim: float) -> Optional[dict]:
+    """The fastest result small enough and good enough, None if nothing qualifies"""
+    passing = [r for r in results if r["mb_per_minute"] <= max_mb and r["ssim"] >= min_ssim]
+    return min(passing, key=lambda r: r["seconds"], default=None)
+
+
+def synthetic_source(width: int, height: int, seconds: float):
+    # moving test pattern with noise, closer to gameplay footage than a still frame
+    return ffmpeg.input(
+        f"testsrc2=size={width}x{height}:rate=30:duration={seconds}", f="lavfi"
+    ).filter("noise", alls=12, allf="t")
+
+
+def measure(profile: EncoderProfile, source: str, seconds: float, workdir: str) -> dict:
+    """Encodes the reference clip with the profile, timing it and scoring it against the clip"""
+    output = os.path.join(workdir, f"{profile.preset}-{profile.crf}.mp4")
+    start = time.perf_counter()
+    ffmpeg.input(source).output(output, an=None, **profile.output_args()).overwrite_output().run(
+        quiet=True
+    )
+    elapsed = time.perf_counter() - start
+    _, stderr = (
+        ffmpeg.filter([ffmpeg.input(output), ffmpeg.input(source)], "ssim")
+        .output("-", f="null")
+        .run(capture_stdout=True, capture_stderr=True)
+    )
+    return {
+        "preset": profile.preset,
+        "crf": profile.crf,
+        "seconds": round(elapsed, 3),
+        "mb_per_minute": round(os.path.getsize(output) / 1e6 * 60 / seconds, 2),
+        "ssim": round(parse_ssim(stderr.decode("utf8")), 4),
+    }
+
+
+def autotune(
+    width: int = 1080,
+    height: int = 1920,
+    seconds: float = 10,
+    target_mb: float = 25,
+    min_ssim: float = 0.97,
+    path: Optional[str] = None,
+) -> Optional[EncoderProfile]:
+    """Renders a synthetic clip with every candidate and saves the fastest that meets the size
+    target (per minute of video) and the quality floor, as the `autotune` profile of this host"""
+    with tempfile.TemporaryDirectory(prefix="encoder-autotune-") as workdir:
+        # a lossless reference, so every candidate is scored against the same frames
+        source = os.path.join(workdir, "reference.mkv")
+        synthetic_source(width, height, seconds).output(
+            source, **{"c:v": "ffv1"}
+        ).overwrite_output().run(quiet=True)
+        results = []
+        for profile in candidates():
+            results.append(measure(profile, source, seconds, workdir))
+            print(json.dumps(results[-1]))
+
+    best = pick_fastest(results, target_mb, min_ssim)
+    if best is None:
+        print("No candidate met the size and quality targets, nothing was saved.")
+        return None
+    profile = replace(PROFILES["social"], name="autotune", preset=best["preset"], crf=best["crf"])
+    path = path or AUTOTUNE_PATH
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "host": platform.node(),
+                "cpu_count": os.cpu_count(),
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "resolution": [width, height],
+                "target_mb_per_minute": target_mb,
+                "min_ssim": min_ssim,
+                "profile": asdict(profile),
+                "results": results,
+            },
+            f,
+            indent=4,
+        )
+    print(f"Saved the {profile.preset} preset at crf {profile.crf} to {path}")
+    return profile
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Encoder profiles of the final render")
+    commands = parser.add_subparsers(dest="command", required=True)
+    tune = commands.add_parser("autotune", help="Calibrate the fastest good profile on this host")
+    tune.add_argument("--width", type=int, default=1080)
+    tune.add_argument("--height", type=int, default=1920)
+    tune.add_argument("--seconds", type=float, default=10, help="Length of the synthetic clip")
+    tune.add_argument("--target-mb", type=float, default=25, help="Max size per minute of video")
+    tune.add_argument("--min-ssim", type=float, default=0.97, help="Min quality, 1 is lossless")
+    args = parser.parse_args()
+    autotune(args.width, args.height, args.seconds, args.target_mb, args.min_ssim)
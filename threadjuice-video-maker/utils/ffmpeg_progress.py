@@ -0,0 +1,185 @@
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional
+
+import ffmpeg
+
+__all__ = ["ProgressEvent", "ProgressParser", "FfmpegProgress", "subscribe_all", "unsubscribe_all"]
+
+Subscriber = Callable[["ProgressEvent"], None]
+
+
+@dataclass(frozen=True)
+class ProgressEvent:
+    """One report of `ffmpeg -progress`, sent about twice a second and once at the end.
+
+    Values ffmpeg reports as N/A are None. `raw` holds every key as ffmpeg wrote it.
+    """
+
+    job: str
+    duration: float
+    frame: int = 0
+    fps: float = 0.0
+    bitrate_kbps: Optional[float] = None
+    total_size: Optional[int] = None
+    out_time: float = 0.0  # seconds of output written
+    speed: Optional[float] = None  # seconds of output per second of wall time
+    dup_frames: int = 0
+    drop_frames: int = 0
+    done: bool = False
+    wall_time: float = 0.0  # seconds since ffmpeg started
+    raw: Dict[str, str] = field(default_factory=dict, compare=False)
+
+    @property
+    def fraction(self) -> float:
+        """How much of the output is written, between 0 and 1"""
+        if self.done:
+            return 1.0
+        if self.duration <= 0:
+            return 0.0
+        return min(1.0, self.out_time / self.duration)
+
+    @property
+    def eta(self) -> Optional[float]:
+        """Seconds of wall time left at the current speed"""
+        if not self.speed:
+            return None
+        return max(0.0, self.duration - self.out_time) / self.speed
+
+
+def _number(value: Optional[str], kind=float, suffix: str = ""):
+    if value is None:
+        return None
+    value = value.strip()
+    if suffix and value.endswith(suffix):
+        value = value[: -len(suffix)]
+    try:
+        return kind(value)
+    except ValueError:
+        return None  # N/A
+
+
+class ProgressParser:
+    """Turns the `key=value` lines of `ffmpeg -progress` into ProgressEvents.
+
+    ffmpeg writes one block of keys per report, closed by a `progress=continue` line, or
+    `progress=end` on the last one.
+    """
+
+    def __init__(self, job: str, duration: float, started: Optional[float] = None):
+        self.job = job
+        self.duration = duration
+        self.started = time.monotonic() if started is None else started
+        self._block: Dict[str, str] = {}
+
+    def feed(self, line: str) -> Optional[ProgressEvent]:
+        """Takes one line, returns the event it completes, if it does."""
+        key, sep, value = line.strip().partition("=")
+        if not sep:
+            return None
+        self._block[key] = value.strip()
+        if key != "progress":
+            return None
+        block, self._block = self._block, {}
+        out_time_us = _number(block.get("out_time_us") or block.get("out_time_ms"), int)
+        return ProgressEvent(
+            job=self.job,
+            duration=self.duration,
+            frame=_number(block.get("frame"), int) or 0,
+            fps=_number(block.get("fps")) or 0.0,
+            bitrate_kbps=_number(block.get("bitrate"), suffix="kbits/s"),
+            total_size=_number(block.get("total_size"), int),
+            # out_time_ms is in microseconds too, despite its name
+            out_time=max(0, out_time_us or 0) / 1_000_000,
+            speed=_number(block.get("speed"), suffix="x"),
+            dup_frames=_number(block.get("dup_frames"), int) or 0,
+            drop_frames=_number(block.get("drop_frames"), int) or 0,
+            done=value.strip() == "end",
+            wall_time=time.monotonic() - self.started,
+            raw=block,
+        )
+
+
+_global_subscribers: List[Subscriber] = []
+_global_lock = threading.Lock()
+
+
+def subscribe_all(callback: Subscriber) -> Subscriber:
+    """Sends the events of every ffmpeg job of this process to `callback`, for dashboards and
+    metrics. Exceptions raised by the callback are printed and otherwise ignored."""
+    with _global_lock:
+        _global_subscribers.append(callback)
+    return callback
+
+
+def unsubscribe_all(callback: Subscriber):
+    with _global_lock:
+        if callback in _global_subscribers:
+            _global_subscribers.remove(callback)
+
+
+class FfmpegProgress:
+    """Runs an ffmpeg command and streams its progress, through a pipe instead of a temp file.
+
+    Iterate over it to get the ProgressEvents as they come, or call run() to just wait for the
+    end while the subscribers get them. Either way a failed ffmpeg raises ffmpeg.Error, with
+    its stderr.
+
+    Args:
+        output : The ffmpeg-python output to run.
+        duration : Expected length of the output in seconds, for the completed fraction.
+        job : A name for the job, passed on in every event.
+    """
+
+    def __init__(self, output: ffmpeg.nodes.OutputStream, duration: float, job: str = "ffmpeg"):
+        self.output = output
+        self.duration = duration
+        self.job = job
+        self.last: Optional[ProgressEvent] = None
+        self._subscribers: List[Subscriber] = []
+
+    def subscribe(self, callback: Subscriber) -> "FfmpegProgress":
+        self._subscribers.append(callback)
+        return self
+
+    def publish(self, event: ProgressEvent):
+        self.last = event
+        with _global_lock:
+            subscribers = self._subscribers + _global_subscribers
+        for callback in subscribers:
+            try:
+                callback(event)
+            except Exception as e:
+                print(f"Progress subscriber failed: {e}")
+
+    def __iter__(self) -> Iterator[ProgressEvent]:
+        process = (
+            self.output.global_args("-progress", "pipe:1", "-nostats")
+            .overwrite_output()
+            .run_async(pipe_stdout=True, pipe_stderr=True)
+        )
+        # stderr is drained on the side, a full pipe would block ffmpeg
+        stderr: List[bytes] = []
+        drain = threading.Thread(target=lambda: stderr.append(process.stderr.read()), daemon=True)
+        drain.start()
+        parser = ProgressParser(self.job, self.duration)
+        try:
+            for line in process.stdout:
+                event = parser.feed(line.decode("utf8", errors="replace"))
+                if event is not None:
+                    self.publish(event)
+                    yield event
+        finally:
+            if process.poll() is None and not process.stdout.closed:
+                process.stdout.read()  # stopped early, let ffmpeg finish writing
+            process.wait()
+            drain.join()
+        if process.returncode != 0:
+            raise ffmpeg.Error("ffmpeg", None, b"".join(stderr))
+
+    def run(self) -> Optional[ProgressEvent]:
+        """Runs ffmpeg to the end, returns the last event."""
+        for _ in self:
+            pass
+        return self.last
@@ -0,0 +1,100 @@
+import os
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, NamedTuple, Optional
+
+import ffmpeg
+import numpy as np
+
+from utils.audio import clip_duration, read_duration_manifest
+
+__all__ = ["TimelineClip", "AudioTimeline"]
+
+DEFAULT_SAMPLE_RATE: int = 44100
+
+
+class TimelineClip(NamedTuple):
+    name: str
+    path: str
+    start: float
+    end: float
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+
+class AudioTimeline:
+    """Lays the TTS clips of a video out back to back in a single PCM buffer.
+
+    Every clip is decoded exactly once, straight to 16 bit PCM at a common sample rate, and
+    copied into its slot of one preallocated buffer. The slots are sized from the duration
+    manifest of the TTS stage, and the overlays of the final video use the very same offsets,
+    so the screenshots can not drift away from the voice. The buffer is written out as a WAV
+    and the final render encodes it once, instead of going through an intermediate MP3.
+
+    Args:
+        folder : The folder holding the clips and their duration manifest.
+        sample_rate : The sample rate every clip is resampled to.
+        channels : The channel count every clip is mixed to.
+    """
+
+    def __init__(self, folder: str, sample_rate: int = DEFAULT_SAMPLE_RATE, channels: int = 1):
+        self.folder = folder
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.clips: List[TimelineClip] = []
+        self._durations = read_duration_manifest(folder)
+        self._end = 0  # in samples, so offsets never accumulate rounding errors
+
+    def add(self, name: str, gap: float = 0.0) -> TimelineClip:
+        """Appends `{folder}/{name}.mp3`, followed by `gap` seconds of silence."""
+        samples = round(clip_duration(self.folder, name, self._durations) * self.sample_rate)
+        start = self._end
+        clip = TimelineClip(
+            name,
+            f"{self.folder}/{name}.mp3",
+            start / self.sample_rate,
+            (start + samples) / self.sample_rate,
+        )
+        self.clips.append(clip)
+        self._end = start + samples + round(gap * self.sample_rate)
+        return clip
+
+    @property
+    def duration(self) -> float:
+        return self._end / self.sample_rate
+
+    def decode(self, path: str) -> np.ndarray:
+        out, _ = (
+            ffmpeg.input(path)
+            .output(
+                "pipe:", format="s16le", acodec="pcm_s16le", ac=self.channels, ar=self.sample_rate
+            )
+            .run(capture_stdout=True, capture_stderr=True)
+        )
+        return np.frombuffer(out, dtype=np.int16).reshape(-1, self.channels)
+
+    def render(self) -> np.ndarray:
+        """Decodes every clip into its slot and returns the whole timeline as int16 samples."""
+        buffer = np.zeros((self._end, self.channels), dtype=np.int16)
+        with ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1)) as pool:
+            for clip, pcm in zip(self.clips, pool.map(self.decode, [c.path for c in self.clips])):
+                start = round(clip.start * self.sample_rate)
+                end = round(clip.end * self.sample_rate)
+                # decoders pad or trim a few samples, the slot size from the manifest wins
+                length = min(len(pcm), end - start)
+                buffer[start : start + length] = pcm[:length]
+        return buffer
+
+    def write_wav(self, path: str, buffer: Optional[np.ndarray] = None) -> str:
+        if buffer is None:
+            buffer = self.render()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with wave.open(path, "wb") as f:
+            f.setnchannels(self.channels)
+            f.setsampwidth(2)
+            f.setframerate(self.sample_rate)
+            f.writeframes(buffer.astype("<i2").tobytes())
+        return path
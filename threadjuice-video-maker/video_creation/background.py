@@ -6,11 +6,15 @@ from random import randrange
 from typing import Any, Dict, Tuple
 
 import yt_dlp
-from moviepy.editor import AudioFileClip, VideoFileClip
-from moviepy.video.io.ffmpeg_tools import ffmpeg_extract_subclip
 
 from utils import settings
 from utils.console import print_step, print_substep
+from video_creation.background_cache import (
+    cached_background,
+    keyframe_window,
+    media_duration,
+)
+from video_creation.background_segments import VIDEO_FORMAT, prefetch, segment_window
 
 
 def load_background_options():
@@ -73,20 +77,41 @@ def get_background_config(mode: str):
     return background_options[mode][choice]
 
 
+def fetches_segments() -> bool:
+    return settings.config["settings"]["background"].get("background_fetch", "full") == "segments"
+
+
 def download_background_video(background_config: Tuple[str, str, str, Any]):
-    """Downloads the background/s video from YouTube."""
+    """Downloads the background/s video from YouTube. When only segments are fetched, the full
+    download runs on the side if background_prefetch is on, and the video does not wait for it."""
     Path("./assets/backgrounds/video/").mkdir(parents=True, exist_ok=True)
     # note: make sure the file name doesn't include an - in it
     uri, filename, credit, _ = background_config
     if Path(f"assets/backgrounds/video/{credit}-{filename}").is_file():
         return
+    if fetches_segments():
+        if settings.config["settings"]["background"].get("background_prefetch", True):
+            print_substep(f"Downloading {filename} in the background for the next videos.")
+            prefetch(
+                f"{credit}-{filename}",
+                lambda: yt_dlp.YoutubeDL(
+                    {
+                        "format": VIDEO_FORMAT,
+                        "outtmpl": f"assets/backgrounds/video/{credit}-{filename}",
+                        "retries": 10,
+                        "quiet": True,
+                        "noprogress": True,
+                    }
+                ).download(uri),
+            )
+        return
     print_step(
         "We need to download the backgrounds videos. they are fairly large but it's only done once. 😎"
     )
     print_substep("Downloading the backgrounds videos... please be patient 🙏 ")
     print_substep(f"Downloading {filename} from {uri}")
     ydl_opts = {
-        "format": "bestvideo[height<=1080][ext=mp4]",
+        "format": VIDEO_FORMAT,
         "outtmpl": f"assets/backgrounds/video/{credit}-{filename}",
         "retries": 10,
     }
@@ -121,45 +146,56 @@ def download_background_audio(background_config: Tuple[str, str, str]):
 
 
 def chop_background(background_config: Dict[str, Tuple], video_length: int, reddit_object: dict):
-    """Generates the background audio and footage to be used in the video and writes it to assets/temp/background.mp3 and assets/temp/background.mp4
+    """Picks the spots in the backgrounds to use in the video. The windows are recorded in assets/temp/{id}/background.json
+    and cut out by the render graph of make_final_video, nothing is decoded here
 
     Args:
         background_config (Dict[str,Tuple]]) : Current background configuration
         video_length (int): Length of the clip where the background footage is to be taken out of
     """
     id = re.sub(r"[^\w\s-]", "", reddit_object["thread_id"])
+    window = {}
 
     if settings.config["settings"]["background"][f"background_audio_volume"] == 0:
         print_step("Volume was set to 0. Skipping background audio creation . . .")
     else:
         print_step("Finding a spot in the backgrounds audio to chop...✂️")
         audio_choice = f"{background_config['audio'][2]}-{background_config['audio'][1]}"
-        background_audio = AudioFileClip(f"assets/backgrounds/audio/{audio_choice}")
+        audio_source = f"assets/backgrounds/audio/{audio_choice}"
         start_time_audio, end_time_audio = get_start_and_end_times(
-            video_length, background_audio.duration
+            video_length, media_duration(audio_source)
         )
-        background_audio = background_audio.subclip(start_time_audio, end_time_audio)
-        background_audio.write_audiofile(f"assets/temp/{id}/background.mp3")
+        window["audio"] = {"path": audio_source, "start": start_time_audio, "end": end_time_audio}
 
     print_step("Finding a spot in the backgrounds video to chop...✂️")
     video_choice = f"{background_config['video'][2]}-{background_config['video'][1]}"
-    background_video = VideoFileClip(f"assets/backgrounds/video/{video_choice}")
-    start_time_video, end_time_video = get_start_and_end_times(
-        video_length, background_video.duration
-    )
-    # Extract video subclip
-    try:
-        ffmpeg_extract_subclip(
-            f"assets/backgrounds/video/{video_choice}",
-            start_time_video,
-            end_time_video,
-            targetname=f"assets/temp/{id}/background.mp4",
+    source = f"assets/backgrounds/video/{video_choice}"
+    if fetches_segments() and not Path(source).is_file():
+        # The full download is not there yet, only the part around the window is fetched
+        chunk, start_time_video, end_time_video = segment_window(
+            background_config["video"], video_length, get_start_and_end_times
+        )
+        video = {"path": chunk}
+    elif settings.config["settings"]["background"].get("background_cache", True):
+        # Cropped and scaled once per resolution, the window starts on one of its keyframes
+        cached = cached_background(
+            source,
+            int(settings.config["settings"]["resolution_w"]),
+            int(settings.config["settings"]["resolution_h"]),
+        )
+        start_time_video, end_time_video = keyframe_window(
+            cached["keyframes"], cached["duration"], video_length
+        )
+        video = {"path": cached["path"], "width": cached["width"], "height": cached["height"]}
+    else:
+        start_time_video, end_time_video = get_start_and_end_times(
+            video_length, media_duration(source)
         )
-    except (OSError, IOError):  # ffmpeg issue see #348
-        print_substep("FFMPEG issue. Trying again...")
-        with VideoFileClip(f"assets/backgrounds/video/{video_choice}") as video:
-            new = video.subclip(start_time_video, end_time_video)
-            new.write_videofile(f"assets/temp/{id}/background.mp4")
+        video = {"path": source}
+    # The cut happens in the same ffmpeg pass as the rest of the video, saving an encode
+    window["video"] = {**video, "start": start_time_video, "end": end_time_video}
+    with open(f"assets/temp/{id}/background.json", "w") as f:
+        json.dump(window, f)
     print_substep("Background video chopped successfully!", style="bold green")
     return background_config["video"][2]
 
@@ -0,0 +1,202 @@
+"""Background videos transcoded once per resolution, with their keyframes indexed.
+
+Usage:
+    python -m video_creation.background_cache warm [--width 1080] [--height 1920]
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import ffmpeg
+
+from utils.console import print_substep
+from utils.encoder import EncoderProfile
+from utils.ffmpeg_progress import FfmpegProgress
+
+__all__ = ["cache_paths", "cached_background", "keyframe_window", "media_duration", "warm"]
+
+CACHE_ROOT: str = "assets/backgrounds/cache"
+DURATIONS: str = "durations.json"
+KEYFRAME_INTERVAL: int = 2  # seconds, how far a window start may be from any time picked
+# the cache is encoded again by every render, so it is kept close to the source
+CACHE_PROFILE = EncoderProfile("background_cache", preset="veryfast", crf=18, fps=30)
+
+
+def cache_paths(source: str, width: int, height: int, root: str = CACHE_ROOT) -> Tuple[Path, Path]:
+    """The cached video and its metadata, `{root}/{width}x{height}/{name}.mp4` and `.json`"""
+    folder = Path(root) / f"{width}x{height}"
+    stem = Path(source).stem
+    return folder / f"{stem}.mp4", folder / f"{stem}.json"
+
+
+def _source_stat(source: str) -> List[int]:
+    stat = os.stat(source)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def load_metadata(source: str, width: int, height: int, root: str = CACHE_ROOT) -> Optional[dict]:
+    """The metadata of the cached video, None if there is none or the source changed since"""
+    video, metadata = cache_paths(source, width, height, root)
+    try:
+        with open(metadata, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not video.is_file() or data.get("source_stat") != _source_stat(source):
+        return None
+    return data
+
+
+def parse_keyframes(packets: List[dict]) -> List[float]:
+    """The keyframe times among the packets listed by ffprobe"""
+    return sorted(
+        float(packet["pts_time"])
+        for packet in packets
+        if "K" in packet.get("flags", "") and packet.get("pts_time") not in (None, "N/A")
+    )
+
+
+def probe_keyframes(path: str) -> Tuple[float, List[float]]:
+    """The duration and keyframe times of a video. Only the packet headers are read, no frame is
+    decoded."""
+    result = subprocess.run(
+        [
+            "ffprobe",
+            "-v",
+            "error",
+            "-select_streams",
+            "v:0",
+            "-show_entries",
+            "packet=pts_time,flags:format=duration",
+            "-of",
+            "json",
+            path,
+        ],
+        capture_output=True,
+        check=True,
+    )
+    info = json.loads(result.stdout)
+    return float(info["format"]["duration"]), parse_keyframes(info.get("packets", []))
+
+
+def probe_duration(path: str) -> float:
+    """The duration of a media file, read from its header"""
+    return float(ffmpeg.probe(path)["format"]["duration"])
+
+
+def media_duration(path: str, root: str = CACHE_ROOT) -> float:
+    """The duration of a background, probed once and then read from `{root}/durations.json`"""
+    durations_path = Path(root) / DURATIONS
+    try:
+        with open(durations_path, "r", encoding="utf-8") as f:
+            durations = json.load(f)
+    except (OSError, ValueError):
+        durations = {}
+    stat = _source_stat(path)
+    known = durations.get(str(path))
+    if known is not None and known["source_stat"] == stat:
+        return known["duration"]
+    duration = probe_duration(path)
+    durations[str(path)] = {"source_stat": stat, "duration": duration}
+    durations_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = durations_path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(durations, f, indent=4)
+    os.replace(tmp, durations_path)
+    return duration
+
+
+def build(source: str, width: int, height: int, root: str = CACHE_ROOT) -> dict:
+    """Crops and scales the source to the video size, with a keyframe every KEYFRAME_INTERVAL
+    seconds, and writes it to the cache with its metadata."""
+    video, metadata = cache_paths(source, width, height, root)
+    video.parent.mkdir(parents=True, exist_ok=True)
+    stat = _source_stat(source)
+    partial = video.with_suffix(".part.mp4")
+    print_substep(f"Caching {source} at {width}x{height}, this is only done once...")
+    output = (
+        ffmpeg.input(source)
+        .video.filter("crop", f"ih*({width}/{height})", "ih")
+        .filter("scale", width, height)
+        .output(
+            str(partial),
+            an=None,
+            f="mp4",
+            force_key_frames=f"expr:gte(t,n_forced*{KEYFRAME_INTERVAL})",
+            movflags="+faststart",
+            **CACHE_PROFILE.output_args(),
+        )
+    )
+    FfmpegProgress(output, probe_duration(source), job="background_cache").run()
+    os.replace(partial, video)
+
+    duration, keyframes = probe_keyframes(str(video))
+    data = {
+        "source": str(source),
+        "source_stat": stat,
+        "width": width,
+        "height": height,
+        "duration": duration,
+        "keyframe_interval": KEYFRAME_INTERVAL,
+        "keyframes": keyframes,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    tmp = metadata.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp, metadata)
+    return data
+
+
+def cached_background(source: str, width: int, height: int, root: str = CACHE_ROOT) -> dict:
+    """The metadata of the source cached at this size, transcoding it first if needed.
+
+    Returns:
+        dict: with the `path` of the cached video, its `duration` and its `keyframes`.
+    """
+    data = load_metadata(source, width, height, root) or build(source, width, height, root)
+    return {**data, "path": str(cache_paths(source, width, height, root)[0])}
+
+
+def keyframe_window(
+    keyframes: List[float], duration: float, length: float, rng: random.Random = random
+) -> Tuple[float, float]:
+    """A random window of `length` seconds starting on a keyframe, so it can be seeked into
+    exactly or cut with a stream copy. The first minutes are skipped when the video is long
+    enough, like get_start_and_end_times does, they are often menus and intros.
+    """
+    starts = [keyframe for keyframe in keyframes if keyframe + length <= duration]
+    if not starts:
+        raise Exception("Your background is too short for this video length")
+    intro = 180
+    while intro and not any(start >= intro for start in starts):
+        intro //= 2
+    start = rng.choice([start for start in starts if start >= intro])
+    return start, start + length
+
+
+def warm(width: int, height: int):
+    """Caches every downloaded background video at this size"""
+    with open("./utils/background_videos.json") as json_file:
+        videos = json.load(json_file)
+    del videos["__comment"]
+    for _, filename, credit, _ in videos.values():
+        source = f"assets/backgrounds/video/{credit}-{filename}"
+        if Path(source).is_file():
+            cached_background(source, width, height)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cache of the background videos")
+    commands = parser.add_subparsers(dest="command", required=True)
+    warm_parser = commands.add_parser("warm", help="Cache the downloaded backgrounds ahead of time")
+    warm_parser.add_argument("--width", type=int, default=1080)
+    warm_parser.add_argument("--height", type=int, default=1920)
+    args = parser.parse_args()
+    warm(args.width, args.height)
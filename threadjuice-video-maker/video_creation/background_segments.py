@@ -0,0 +1,134 @@
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import ffmpeg
+import yt_dlp
+
+from utils.console import print_substep
+from video_creation.background_cache import probe_duration
+
+__all__ = ["segment_window", "fetch_chunk", "resolve_stream", "prefetch"]
+
+CHUNK_ROOT: str = "assets/backgrounds/chunks"
+INDEX: str = "index.json"
+VIDEO_FORMAT: str = "bestvideo[height<=1080][ext=mp4]"
+CHUNK_SECONDS: float = 300  # later windows landing in a fetched chunk need no download
+SLACK: float = 10  # seconds fetched before the window, the copy starts on the keyframe before
+
+Picker = Callable[[float, float], Tuple[float, float]]
+
+
+def chunk_folder(background_config: Tuple, root: str = CHUNK_ROOT) -> Path:
+    _, filename, credit, *_ = background_config
+    return Path(root) / Path(f"{credit}-{filename}").stem
+
+
+def load_index(folder: Path) -> dict:
+    """The duration of the source, once known, and the chunks fetched from it"""
+    try:
+        with open(folder / INDEX, "r", encoding="utf-8") as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return {"duration": None, "chunks": []}
+    # chunks deleted by hand are fetched again
+    index["chunks"] = [chunk for chunk in index["chunks"] if Path(chunk["path"]).is_file()]
+    return index
+
+
+def save_index(folder: Path, index: dict):
+    folder.mkdir(parents=True, exist_ok=True)
+    tmp = folder / (INDEX + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=4)
+    os.replace(tmp, folder / INDEX)
+
+
+def find_chunk(chunks: List[dict], start: float, end: float) -> Optional[dict]:
+    """A fetched chunk holding the whole window, if there is one"""
+    return next((c for c in chunks if c["start"] <= start and end <= c["end"]), None)
+
+
+def resolve_stream(uri: str, video_format: str = VIDEO_FORMAT) -> Tuple[str, float]:
+    """The direct media URL of a video and its duration, without downloading it. The URL
+    expires after a few hours, so it is resolved again for every fetch."""
+    with yt_dlp.YoutubeDL({"format": video_format, "quiet": True}) as ydl:
+        info = ydl.extract_info(uri, download=False)
+    return info["url"], float(info["duration"])
+
+
+def fetch_chunk(url: str, start: float, length: float, path: Path) -> float:
+    """Copies `length` seconds from `start` of a remote video to `path`. ffmpeg seeks with HTTP
+    range requests, only the bytes of the range are downloaded.
+
+    Returns:
+        float: The duration of the chunk.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_suffix(".part.mp4")
+    try:
+        ffmpeg.input(url, ss=start, t=length).output(
+            str(partial), c="copy", an=None, f="mp4", movflags="+faststart"
+        ).overwrite_output().run(quiet=True)
+    except ffmpeg.Error as e:
+        partial.unlink(missing_ok=True)
+        print(e.stderr.decode("utf8"))
+        raise
+    os.replace(partial, path)
+    return probe_duration(str(path))
+
+
+def segment_window(
+    background_config: Tuple, video_length: float, pick: Picker, root: str = CHUNK_ROOT
+) -> Tuple[str, float, float]:
+    """Picks a window of the remote background and fetches the chunk around it, unless one
+    already holds it.
+
+    Args:
+        background_config : The background video, as in background_videos.json.
+        video_length : Length of the window, in seconds.
+        pick : Picks the window from the length and the duration of the source.
+        root : The folder of the chunk cache.
+
+    Returns:
+        Tuple[str, float, float]: The chunk, and the start and end of the window in it.
+    """
+    uri = background_config[0]
+    folder = chunk_folder(background_config, root)
+    index = load_index(folder)
+    url = None
+    if index["duration"] is None:
+        url, index["duration"] = resolve_stream(uri)
+    start, end = pick(video_length, index["duration"])
+
+    chunk = find_chunk(index["chunks"], start, end)
+    if chunk is None:
+        url = url or resolve_stream(uri)[0]
+        chunk_start = max(0.0, start - SLACK)
+        chunk_end = min(index["duration"], max(chunk_start + CHUNK_SECONDS, end + SLACK))
+        path = folder / f"{chunk_start:.0f}-{chunk_end:.0f}.mp4"
+        print_substep(f"Fetching {chunk_end - chunk_start:.0f} seconds of {uri}...")
+        fetch_chunk(url, chunk_start, chunk_end - chunk_start, path)
+        chunk = {"path": str(path), "start": chunk_start, "end": chunk_end}
+        index["chunks"].append(chunk)
+    save_index(folder, index)
+    return chunk["path"], start - chunk["start"], end - chunk["start"]
+
+
+_prefetches: Dict[str, threading.Thread] = {}
+_prefetches_lock = threading.Lock()
+
+
+def prefetch(key: str, download: Callable[[], None]) -> threading.Thread:
+    """Runs the full download of a background on the side, once per process. yt-dlp writes
+    to a .part file and resumes it, so a download cut short by the end of the process goes on
+    from there next time."""
+    with _prefetches_lock:
+        thread = _prefetches.get(key)
+        if thread is None or not thread.is_alive():
+            thread = threading.Thread(target=download, name=f"prefetch-{key}", daemon=True)
+            _prefetches[key] = thread
+            thread.start()
+    return thread
@@ -0,0 +1,127 @@
+from pathlib import Path
+from typing import List, NamedTuple, Optional
+
+import ffmpeg
+from PIL import Image
+
+__all__ = ["TrackCard", "CardTrack", "IMAGE_RATE"]
+
+BLANK: str = "blank.png"
+IMAGE_RATE: int = 25  # the demuxer reads each card at this rate, its timestamps are on that grid
+OVERRUN: float = 1.0  # seconds a window runs past its end, see CardTrack.write
+
+
+def micros(t: float) -> int:
+    """A time on the microsecond clock the concat demuxer adds the durations up on"""
+    return round(t * 1_000_000)
+
+
+class TrackCard(NamedTuple):
+    image: Image.Image
+    start: float
+    end: float
+
+
+class CardTrack:
+    """Turns the screenshots of a video into one timed image stream, for a single overlay.
+
+    Chaining one `overlay` per screenshot makes ffmpeg scale, fade and test every card on every
+    frame of the video, so the render slows down with every comment. Here each card is scaled to
+    the overlay width and gets its opacity baked into its alpha channel once, up front. The cards
+    are padded to a common canvas and listed with their durations for the concat demuxer,
+    transparent frames filling the gaps, so the final video needs one overlay whatever the
+    number of comments.
+
+    Card times are snapped to the frames of the video, and every duration is written as the
+    difference of two absolute times, so the lists of a segmented render show each card on the
+    same frames as the list of the whole video.
+
+    Args:
+        folder : Where the prepared cards and their concat list are written.
+        width : The width of the cards in the video.
+        fps : The frame rate of the video.
+    """
+
+    def __init__(self, folder: str, width: int, fps: int = 30):
+        self.folder = Path(folder)
+        self.width = width
+        self.fps = fps
+        self.cards: List[TrackCard] = []
+        self._written: Optional[int] = None
+
+    def add(self, path: str, start: float, end: float, opacity: float = 1.0) -> TrackCard:
+        """Shows the image at `path` from `start` to `end` seconds."""
+        with Image.open(path) as source:
+            image = source.convert("RGBA")
+        height = max(1, round(image.height * self.width / image.width))
+        image = image.resize((self.width, height), Image.LANCZOS)
+        if opacity < 1:
+            image.putalpha(image.getchannel("A").point(lambda alpha: round(alpha * opacity)))
+        card = TrackCard(image, self.snap(start), self.snap(end))
+        self.cards.append(card)
+        return card
+
+    def snap(self, t: float) -> float:
+        """The time of the frame nearest to `t`"""
+        return round(t * self.fps) / self.fps
+
+    @property
+    def height(self) -> int:
+        return max((card.image.height for card in self.cards), default=2)
+
+    def write_images(self):
+        """Writes the cards, padded to the canvas of the tallest one, and a blank frame."""
+        if self._written == len(self.cards):
+            return
+        self.folder.mkdir(parents=True, exist_ok=True)
+        canvas = Image.new("RGBA", (self.width, self.height))
+        canvas.save(self.folder / BLANK)
+        for i, card in enumerate(self.cards):
+            padded = canvas.copy()
+            padded.paste(card.image, (0, (self.height - card.image.height) // 2))
+            padded.save(self.folder / f"card_{i}.png")
+        self._written = len(self.cards)
+
+    def write(self, start: float = 0.0, end: Optional[float] = None) -> str:
+        """Writes the concat list of the cards between `start` and `end`, with times relative
+        to `start`, and returns its path. The whole track by default.
+
+        A window goes on for `OVERRUN` seconds past `end` as the whole track does, and the
+        render of the part stops on its cut. Ending the list on the cut instead changes which
+        card the frame rate conversion picks for the last frame before it.
+        """
+        self.write_images()
+        start = self.snap(start)
+        end = None if end is None else self.snap(end) + OVERRUN
+
+        def duration(a: float, b: float) -> str:
+            # differences of rounded times add up to the rounded time, without drift
+            return f"duration {(micros(b) - micros(a)) / 1_000_000:.6f}"
+
+        lines = ["ffconcat version 1.0"]
+        time = start
+        for i, card in enumerate(self.cards):
+            card_start = max(card.start, start)
+            card_end = card.end if end is None else min(card.end, end)
+            if card_end <= card_start:
+                continue
+            if card_start > time:
+                lines += [f"file {BLANK}", duration(time, card_start)]
+            lines += [f"file card_{i}.png", duration(card_start, card_end)]
+            time = card_end
+        # the demuxer drops the duration of the last entry, so the track ends on a blank frame
+        lines += [f"file {BLANK}", "duration 0.040000", f"file {BLANK}"]
+
+        path = self.folder / (
+            "cards.txt" if start == 0 and end is None else f"cards_{start:.3f}.txt"
+        )
+        path.write_text("\n".join(lines) + "\n")
+        return str(path)
+
+    def input(
+        self, start: float = 0.0, end: Optional[float] = None
+    ) -> ffmpeg.nodes.FilterableStream:
+        """The cards as a stream at the frame rate of the video. The fps filter puts every card
+        on its nearest frame, so each frame depends only on the card times, not on where the
+        render of the stream started."""
+        return ffmpeg.input(self.write(start, end), f="concat", safe=0).video.filter("fps", self.fps)
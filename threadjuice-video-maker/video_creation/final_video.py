@@ -1,13 +1,13 @@
-import multiprocessing
+import json
+import math
 import os
 import re
-import tempfile
 import textwrap
-import threading
-import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
 from os.path import exists  # Needs to be imported specifically
 from pathlib import Path
-from typing import Dict, Final, Tuple
+from typing import Callable, Dict, Final, List, NamedTuple, Optional, Tuple
 
 import ffmpeg
 import translators
@@ -18,52 +18,25 @@ from rich.progress import track
 from utils import settings
 from utils.cleanup import cleanup
 from utils.console import print_step, print_substep
+from utils.encoder import EncoderProfile, get_profile
+from utils.ffmpeg_progress import FfmpegProgress
 from utils.fonts import getheight
 from utils.thumbnail import create_thumbnail
 from utils.videos import save_data
+from video_creation.audio_timeline import AudioTimeline
+from video_creation.card_track import IMAGE_RATE, CardTrack
+from video_creation.ladder import (
+    MAIN,
+    Rendition,
+    encode_renditions,
+    parse_ladder,
+    plan_renditions,
+    write_manifest,
+)
 
 console = Console()
 
-
-class ProgressFfmpeg(threading.Thread):
-    def __init__(self, vid_duration_seconds, progress_update_callback):
-        threading.Thread.__init__(self, name="ProgressFfmpeg")
-        self.stop_event = threading.Event()
-        self.output_file = tempfile.NamedTemporaryFile(mode="w+", delete=False)
-        self.vid_duration_seconds = vid_duration_seconds
-        self.progress_update_callback = progress_update_callback
-
-    def run(self):
-        while not self.stop_event.is_set():
-            latest_progress = self.get_latest_ms_progress()
-            if latest_progress is not None:
-                completed_percent = latest_progress / self.vid_duration_seconds
-                self.progress_update_callback(completed_percent)
-            time.sleep(1)
-
-    def get_latest_ms_progress(self):
-        lines = self.output_file.readlines()
-
-        if lines:
-            for line in lines:
-                if "out_time_ms" in line:
-                    out_time_ms_str = line.split("=")[1].strip()
-                    if out_time_ms_str.isnumeric():
-                        return float(out_time_ms_str) / 1000000.0
-                    else:
-                        # Handle the case when "N/A" is encountered
-                        return None
-        return None
-
-    def stop(self):
-        self.stop_event.set()
-
-    def __enter__(self):
-        self.start()
-        return self
-
-    def __exit__(self, *args, **kwargs):
-        self.stop()
+MIN_SEGMENT_LENGTH: float = 5.0  # seconds, shorter parts cost more in ffmpeg startup than they save
 
 
 def name_normalize(name: str) -> str:
@@ -83,29 +56,206 @@ def name_normalize(name: str) -> str:
         return name
 
 
-def prepare_background(reddit_id: str, W: int, H: int) -> str:
-    output_path = f"assets/temp/{reddit_id}/background_noaudio.mp4"
-    output = (
-        ffmpeg.input(f"assets/temp/{reddit_id}/background.mp4")
-        .filter("crop", f"ih*({W}/{H})", "ih")
-        .output(
-            output_path,
-            an=None,
-            **{
-                "c:v": "h264",
-                "b:v": "20M",
-                "b:a": "192k",
-                "threads": multiprocessing.cpu_count(),
-            },
-        )
-        .overwrite_output()
+def background_input(
+    reddit_id: str, W: int, H: int, start: float = 0, end: Optional[float] = None
+) -> ffmpeg.nodes.FilterableStream:
+    """The background window picked by chop_background, seeked into and cropped to the aspect ratio
+    of the video. Cutting it here keeps the whole video to one decode and one encode.
+    `start` and `end` narrow it down to a part of the video, in seconds from its beginning.
+    Backgrounds from the cache already have the aspect ratio of the video and are not cropped."""
+    with open(f"assets/temp/{reddit_id}/background.json") as f:
+        window = json.load(f)["video"]
+    if end is None:
+        end = window["end"] - window["start"]
+    video = ffmpeg.input(window["path"], ss=window["start"] + start, t=end - start).video
+    if "width" in window and window["width"] * H == window["height"] * W:
+        return video
+    return video.filter("crop", f"ih*({W}/{H})", "ih")
+
+
+def compose(
+    reddit_id: str,
+    W: int,
+    H: int,
+    cards: CardTrack,
+    credit: str,
+    start: float = 0,
+    end: Optional[float] = None,
+) -> ffmpeg.nodes.FilterableStream:
+    """The video track between `start` and `end` seconds, all of it by default"""
+    clip = background_input(reddit_id, W, H, start, end).overlay(
+        cards.input(start, end),
+        x="(main_w-overlay_w)/2",
+        y="(main_h-overlay_h)/2",
+        eof_action="pass",
+    )
+    clip = ffmpeg.drawtext(
+        clip,
+        text=credit,
+        x=f"(w-text_w)",
+        y=f"(h-text_h)",
+        fontsize=5,
+        fontcolor="White",
+        fontfile=os.path.join("fonts", "Roboto-Regular.ttf"),
     )
+    return clip.filter("scale", W, H)
+
+
+def even(value: float) -> int:
+    """Rounds a frame size down to an even number of pixels, as yuv420p needs"""
+    return max(2, int(value) // 2 * 2)
+
+
+def segment_bounds(
+    length: float,
+    cuts: List[float],
+    workers: int,
+    fps: int = 30,
+    min_length: float = MIN_SEGMENT_LENGTH,
+) -> List[Tuple[float, float]]:
+    """Splits the video into about `workers` parts for a parallel render
+
+    Args:
+        length (float): Length of the video, in seconds.
+        cuts (List[float]): Preferred cut points, where a new screenshot comes up.
+        workers (int): How many parts to aim for.
+        fps (int): Frame rate of the output. Cuts are snapped to its frames, to the ones that
+            are also on the grid of the card timestamps, so every part shows the cards on the
+            same frames as a render in one piece.
+        min_length (float): The shortest part worth its own ffmpeg process.
+
+    Returns:
+        List[Tuple[float, float]]: Start and end of every part, back to back.
+    """
+    if workers <= 1 or length < 2 * min_length:
+        return [(0, length)]
+    step = length / workers
+    grid = math.gcd(int(fps), IMAGE_RATE)  # cut points per second
+    cuts = [cut for cut in cuts if 0 < cut < length]
+    points: List[float] = []
+    for k in range(1, workers):
+        target = step * k
+        point = min(cuts, key=lambda cut: abs(cut - target), default=target)
+        # a screenshot change this far away is no better than a fixed cut
+        if abs(point - target) > step / 2:
+            point = target
+        point = round(point * grid) / grid
+        if point - (points[-1] if points else 0) < min_length or length - point < min_length:
+            continue
+        points.append(point)
+    edges = [0] + points + [length]
+    return list(zip(edges, edges[1:]))
+
+
+def render(output: ffmpeg.nodes.OutputStream, length: float, on_update, job: str = "render") -> None:
+    """Runs one ffmpeg render, reporting its progress to on_update
+
+    Args:
+        output (OutputStream): The compiled graph with its output file.
+        length (float): Length of the video, in seconds.
+        on_update (Callable[[float], None]): Called with the completed fraction, twice a second.
+        job (str): Name of the render in the progress events, see utils.ffmpeg_progress.
+    """
+    try:
+        FfmpegProgress(output, length, job).subscribe(lambda event: on_update(event.fraction)).run()
+    except ffmpeg.Error as e:
+        print(e.stderr.decode("utf8"))
+        exit(1)
+
+
+def mux_audio(
+    video_path: str,
+    audio: ffmpeg.nodes.FilterableStream,
+    path: str,
+    duration: Optional[float] = None,
+) -> None:
+    """Writes the rendered video with one of its audio tracks. The video stream is copied as it
+    is, so every extra audio variant costs an audio encode rather than a full render
+
+    Args:
+        video_path (str): The rendered video, without audio.
+        audio (FilterableStream): The audio track of this variant.
+        path (str): Where the variant is written.
+        duration (float): Cuts the audio to this many seconds, for videos cut short.
+    """
+    cut = {} if duration is None else {"t": duration}
     try:
-        output.run(quiet=True)
+        ffmpeg.output(
+            ffmpeg.input(video_path).video,
+            audio,
+            path,
+            f="mp4",
+            **{"c:v": "copy", "b:a": "192k"},
+            **cut,
+        ).overwrite_output().run(quiet=True)
     except ffmpeg.Error as e:
         print(e.stderr.decode("utf8"))
         exit(1)
-    return output_path
+
+
+def render_segments(
+    make_segment: Callable[[float, float], ffmpeg.nodes.FilterableStream],
+    bounds: List[Tuple[float, float]],
+    renditions: List[Rendition],
+    encoder: EncoderProfile,
+    on_update,
+) -> None:
+    """Renders the parts of the video side by side, one ffmpeg process each, and joins them with
+    a stream copy. Every part starts on a keyframe, so the join needs no re-encode
+
+    Args:
+        make_segment (Callable[[float, float], FilterableStream]): The graph of a part of the video.
+        bounds (List[Tuple[float, float]]): Start and end of every part, from segment_bounds.
+        renditions (List[Rendition]): The renditions every part is encoded to, then joined into.
+        encoder (EncoderProfile): The encoder settings, threads are split between the processes.
+        on_update (Callable[[float], None]): Called with the completed fraction of the whole video.
+    """
+    if encoder.threads == 0:
+        encoder = replace(encoder, threads=max(1, (os.cpu_count() or 1) // len(bounds)))
+    folder = os.path.dirname(renditions[0].video_path)
+    length = bounds[-1][1]
+    done = [0.0] * len(bounds)
+
+    def segment_path(index: int, rendition: Rendition) -> str:
+        return os.path.join(folder, f"segment_{index}_{rendition.name}.mp4")
+
+    def render_segment(index: int) -> None:
+        start, end = bounds[index]
+
+        def on_segment_update(progress: float) -> None:
+            done[index] = min(progress, 1.0) * (end - start)
+            on_update(sum(done) / length)
+
+        render(
+            encode_renditions(
+                make_segment(start, end),
+                renditions,
+                encoder,
+                [segment_path(index, rendition) for rendition in renditions],
+            ),
+            end - start,
+            on_segment_update,
+            job=f"segment_{index}",
+        )
+
+    with ThreadPoolExecutor(max_workers=len(bounds)) as pool:
+        list(pool.map(render_segment, range(len(bounds))))
+
+    for rendition in renditions:
+        segments_list = os.path.join(folder, f"segments_{rendition.name}.txt")
+        with open(segments_list, "w") as f:
+            f.write("ffconcat version 1.0\n")
+            f.writelines(
+                f"file {os.path.basename(segment_path(index, rendition))}\n"
+                for index in range(len(bounds))
+            )
+        try:
+            ffmpeg.input(segments_list, f="concat", safe=0).output(
+                rendition.video_path, c="copy"
+            ).overwrite_output().run(quiet=True)
+        except ffmpeg.Error as e:
+            print(e.stderr.decode("utf8"))
+            exit(1)
 
 
 def create_fancy_thumbnail(image, text, text_color, padding, wrap=35):
@@ -166,41 +316,59 @@ def create_fancy_thumbnail(image, text, text_color, padding, wrap=35):
 
 
 def merge_background_audio(audio: ffmpeg, reddit_id: str):
-    """Gather an audio and merge with assets/backgrounds/background.mp3
+    """Gather an audio and merge with the background audio window picked by chop_background
     Args:
         audio (ffmpeg): The TTS final audio but without background.
         reddit_id (str): The ID of subreddit
     """
     background_audio_volume = settings.config["settings"]["background"]["background_audio_volume"]
-    if background_audio_volume == 0:
+    with open(f"assets/temp/{reddit_id}/background.json") as f:
+        window = json.load(f).get("audio")
+    if background_audio_volume == 0 or window is None:
         return audio  # Return the original audio
     else:
-        # sets volume to config
-        bg_audio = ffmpeg.input(f"assets/temp/{reddit_id}/background.mp3").filter(
-            "volume",
-            background_audio_volume,
+        # seeks into the background track, cuts the window and sets volume to config
+        length = window["end"] - window["start"]
+        bg_audio = (
+            ffmpeg.input(window["path"], ss=window["start"], t=length)
+            .filter("atrim", duration=length)
+            .filter("volume", background_audio_volume)
         )
         # Merges audio and background_audio
         merged_audio = ffmpeg.filter([audio, bg_audio], "amix", duration="longest")
         return merged_audio  # Return merged audio
 
 
+class Preview(NamedTuple):
+    """A quick render to check the captions, timing and layout of a video before the real one.
+    Same composition, at a fraction of the resolution and frame rate, optionally cut short."""
+
+    scale: float = 0.5
+    seconds: Optional[float] = None
+
+
 def make_final_video(
     number_of_clips: int,
     length: int,
     reddit_obj: dict,
     background_config: Dict[str, Tuple],
-):
+    preview: Optional[Preview] = None,
+) -> str:
     """Gathers audio clips, gathers all screenshots, stitches them together and saves the final video to assets/temp
     Args:
         number_of_clips (int): Index to end at when going through the screenshots'
         length (int): Length of the video
         reddit_obj (dict): The reddit object that contains the posts to read.
         background_config (Tuple[str, str, str, Any]): The background config to use.
+        preview (Preview): Renders a preview to results/{subreddit}/preview instead of the video.
+
+    Returns:
+        str: The path of the video.
     """
     # settings values
-    W: Final[int] = int(settings.config["settings"]["resolution_w"])
-    H: Final[int] = int(settings.config["settings"]["resolution_h"])
+    scale = preview.scale if preview else 1
+    W: Final[int] = even(int(settings.config["settings"]["resolution_w"]) * scale)
+    H: Final[int] = even(int(settings.config["settings"]["resolution_h"]) * scale)
 
     opacity = settings.config["settings"]["opacity"]
 
@@ -209,57 +377,40 @@ def make_final_video(
     allowOnlyTTSFolder: bool = (
         settings.config["settings"]["background"]["enable_extra_audio"]
         and settings.config["settings"]["background"]["background_audio_volume"] != 0
+        and preview is None
     )
 
-    print_step("Creating the final video 🎥")
+    encoder = get_profile("preview" if preview else None)
+    if preview and preview.seconds:
+        length = min(length, preview.seconds)
 
-    background_clip = ffmpeg.input(prepare_background(reddit_id, W=W, H=H))
+    print_step("Creating the final video 🎥")
 
-    # Gather all audio clips
-    audio_clips = list()
+    # Lay all audio clips out on one timeline, the overlays below use the same offsets
+    timeline = AudioTimeline(f"assets/temp/{reddit_id}/mp3")
     if number_of_clips == 0 and settings.config["settings"]["storymode"] == "false":
         print(
             "No audio clips to gather. Please use a different TTS or post."
         )  # This is to fix the TypeError: unsupported operand type(s) for +: 'int' and 'NoneType'
         exit()
+    timeline.add("title")
     if settings.config["settings"]["storymode"]:
         if settings.config["settings"]["storymodemethod"] == 0:
-            audio_clips = [ffmpeg.input(f"assets/temp/{reddit_id}/mp3/title.mp3")]
-            audio_clips.insert(1, ffmpeg.input(f"assets/temp/{reddit_id}/mp3/postaudio.mp3"))
+            timeline.add("postaudio")
         elif settings.config["settings"]["storymodemethod"] == 1:
-            audio_clips = [
-                ffmpeg.input(f"assets/temp/{reddit_id}/mp3/postaudio-{i}.mp3")
-                for i in track(range(number_of_clips + 1), "Collecting the audio files...")
-            ]
-            audio_clips.insert(0, ffmpeg.input(f"assets/temp/{reddit_id}/mp3/title.mp3"))
-
+            for i in track(range(number_of_clips + 1), "Collecting the audio files..."):
+                timeline.add(f"postaudio-{i}")
     else:
-        audio_clips = [
-            ffmpeg.input(f"assets/temp/{reddit_id}/mp3/{i}.mp3") for i in range(number_of_clips)
-        ]
-        audio_clips.insert(0, ffmpeg.input(f"assets/temp/{reddit_id}/mp3/title.mp3"))
-
-        audio_clips_durations = [
-            float(ffmpeg.probe(f"assets/temp/{reddit_id}/mp3/{i}.mp3")["format"]["duration"])
-            for i in range(number_of_clips)
-        ]
-        audio_clips_durations.insert(
-            0,
-            float(ffmpeg.probe(f"assets/temp/{reddit_id}/mp3/title.mp3")["format"]["duration"]),
-        )
-    audio_concat = ffmpeg.concat(*audio_clips, a=1, v=0)
-    ffmpeg.output(
-        audio_concat, f"assets/temp/{reddit_id}/audio.mp3", **{"b:a": "192k"}
-    ).overwrite_output().run(quiet=True)
+        for i in range(number_of_clips):
+            timeline.add(f"{i}")
+    timeline.write_wav(f"assets/temp/{reddit_id}/audio.wav")
 
     console.log(f"[bold green] Video Will Be: {length} Seconds Long")
 
     screenshot_width = int((W * 45) // 100)
-    audio = ffmpeg.input(f"assets/temp/{reddit_id}/audio.mp3")
+    audio = ffmpeg.input(f"assets/temp/{reddit_id}/audio.wav")
     final_audio = merge_background_audio(audio, reddit_id)
 
-    image_clips = list()
-
     Path(f"assets/temp/{reddit_id}/png").mkdir(parents=True, exist_ok=True)
 
     # Credits to tim (beingbored)
@@ -277,71 +428,26 @@ def make_final_video(
     title_img = create_fancy_thumbnail(title_template, title, font_color, padding)
 
     title_img.save(f"assets/temp/{reddit_id}/png/title.png")
-    image_clips.insert(
-        0,
-        ffmpeg.input(f"assets/temp/{reddit_id}/png/title.png")["v"].filter(
-            "scale", screenshot_width, -1
-        ),
-    )
 
-    current_time = 0
+    # All the screenshots go through one overlay, as a single timed image stream
+    cards = CardTrack(f"assets/temp/{reddit_id}/cards", screenshot_width, fps=encoder.fps or 30)
+    clips = timeline.clips
     if settings.config["settings"]["storymode"]:
-        audio_clips_durations = [
-            float(
-                ffmpeg.probe(f"assets/temp/{reddit_id}/mp3/postaudio-{i}.mp3")["format"]["duration"]
-            )
-            for i in range(number_of_clips)
-        ]
-        audio_clips_durations.insert(
-            0,
-            float(ffmpeg.probe(f"assets/temp/{reddit_id}/mp3/title.mp3")["format"]["duration"]),
-        )
         if settings.config["settings"]["storymodemethod"] == 0:
-            image_clips.insert(
-                1,
-                ffmpeg.input(f"assets/temp/{reddit_id}/png/story_content.png").filter(
-                    "scale", screenshot_width, -1
-                ),
-            )
-            background_clip = background_clip.overlay(
-                image_clips[0],
-                enable=f"between(t,{current_time},{current_time + audio_clips_durations[0]})",
-                x="(main_w-overlay_w)/2",
-                y="(main_h-overlay_h)/2",
-            )
-            current_time += audio_clips_durations[0]
+            cards.add(f"assets/temp/{reddit_id}/png/title.png", clips[0].start, clips[0].end)
         elif settings.config["settings"]["storymodemethod"] == 1:
             for i in track(range(0, number_of_clips + 1), "Collecting the image files..."):
-                image_clips.append(
-                    ffmpeg.input(f"assets/temp/{reddit_id}/png/img{i}.png")["v"].filter(
-                        "scale", screenshot_width, -1
-                    )
-                )
-                background_clip = background_clip.overlay(
-                    image_clips[i],
-                    enable=f"between(t,{current_time},{current_time + audio_clips_durations[i]})",
-                    x="(main_w-overlay_w)/2",
-                    y="(main_h-overlay_h)/2",
-                )
-                current_time += audio_clips_durations[i]
+                image = "title" if i == 0 else f"img{i - 1}"
+                cards.add(f"assets/temp/{reddit_id}/png/{image}.png", clips[i].start, clips[i].end)
     else:
         for i in range(0, number_of_clips + 1):
-            image_clips.append(
-                ffmpeg.input(f"assets/temp/{reddit_id}/png/comment_{i}.png")["v"].filter(
-                    "scale", screenshot_width, -1
-                )
+            image = "title" if i == 0 else f"comment_{i - 1}"
+            cards.add(
+                f"assets/temp/{reddit_id}/png/{image}.png",
+                clips[i].start,
+                clips[i].end,
+                opacity=opacity,
             )
-            image_overlay = image_clips[i].filter("colorchannelmixer", aa=opacity)
-            assert (
-                audio_clips_durations is not None
-            ), "Please make a GitHub issue if you see this. Ping @JasonLovesDoggo on GitHub."
-            background_clip = background_clip.overlay(
-                image_overlay,
-                enable=f"between(t,{current_time},{current_time + audio_clips_durations[i]})",
-                x="(main_w-overlay_w)/2",
-                y="(main_h-overlay_h)/2",
-            )
-            current_time += audio_clips_durations[i]
 
     title = re.sub(r"[^\w\s-]", "", reddit_obj["thread_title"])
     idx = re.sub(r"[^\w\s-]", "", reddit_obj["thread_id"])
@@ -361,7 +467,7 @@ def make_final_video(
     # create a thumbnail for the video
     settingsbackground = settings.config["settings"]["background"]
 
-    if settingsbackground["background_thumbnail"]:
+    if settingsbackground["background_thumbnail"] and preview is None:
         if not exists(f"./results/{subreddit}/thumbnails"):
             print_substep(
                 "The 'results/thumbnails' folder could not be found so it was automatically created."
@@ -393,17 +499,6 @@ def make_final_video(
             thumbnailSave.save(f"./assets/temp/{reddit_id}/thumbnail.png")
             print_substep(f"Thumbnail - Building Thumbnail in assets/temp/{reddit_id}/thumbnail.png")
 
-    text = f"Background by {background_config['video'][2]}"
-    background_clip = ffmpeg.drawtext(
-        background_clip,
-        text=text,
-        x=f"(w-text_w)",
-        y=f"(h-text_h)",
-        fontsize=5,
-        fontcolor="White",
-        fontfile=os.path.join("fonts", "Roboto-Regular.ttf"),
-    )
-    background_clip = background_clip.filter("scale", W, H)
     print_step("Rendering the video 🎥")
     from tqdm import tqdm
 
@@ -414,69 +509,65 @@ def make_final_video(
         old_percentage = pbar.n
         pbar.update(status - old_percentage)
 
-    defaultPath = f"results/{subreddit}"
-    with ProgressFfmpeg(length, on_update_example) as progress:
-        path = defaultPath + f"/{filename}"
-        path = (
-            path[:251] + ".mp4"
-        )  # Prevent a error by limiting the path length, do not change this.
-        try:
-            ffmpeg.output(
-                background_clip,
-                final_audio,
-                path,
-                f="mp4",
-                **{
-                    "c:v": "h264",
-                    "b:v": "20M",
-                    "b:a": "192k",
-                    "threads": multiprocessing.cpu_count(),
-                },
-            ).overwrite_output().global_args("-progress", progress.output_file.name).run(
-                quiet=True,
-                overwrite_output=True,
-                capture_stdout=False,
-                capture_stderr=False,
-            )
-        except ffmpeg.Error as e:
-            print(e.stderr.decode("utf8"))
-            exit(1)
+    defaultPath = f"results/{subreddit}" if preview is None else f"results/{subreddit}/preview"
+    os.makedirs(defaultPath, exist_ok=True)
+    # The video is encoded once, every audio variant is muxed onto a copy of it
+    variants = {defaultPath + f"/{filename}": final_audio}
+    if allowOnlyTTSFolder:
+        variants[defaultPath + f"/OnlyTTS/{filename}"] = audio
+    # One composition, encoded once per size of the output ladder
+    ladder = [] if preview else parse_ladder(settings.config["settings"].get("output_ladder", ""))
+    renditions, ladder_encodes = plan_renditions((W, H), ladder, f"assets/temp/{reddit_id}")
+    credit = f"Background by {background_config['video'][2]}"
+
+    def make_segment(start: float = 0, end: Optional[float] = None):
+        return compose(reddit_id, W, H, cards, credit, start, length if end is None else end)
+
+    # Long videos are rendered in parts side by side, cut where a new screenshot comes up
+    workers = int(settings.config["settings"].get("render_workers", 0)) or max(
+        1, (os.cpu_count() or 1) // 4
+    )
+    bounds = segment_bounds(
+        length, [clip.start for clip in clips[1:]], workers, fps=encoder.fps or 30
+    )
+    if len(bounds) > 1:
+        render_segments(make_segment, bounds, renditions, encoder, on_update_example)
+    else:
+        render(encode_renditions(make_segment(), renditions, encoder), length, on_update_example)
     old_percentage = pbar.n
     pbar.update(100 - old_percentage)
-    if allowOnlyTTSFolder:
-        path = defaultPath + f"/OnlyTTS/{filename}"
+    for path, variant_audio in variants.items():
         path = (
             path[:251] + ".mp4"
         )  # Prevent a error by limiting the path length, do not change this.
-        print_step("Rendering the Only TTS Video 🎥")
-        with ProgressFfmpeg(length, on_update_example) as progress:
-            try:
-                ffmpeg.output(
-                    background_clip,
-                    audio,
-                    path,
-                    f="mp4",
-                    **{
-                        "c:v": "h264",
-                        "b:v": "20M",
-                        "b:a": "192k",
-                        "threads": multiprocessing.cpu_count(),
-                    },
-                ).overwrite_output().global_args("-progress", progress.output_file.name).run(
-                    quiet=True,
-                    overwrite_output=True,
-                    capture_stdout=False,
-                    capture_stderr=False,
-                )
-            except ffmpeg.Error as e:
-                print(e.stderr.decode("utf8"))
-                exit(1)
-
-        old_percentage = pbar.n
-        pbar.update(100 - old_percentage)
+        mux_audio(renditions[0].video_path, variant_audio, path, duration=length)
+    if ladder:
+        outputs = [
+            {
+                "name": MAIN,
+                "width": W,
+                "height": H,
+                "path": (defaultPath + f"/{filename}")[:251] + ".mp4",
+            }
+        ]
+        for name, rendition in ladder_encodes.items():
+            os.makedirs(f"{defaultPath}/{name}", exist_ok=True)
+            path = (defaultPath + f"/{name}/{filename}")[:251] + ".mp4"
+            mux_audio(rendition.video_path, final_audio, path, duration=length)
+            outputs.append(
+                {"name": name, "width": rendition.width, "height": rendition.height, "path": path}
+            )
+        manifest = write_manifest((defaultPath + f"/{filename}")[:251] + ".json", outputs)
+        print_substep(f"Wrote {len(outputs)} renditions, listed in {manifest}")
     pbar.close()
+    video_path = (defaultPath + f"/{filename}")[:251] + ".mp4"
+    if preview:
+        # the temporary files stay for the real render, and the post is not marked as done
+        print_step(f"Done! 🎉 The preview is in {video_path} 📁")
+        return video_path
     save_data(subreddit, filename + ".mp4", title, idx, background_config["video"][2])
     print_step("Removing temporary files 🗑")
     cleanups = cleanup(reddit_id)
     print_substep(f"Removed {cleanups} temporary files 🗑")
     print_step("Done! 🎉 The video is in the results folder 📁")
+    return video_path
@@ -0,0 +1,94 @@
+import json
+import os
+import re
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import ffmpeg
+
+from utils.encoder import EncoderProfile
+
+__all__ = ["Rendition", "parse_ladder", "plan_renditions", "encode_renditions", "write_manifest"]
+
+MAIN: str = "main"
+
+
+class Rendition(NamedTuple):
+    name: str
+    width: int
+    height: int
+    video_path: str
+
+
+def parse_ladder(value: str) -> List[Tuple[str, int, int]]:
+    """Reads the `output_ladder` setting, like `web=720x1280, preview=540x960`"""
+    ladder = []
+    for entry in filter(None, (part.strip() for part in (value or "").split(","))):
+        match = re.fullmatch(r"([\w-]+)\s*=\s*(\d+)x(\d+)", entry)
+        if match is None:
+            raise ValueError(f"Invalid output_ladder entry {entry!r}, expected name=WIDTHxHEIGHT")
+        name, width, height = match.group(1), int(match.group(2)), int(match.group(3))
+        if width % 2 or height % 2 or not width or not height:
+            # libx264 encodes yuv420p, which needs even dimensions
+            raise ValueError(f"The output_ladder entry {entry!r} needs an even, non-zero size")
+        if name == MAIN or any(name == other for other, _, _ in ladder):
+            raise ValueError(f"The output_ladder name {name!r} is used twice")
+        ladder.append((name, width, height))
+    return ladder
+
+
+def plan_renditions(
+    main: Tuple[int, int], ladder: List[Tuple[str, int, int]], folder: str
+) -> Tuple[List[Rendition], Dict[str, Rendition]]:
+    """The encodes needed for the video and its ladder, one per distinct size.
+
+    Returns:
+        The encodes, the main video first, and the encode each ladder entry is muxed from.
+    """
+    renditions = [Rendition(MAIN, main[0], main[1], os.path.join(folder, "video.mp4"))]
+    by_size = {main: renditions[0]}
+    entries = {}
+    for name, width, height in ladder:
+        if (width, height) not in by_size:
+            rendition = Rendition(name, width, height, os.path.join(folder, f"video_{name}.mp4"))
+            renditions.append(rendition)
+            by_size[(width, height)] = rendition
+        entries[name] = by_size[(width, height)]
+    return renditions, entries
+
+
+def encode_renditions(
+    video: ffmpeg.nodes.FilterableStream,
+    renditions: List[Rendition],
+    encoder: EncoderProfile,
+    paths: Optional[List[str]] = None,
+) -> ffmpeg.nodes.OutputStream:
+    """Encodes the composed video once per rendition, all in the same ffmpeg process. The
+    composition runs once and is split, each extra rendition only adds its scale and encode.
+
+    Args:
+        video : The composed video, at the size of the first rendition.
+        renditions : The renditions to encode, from plan_renditions.
+        encoder : The encoder settings of every rendition.
+        paths : Where to write them, the video_path of the renditions by default.
+    """
+    paths = paths or [rendition.video_path for rendition in renditions]
+    if len(renditions) == 1:
+        return ffmpeg.output(video, paths[0], an=None, f="mp4", **encoder.output_args())
+    split = video.filter_multi_output("split", len(renditions))
+    outputs = []
+    for index, (rendition, path) in enumerate(zip(renditions, paths)):
+        stream = split[index]
+        if index > 0:
+            stream = stream.filter("scale", rendition.width, rendition.height)
+        outputs.append(ffmpeg.output(stream, path, an=None, f="mp4", **encoder.output_args()))
+    return ffmpeg.merge_outputs(*outputs)
+
+
+def write_manifest(path: str, outputs: List[dict]) -> str:
+    """Lists the files made out of one composition, with their size on disk"""
+    for output in outputs:
+        output["bytes"] = os.path.getsize(output["path"]) if os.path.exists(output["path"]) else None
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "outputs": outputs}, f, indent=4)
+    return path
@@ -1,20 +1,125 @@
-import json
 import re
+from contextlib import closing
 from pathlib import Path
-from typing import Dict, Final
+from typing import Dict, Final, List
 
 import translators
-from playwright.sync_api import ViewportSize, sync_playwright
+from playwright.sync_api import BrowserContext, Page
+from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+from playwright.sync_api import ViewportSize
 from rich.progress import track
 
 from utils import settings
 from utils.console import print_step, print_substep
 from utils.imagenarator import imagemaker
-from utils.playwright import clear_cookie_by_name
 from utils.videos import save_data
+from video_creation.screenshot_service import (
+    BrowserOptions,
+    CaptureMetrics,
+    ScreenshotService,
+    get_service,
+)
 
 __all__ = ["get_screenshots_of_reddit_posts"]
 
+POST_CONTENT: Final[str] = '[data-test-id="post-content"]'
+CONTENT_GATE: Final[str] = '[data-testid="content-gate"]'
+COMMENT: Final[str] = '[id^="t1_"]'
+MORE_COMMENTS: Final[str] = 'button:has-text("View more comments"), button:has-text("more replies")'
+EXPAND_ROUNDS: Final[int] = 10
+EXPAND_TIMEOUT: Final[float] = 3000  # ms for more comments to show up after a click or scroll
+
+
+def capture_comment(page: Page, comment: dict, path: str):
+    """Screenshots a comment of the page, translated and zoomed as set in the config"""
+    if settings.config["reddit"]["thread"]["post_lang"]:
+        comment_tl = translators.translate_text(
+            comment["comment_body"],
+            translator="google",
+            to_language=settings.config["reddit"]["thread"]["post_lang"],
+        )
+        page.evaluate(
+            '([tl_content, tl_id]) => document.querySelector(`#t1_${tl_id} > div:nth-child(2) > div > div[data-testid="comment"] > div`).textContent = tl_content',
+            [comment_tl, comment["comment_id"]],
+        )
+    if settings.config["settings"]["zoom"] != 1:
+        # store zoom settings
+        zoom = settings.config["settings"]["zoom"]
+        # zoom the body of the page
+        page.evaluate("document.body.style.zoom=" + str(zoom))
+        # scroll comment into view
+        page.locator(f"#t1_{comment['comment_id']}").scroll_into_view_if_needed()
+        # as zooming the body doesn't change the properties of the divs, we need to adjust for the zoom
+        location = page.locator(f"#t1_{comment['comment_id']}").bounding_box()
+        for i in location:
+            location[i] = float("{:.2f}".format(location[i] * zoom))
+        page.screenshot(clip=location, path=path)
+    else:
+        page.locator(f"#t1_{comment['comment_id']}").screenshot(path=path)
+
+
+def missing_comments(page: Page, ids: List[str]) -> List[str]:
+    """The comments not in the page yet"""
+    return page.evaluate("ids => ids.filter(id => !document.getElementById(`t1_${id}`))", ids)
+
+
+def expand_comments(page: Page, ids: List[str], rounds: int = EXPAND_ROUNDS) -> List[str]:
+    """Loads more of the thread until all the comments are in the page, or no more come up.
+
+    Returns:
+        List[str]: The ids of the comments still missing.
+    """
+    missing = missing_comments(page, ids)
+    for _ in range(rounds):
+        if not missing:
+            break
+        loaded = page.locator(COMMENT).count()
+        more = page.locator(MORE_COMMENTS).first
+        if more.is_visible():
+            more.click()
+        else:
+            page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
+        try:
+            page.wait_for_function(
+                f"n => document.querySelectorAll('{COMMENT}').length > n",
+                arg=loaded,
+                timeout=EXPAND_TIMEOUT,
+            )
+        except PlaywrightTimeoutError:
+            break  # the thread has nothing more to show
+        missing = missing_comments(page, ids)
+    return missing
+
+
+def capture_permalinks(
+    service: ScreenshotService,
+    context: BrowserContext,
+    comments: List[dict],
+    paths: Dict[str, str],
+    metrics: CaptureMetrics,
+    shards: int = 3,
+):
+    """Screenshots comments from their own permalink, on up to `shards` pages of the context.
+    Each round starts loading a comment on every page before capturing any of them, so the
+    pages load side by side."""
+    pages = [service.new_page(context) for _ in range(max(1, min(shards, len(comments))))]
+    try:
+        for start in range(0, len(comments), len(pages)):
+            batch = list(zip(pages, comments[start : start + len(pages)]))
+            for page, comment in batch:
+                page.goto(f"https://new.reddit.com/{comment['comment_url']}", wait_until="commit")
+            for page, comment in batch:
+                with metrics.step(f"comment_{comment['comment_id']}_permalink"):
+                    target = f"#t1_{comment['comment_id']}"
+                    page.locator(f"{target}, {CONTENT_GATE}").first.wait_for(state="visible")
+                    if page.locator(CONTENT_GATE).is_visible():
+                        page.locator(f"{CONTENT_GATE} button").click()
+                    page.locator(target).wait_for(state="visible")
+                    capture_comment(page, comment, paths[comment["comment_id"]])
+    finally:
+        for page in pages:
+            page.close()
+
 
 def get_screenshots_of_reddit_posts(reddit_object: dict, screenshot_num: int):
     """Downloads screenshots of reddit posts as seen on the web. Downloads to assets/temp/png
@@ -36,7 +141,7 @@ def get_screenshots_of_reddit_posts(reddit_object: dict, screenshot_num: int):
 
     # set the theme and disable non-essential cookies
     if settings.config["settings"]["theme"] == "dark":
-        cookie_file = open("./video_creation/data/cookie-dark-mode.json", encoding="utf-8")
+        cookie_file = "./video_creation/data/cookie-dark-mode.json"
         bgcolor = (33, 33, 36, 255)
         txtcolor = (240, 240, 240)
         transparent = False
@@ -46,15 +151,15 @@ def get_screenshots_of_reddit_posts(reddit_object: dict, screenshot_num: int):
             bgcolor = (0, 0, 0, 0)
             txtcolor = (255, 255, 255)
             transparent = True
-            cookie_file = open("./video_creation/data/cookie-dark-mode.json", encoding="utf-8")
+            cookie_file = "./video_creation/data/cookie-dark-mode.json"
         else:
             # Switch to dark theme
-            cookie_file = open("./video_creation/data/cookie-dark-mode.json", encoding="utf-8")
+            cookie_file = "./video_creation/data/cookie-dark-mode.json"
             bgcolor = (33, 33, 36, 255)
             txtcolor = (240, 240, 240)
             transparent = False
     else:
-        cookie_file = open("./video_creation/data/cookie-light-mode.json", encoding="utf-8")
+        cookie_file = "./video_creation/data/cookie-light-mode.json"
         bgcolor = (255, 255, 255, 255)
         txtcolor = (0, 0, 0)
         transparent = False
@@ -70,81 +175,23 @@ def get_screenshots_of_reddit_posts(reddit_object: dict, screenshot_num: int):
         )
 
     screenshot_num: int
-    with sync_playwright() as p:
-        print_substep("Launching Headless Browser...")
-
-        browser = p.chromium.launch(
-            headless=True
-        )  # headless=False will show the browser for debugging purposes
-        # Device scale factor (or dsf for short) allows us to increase the resolution of the screenshots
-        # When the dsf is 1, the width of the screenshot is 600 pixels
-        # so we need a dsf such that the width of the screenshot is greater than the final resolution of the video
-        dsf = (W // 600) + 1
-
-        context = browser.new_context(
-            locale=lang or "en-us",
-            color_scheme="dark",
-            viewport=ViewportSize(width=W, height=H),
-            device_scale_factor=dsf,
-            user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0.0.0 Safari/537.36",
-        )
-        cookies = json.load(cookie_file)
-        cookie_file.close()
-
-        context.add_cookies(cookies)  # load preference cookies
-
-        # Login to Reddit
-        print_substep("Logging in to Reddit...")
-        page = context.new_page()
-        page.goto("https://www.reddit.com/login", timeout=0)
-        page.set_viewport_size(ViewportSize(width=1920, height=1080))
-        page.wait_for_load_state()
-
-        page.locator(f'input[name="username"]').fill(settings.config["reddit"]["creds"]["username"])
-        page.locator(f'input[name="password"]').fill(settings.config["reddit"]["creds"]["password"])
-        page.get_by_role("button", name="Log In").click()
-        page.wait_for_timeout(5000)
-
-        login_error_div = page.locator(".AnimatedForm__errorMessage").first
-        if login_error_div.is_visible():
-            login_error_message = login_error_div.inner_text()
-            if login_error_message.strip() == "":
-                # The div element is empty, no error
-                pass
-            else:
-                # The div contains an error message
-                print_substep(
-                    "Your reddit credentials are incorrect! Please modify them accordingly in the config.toml file.",
-                    style="red",
-                )
-                exit()
-        else:
-            pass
-
-        page.wait_for_load_state()
-        # Handle the redesign
-        # Check if the redesign optout cookie is set
-        if page.locator("#redesign-beta-optin-btn").is_visible():
-            # Clear the redesign optout cookie
-            clear_cookie_by_name(context, "redesign_optout")
-            # Reload the page for the redesign to take effect
-            page.reload()
-        # Get the thread screenshot
-        page.goto(reddit_object["thread_url"], timeout=0)
-        page.set_viewport_size(ViewportSize(width=W, height=H))
-        page.wait_for_load_state()
-        page.wait_for_timeout(5000)
-
-        if page.locator(
-            "#t3_12hmbug > div > div._3xX726aBn29LDbsDtzr_6E._1Ap4F5maDtT1E1YuCiaO0r.D3IL3FD0RFy_mkKLPwL4 > div > div > button"
-        ).is_visible():
+    # The browser and the Reddit login are kept from one video to the next
+    service = get_service(BrowserOptions(W, H, lang, cookie_file))
+    metrics = service.new_metrics()
+    with service.context() as context, closing(service.new_page(context)) as page:
+        # Get the thread screenshot, as soon as the post is there
+        with metrics.step("thread"):
+            page.goto(reddit_object["thread_url"], wait_until="domcontentloaded")
+            page.set_viewport_size(ViewportSize(width=W, height=H))
+            page.locator(f"{POST_CONTENT}, {CONTENT_GATE}").first.wait_for(state="visible")
+
+        if page.locator(CONTENT_GATE).is_visible():
             # This means the post is NSFW and requires to click the proceed button.
 
             print_substep("Post is NSFW. You are spicy...")
-            page.locator(
-                "#t3_12hmbug > div > div._3xX726aBn29LDbsDtzr_6E._1Ap4F5maDtT1E1YuCiaO0r.D3IL3FD0RFy_mkKLPwL4 > div > div > button"
-            ).click()
-            page.wait_for_load_state()  # Wait for page to fully load
+            with metrics.step("nsfw_gate"):
+                page.locator(f"{CONTENT_GATE} button").first.click()
+                page.locator(POST_CONTENT).wait_for(state="visible")
 
             # translate code
         if page.locator(
@@ -171,18 +218,19 @@ def get_screenshots_of_reddit_posts(reddit_object: dict, screenshot_num: int):
 
         postcontentpath = f"assets/temp/{reddit_id}/png/title.png"
         try:
-            if settings.config["settings"]["zoom"] != 1:
-                # store zoom settings
-                zoom = settings.config["settings"]["zoom"]
-                # zoom the body of the page
-                page.evaluate("document.body.style.zoom=" + str(zoom))
-                # as zooming the body doesn't change the properties of the divs, we need to adjust for the zoom
-                location = page.locator('[data-test-id="post-content"]').bounding_box()
-                for i in location:
-                    location[i] = float("{:.2f}".format(location[i] * zoom))
-                page.screenshot(clip=location, path=postcontentpath)
-            else:
-                page.locator('[data-test-id="post-content"]').screenshot(path=postcontentpath)
+            with metrics.step("title"):
+                if settings.config["settings"]["zoom"] != 1:
+                    # store zoom settings
+                    zoom = settings.config["settings"]["zoom"]
+                    # zoom the body of the page
+                    page.evaluate("document.body.style.zoom=" + str(zoom))
+                    # as zooming the body doesn't change the properties of the divs, we need to adjust for the zoom
+                    location = page.locator(POST_CONTENT).bounding_box()
+                    for i in location:
+                        location[i] = float("{:.2f}".format(location[i] * zoom))
+                    page.screenshot(clip=location, path=postcontentpath)
+                else:
+                    page.locator(POST_CONTENT).screenshot(path=postcontentpath)
         except Exception as e:
             print_substep("Something went wrong!", style="red")
             resp = input(
@@ -207,60 +255,38 @@ def get_screenshots_of_reddit_posts(reddit_object: dict, screenshot_num: int):
                 path=f"assets/temp/{reddit_id}/png/story_content.png"
             )
         else:
-            for idx, comment in enumerate(
-                track(
-                    reddit_object["comments"][:screenshot_num],
-                    "Downloading screenshots...",
-                )
+            comments = reddit_object["comments"][:screenshot_num]
+            paths = {
+                comment["comment_id"]: f"assets/temp/{reddit_id}/png/comment_{idx}.png"
+                for idx, comment in enumerate(comments)
+            }
+            if page.locator(CONTENT_GATE).is_visible():
+                page.locator(f"{CONTENT_GATE} button").click()
+
+            # The comments are all taken from the thread already loaded, when they are in it
+            with metrics.step("expand_comments"):
+                missing = set(expand_comments(page, list(paths)))
+            for comment in track(
+                [comment for comment in comments if comment["comment_id"] not in missing],
+                "Downloading screenshots...",
             ):
-                # Stop if we have reached the screenshot_num
-                if idx >= screenshot_num:
-                    break
-
-                if page.locator('[data-testid="content-gate"]').is_visible():
-                    page.locator('[data-testid="content-gate"] button').click()
-
-                page.goto(f"https://new.reddit.com/{comment['comment_url']}")
-
-                # translate code
-
-                if settings.config["reddit"]["thread"]["post_lang"]:
-                    comment_tl = translators.translate_text(
-                        comment["comment_body"],
-                        translator="google",
-                        to_language=settings.config["reddit"]["thread"]["post_lang"],
-                    )
-                    page.evaluate(
-                        '([tl_content, tl_id]) => document.querySelector(`#t1_${tl_id} > div:nth-child(2) > div > div[data-testid="comment"] > div`).textContent = tl_content',
-                        [comment_tl, comment["comment_id"]],
-                    )
-                try:
-                    if settings.config["settings"]["zoom"] != 1:
-                        # store zoom settings
-                        zoom = settings.config["settings"]["zoom"]
-                        # zoom the body of the page
-                        page.evaluate("document.body.style.zoom=" + str(zoom))
-                        # scroll comment into view
-                        page.locator(f"#t1_{comment['comment_id']}").scroll_into_view_if_needed()
-                        # as zooming the body doesn't change the properties of the divs, we need to adjust for the zoom
-                        location = page.locator(f"#t1_{comment['comment_id']}").bounding_box()
-                        for i in location:
-                            location[i] = float("{:.2f}".format(location[i] * zoom))
-                        page.screenshot(
-                            clip=location,
-                            path=f"assets/temp/{reddit_id}/png/comment_{idx}.png",
-                        )
-                    else:
-                        page.locator(f"#t1_{comment['comment_id']}").screenshot(
-                            path=f"assets/temp/{reddit_id}/png/comment_{idx}.png"
-                        )
-                except TimeoutError:
-                    del reddit_object["comments"]
-                    screenshot_num += 1
-                    print("TimeoutError: Skipping screenshot...")
-                    continue
-
-        # close browser instance when we are done using it
-        browser.close()
-
-    print_substep("Screenshots downloaded Successfully.", style="bold green")
+                with metrics.step(f"comment_{comment['comment_id']}"):
+                    capture_comment(page, comment, paths[comment["comment_id"]])
+
+            if missing:
+                print_substep(f"{len(missing)} comments are not in the thread, opening them...")
+                capture_permalinks(
+                    service,
+                    context,
+                    [comment for comment in comments if comment["comment_id"] in missing],
+                    paths,
+                    metrics,
+                    int(settings.config["settings"].get("screenshot_pages", 3)),
+                )
+
+    report = metrics.write(f"assets/temp/{reddit_id}/screenshot_metrics.json")
+    print_substep(
+        f"Screenshots downloaded Successfully in {report['seconds']}s, "
+        f"{sum(report['blocked_requests'].values())} requests blocked.",
+        style="bold green",
+    )
@@ -0,0 +1,312 @@
+import atexit
+import json
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Deque, Dict, Iterator, List, NamedTuple, Optional
+from urllib.parse import urlsplit
+
+from playwright.sync_api import Browser, BrowserContext, Page, Route
+from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+from playwright.sync_api import ViewportSize, sync_playwright
+
+from utils import settings
+from utils.console import print_substep
+from utils.playwright import clear_cookie_by_name
+
+__all__ = [
+    "ScreenshotService",
+    "BrowserOptions",
+    "CaptureMetrics",
+    "is_blocked",
+    "get_service",
+    "close_service",
+]
+
+STORAGE_STATE: str = "video_creation/data/reddit_storage_state.json"
+SESSION_COOKIE: str = "reddit_session"
+USER_AGENT: str = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/126.0.0.0 Safari/537.36"
+)
+# nothing the screenshots show, images are kept for the posts and avatars
+BLOCKED_RESOURCE_TYPES = frozenset({"media", "texttrack", "eventsource", "websocket", "manifest"})
+BLOCKED_DOMAINS = (
+    "doubleclick.net",
+    "googlesyndication.com",
+    "googletagservices.com",
+    "googletagmanager.com",
+    "google-analytics.com",
+    "amazon-adsystem.com",
+    "adnxs.com",
+    "scorecardresearch.com",
+    "facebook.net",
+    "alb.reddit.com",
+    "events.reddit.com",
+    "events.redditmedia.com",
+    "w3-reporting.reddit.com",
+    "error-tracking.reddit.com",
+)
+
+
+class BrowserOptions(NamedTuple):
+    """What the contexts of the pool are created with. A change of any of them, like another
+    theme or language, starts a new pool."""
+
+    width: int
+    height: int
+    lang: str
+    cookie_file: str
+
+
+def has_session(cookies: List[dict], now: Optional[float] = None) -> bool:
+    """Whether the cookies hold a Reddit login that has not expired"""
+    now = time.time() if now is None else now
+    return any(
+        cookie["name"] == SESSION_COOKIE
+        and (cookie.get("expires", -1) in (-1, None) or cookie["expires"] > now)
+        for cookie in cookies
+    )
+
+
+def is_blocked(resource_type: str, url: str) -> bool:
+    """Whether a request is an ad, a tracker or a resource the screenshots do not show"""
+    host = urlsplit(url).hostname or ""
+    return resource_type in BLOCKED_RESOURCE_TYPES or any(
+        host == domain or host.endswith("." + domain) for domain in BLOCKED_DOMAINS
+    )
+
+
+class CaptureMetrics:
+    """How long each step of a capture took, and what the browser did not download"""
+
+    def __init__(self):
+        self.steps: List[dict] = []
+        self.blocked: Counter = Counter()
+
+    @contextmanager
+    def step(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            self.steps.append(
+                {"step": name, "seconds": round(time.perf_counter() - start, 3), "ok": ok}
+            )
+
+    def write(self, path: str) -> dict:
+        report = {
+            "seconds": round(sum(step["seconds"] for step in self.steps), 3),
+            "steps": self.steps,
+            "blocked_requests": dict(self.blocked),
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=4)
+        return report
+
+
+class ScreenshotService:
+    """A warm headless browser and a pool of logged in contexts, shared by every video of the
+    process.
+
+    Launching Chromium and logging in to Reddit used to be part of every video. Here the
+    browser starts on the first screenshot and stays up. The login is saved as a Playwright
+    storage state, so it happens once for as long as Reddit keeps the session, even across
+    runs. Contexts go back to the pool after each job, and are closed once they have opened
+    `recycle_after` pages so their memory does not grow without bound.
+
+    Every step of a page gets `timeout` seconds, waits are on the elements being captured
+    rather than fixed sleeps. Ads, trackers and media are aborted before they download, the
+    count of blocked requests goes to `metrics`.
+
+    Args:
+        options : The viewport, language and theme cookies of the contexts.
+        recycle_after : Pages a context opens before it is replaced by a fresh one.
+        storage_state : Where the login is saved between runs.
+        timeout : Seconds each navigation, wait or screenshot may take.
+        block_resources : Whether ads, trackers and media are blocked.
+    """
+
+    def __init__(
+        self,
+        options: BrowserOptions,
+        recycle_after: int = 50,
+        storage_state: str = STORAGE_STATE,
+        timeout: float = 30,
+        block_resources: bool = True,
+    ):
+        self.options = options
+        self.recycle_after = recycle_after
+        self.storage_state = Path(storage_state)
+        self.timeout = timeout
+        self.block_resources = block_resources
+        self.metrics = CaptureMetrics()
+        self._playwright = None
+        self._browser: Optional[Browser] = None
+        self._idle: Deque[BrowserContext] = deque()
+        self._pages: Dict[int, int] = {}  # pages opened by each context, by id
+
+    @property
+    def browser(self) -> Browser:
+        if self._browser is None:
+            print_substep("Launching Headless Browser...")
+            self._playwright = sync_playwright().start()
+            # headless=False will show the browser for debugging purposes
+            self._browser = self._playwright.chromium.launch(headless=True)
+        return self._browser
+
+    def _new_context(self) -> BrowserContext:
+        # Device scale factor (or dsf for short) allows us to increase the resolution of the screenshots
+        # When the dsf is 1, the width of the screenshot is 600 pixels
+        # so we need a dsf such that the width of the screenshot is greater than the final resolution of the video
+        dsf = (self.options.width // 600) + 1
+        state = str(self.storage_state) if self.storage_state.is_file() else None
+        context = self.browser.new_context(
+            locale=self.options.lang or "en-us",
+            color_scheme="dark",
+            viewport=ViewportSize(width=self.options.width, height=self.options.height),
+            device_scale_factor=dsf,
+            user_agent=USER_AGENT,
+            storage_state=state,
+        )
+        context.set_default_timeout(self.timeout * 1000)
+        context.set_default_navigation_timeout(self.timeout * 1000)
+        if self.block_resources:
+            context.route("**/*", self._route)
+        with open(self.options.cookie_file, encoding="utf-8") as cookie_file:
+            context.add_cookies(json.load(cookie_file))  # load preference cookies
+        if not has_session(context.cookies()):
+            self.login(context)
+        self._pages[id(context)] = 0
+        return context
+
+    def new_metrics(self) -> CaptureMetrics:
+        """Starts the metrics of a new job"""
+        self.metrics = CaptureMetrics()
+        return self.metrics
+
+    def _route(self, route: Route):
+        request = route.request
+        if is_blocked(request.resource_type, request.url):
+            self.metrics.blocked[request.resource_type] += 1
+            route.abort("blockedbyclient")
+        else:
+            route.continue_()
+
+    def login(self, context: BrowserContext):
+        """Logs in to Reddit and saves the session for the next contexts and runs"""
+        print_substep("Logging in to Reddit...")
+        page = context.new_page()
+        try:
+            page.goto("https://www.reddit.com/login", wait_until="domcontentloaded")
+            page.set_viewport_size(ViewportSize(width=1920, height=1080))
+
+            page.locator(f'input[name="username"]').fill(
+                settings.config["reddit"]["creds"]["username"]
+            )
+            page.locator(f'input[name="password"]').fill(
+                settings.config["reddit"]["creds"]["password"]
+            )
+            try:
+                # a login that works leaves the page, a wrong password shows an error instead
+                with page.expect_navigation(wait_until="domcontentloaded"):
+                    page.get_by_role("button", name="Log In").click()
+            except PlaywrightTimeoutError:
+                pass
+
+            login_error_div = page.locator(".AnimatedForm__errorMessage").first
+            if login_error_div.is_visible() and login_error_div.inner_text().strip() != "":
+                # The div contains an error message
+                print_substep(
+                    "Your reddit credentials are incorrect! Please modify them accordingly in the config.toml file.",
+                    style="red",
+                )
+                exit()
+
+            # Handle the redesign
+            # Check if the redesign optout cookie is set
+            if page.locator("#redesign-beta-optin-btn").is_visible():
+                # Clear the redesign optout cookie
+                clear_cookie_by_name(context, "redesign_optout")
+        finally:
+            page.close()
+        self.storage_state.parent.mkdir(parents=True, exist_ok=True)
+        context.storage_state(path=str(self.storage_state))
+
+    def acquire(self) -> BrowserContext:
+        """A logged in context from the pool, or a new one"""
+        return self._idle.popleft() if self._idle else self._new_context()
+
+    def release(self, context: BrowserContext):
+        """Puts the context back in the pool, or closes it once it served its share of pages"""
+        if self._pages.get(id(context), 0) >= self.recycle_after:
+            self._pages.pop(id(context), None)
+            context.close()
+        else:
+            self._idle.append(context)
+
+    def new_page(self, context: BrowserContext) -> Page:
+        """Opens a page in a context of the pool, counted towards its recycling"""
+        self._pages[id(context)] = self._pages.get(id(context), 0) + 1
+        return context.new_page()
+
+    @contextmanager
+    def context(self) -> Iterator[BrowserContext]:
+        """A context of the pool for one job. A context that failed is closed, not reused."""
+        context = self.acquire()
+        try:
+            yield context
+        except BaseException:
+            self._pages.pop(id(context), None)
+            context.close()
+            raise
+        self.release(context)
+
+    @contextmanager
+    def page(self) -> Iterator[Page]:
+        """A page in a context of the pool, closed at the end of the job"""
+        with self.context() as context:
+            page = self.new_page(context)
+            try:
+                yield page
+            finally:
+                page.close()
+
+    def close(self):
+        while self._idle:
+            self._idle.popleft().close()
+        self._pages.clear()
+        if self._browser is not None:
+            self._browser.close()
+            self._playwright.stop()
+            self._browser = self._playwright = None
+
+
+_service: Optional[ScreenshotService] = None
+
+
+def get_service(options: BrowserOptions) -> ScreenshotService:
+    """The screenshot service of this process, started again if the options changed"""
+    global _service
+    if _service is not None and _service.options != options:
+        _service.close()
+        _service = None
+    if _service is None:
+        _service = ScreenshotService(
+            options,
+            recycle_after=int(settings.config["settings"].get("browser_recycle_pages", 50)),
+            timeout=float(settings.config["settings"].get("screenshot_timeout", 30)),
+            block_resources=settings.config["settings"].get("block_resources", True),
+        )
+    return _service
+
+
+@atexit.register
+def close_service():
+    global _service
+    if _service is not None:
+        _service.close()
+        _service = None
@@ -1,3 +1,4 @@
+from functools import partial
 from typing import Tuple
 
 from rich.console import Console
@@ -5,6 +6,8 @@ from rich.console import Console
 from TTS.aws_polly import AWSPolly
 from TTS.elevenlabs import elevenlabs
 from TTS.engine_wrapper import TTSEngine
+from TTS.fake import FakeTTS
+from TTS.fallback import DEFAULT_HEDGE_DELAY, FallbackProvider
 from TTS.GTTS import GTTS
 from TTS.pyttsx import pyttsx
 from TTS.streamlabs_polly import StreamlabsPolly
@@ -21,6 +24,7 @@ TTSProviders = {
     "TikTok": TikTok,
     "pyttsx": pyttsx,
     "ElevenLabs": elevenlabs,
+    "Fake": FakeTTS,
 }
 
 
@@ -36,7 +40,7 @@ def save_text_to_mp3(reddit_obj) -> Tuple[int, int]:
 
     voice = settings.config["settings"]["tts"]["voice_choice"]
     if str(voice).casefold() in map(lambda _: _.casefold(), TTSProviders):
-        text_to_mp3 = TTSEngine(get_case_insensitive_key_value(TTSProviders, voice), reddit_obj)
+        provider = get_case_insensitive_key_value(TTSProviders, voice)
     else:
         while True:
             print_step("Please choose one of the following TTS providers: ")
@@ -45,10 +49,29 @@ def save_text_to_mp3(reddit_obj) -> Tuple[int, int]:
             if choice.casefold() in map(lambda _: _.casefold(), TTSProviders):
                 break
             print("Unknown Choice")
-        text_to_mp3 = TTSEngine(get_case_insensitive_key_value(TTSProviders, choice), reddit_obj)
+        provider = get_case_insensitive_key_value(TTSProviders, choice)
+    text_to_mp3 = TTSEngine(with_fallbacks(provider), reddit_obj)
     return text_to_mp3.run()
 
 
+def with_fallbacks(provider):
+    """Chains the configured `fallback_chain` providers behind the chosen one, if there are any."""
+    tts_settings = settings.config["settings"]["tts"]
+    chain = [provider]
+    for name in str(tts_settings.get("fallback_chain", "")).split(","):
+        if not name.strip():
+            continue
+        fallback = get_case_insensitive_key_value(TTSProviders, name.strip())
+        if fallback is None:
+            print(f"Unknown TTS provider {name.strip()} in fallback_chain, skipping it")
+        elif fallback not in chain:
+            chain.append(fallback)
+    if len(chain) == 1:
+        return provider
+    hedge_delay = float(tts_settings.get("hedge_delay", DEFAULT_HEDGE_DELAY))
+    return partial(FallbackProvider, chain, hedge_delay=hedge_delay)
+
+
 def get_case_insensitive_key_value(input_dict, key):
     return next(
         (value for dict_key, value in input_dict.items() if dict_key.lower() == key.lower()),